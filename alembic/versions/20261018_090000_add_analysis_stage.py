@@ -0,0 +1,41 @@
+"""add analysis processing stage
+
+Revision ID: 5c9e1f7a3d42
+Revises: 2b3f3ee31c88
+Create Date: 2026-10-18 09:00:00.000000+00:00
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "5c9e1f7a3d42"
+down_revision: Union[str, None] = "2b3f3ee31c88"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Add analyses.stage checkpoint column."""
+    with op.batch_alter_table("analyses", schema=None) as batch_op:
+        batch_op.add_column(
+            sa.Column(
+                "stage",
+                sa.String(length=32),
+                nullable=False,
+                server_default="UPLOADED",
+                comment="Last committed pipeline checkpoint",
+            )
+        )
+    
+    # Already processed analyses have passed all checkpoints
+    op.execute("UPDATE analyses SET stage = 'RECOMMENDATIONS_READY' WHERE status = 'COMPLETED'")
+
+
+def downgrade() -> None:
+    """Remove analyses.stage column."""
+    with op.batch_alter_table("analyses", schema=None) as batch_op:
+        batch_op.drop_column("stage")
@@ -0,0 +1,51 @@
+"""add content-addressed blob storage
+
+Revision ID: 8d4a2b6e1f93
+Revises: 5c9e1f7a3d42
+Create Date: 2026-10-18 10:00:00.000000+00:00
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "8d4a2b6e1f93"
+down_revision: Union[str, None] = "5c9e1f7a3d42"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Create stored_blobs table and content_hash columns."""
+    op.create_table(
+        "stored_blobs",
+        sa.Column("sha256", sa.String(length=64), nullable=False),
+        sa.Column("size", sa.BigInteger(), nullable=False),
+        sa.Column("refcount", sa.Integer(), nullable=False, server_default="0"),
+        sa.Column("created_at", sa.DateTime(timezone=True), server_default=sa.text("now()"), nullable=False),
+        sa.PrimaryKeyConstraint("sha256"),
+    )
+
+    with op.batch_alter_table("analysis_files", schema=None) as batch_op:
+        batch_op.add_column(sa.Column("content_hash", sa.String(length=64), nullable=True))
+        batch_op.create_index("ix_analysis_files_content_hash", ["content_hash"], unique=False)
+
+    with op.batch_alter_table("medical_documents", schema=None) as batch_op:
+        batch_op.add_column(sa.Column("content_hash", sa.String(length=64), nullable=True))
+        batch_op.create_index("ix_medical_documents_content_hash", ["content_hash"], unique=False)
+
+
+def downgrade() -> None:
+    """Drop content_hash columns and stored_blobs table."""
+    with op.batch_alter_table("medical_documents", schema=None) as batch_op:
+        batch_op.drop_index("ix_medical_documents_content_hash")
+        batch_op.drop_column("content_hash")
+
+    with op.batch_alter_table("analysis_files", schema=None) as batch_op:
+        batch_op.drop_index("ix_analysis_files_content_hash")
+        batch_op.drop_column("content_hash")
+
+    op.drop_table("stored_blobs")
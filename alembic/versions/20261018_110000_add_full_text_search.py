@@ -0,0 +1,51 @@
+"""add full-text search vectors
+
+Revision ID: 3f7c9a1d5e28
+Revises: 8d4a2b6e1f93
+Create Date: 2026-10-18 11:00:00.000000+00:00
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = "3f7c9a1d5e28"
+down_revision: Union[str, None] = "8d4a2b6e1f93"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+SEARCH_VECTORS = {
+    "analyses": (
+        "setweight(to_tsvector('russian', coalesce(title, '')), 'A') || "
+        "setweight(to_tsvector('russian', coalesce(lab_name, '')), 'B') || "
+        "setweight(to_tsvector('russian', coalesce(raw_text, '')), 'C')"
+    ),
+    "analysis_files": "setweight(to_tsvector('russian', coalesce(ocr_text, '')), 'C')",
+    "medical_documents": (
+        "setweight(to_tsvector('russian', coalesce(title, '')), 'A') || "
+        "setweight(to_tsvector('russian', coalesce(tags, '')), 'B') || "
+        "setweight(to_tsvector('russian', coalesce(description, '')), 'B')"
+    ),
+}
+
+
+def upgrade() -> None:
+    """Add generated tsvector columns with GIN indexes."""
+    for table, expression in SEARCH_VECTORS.items():
+        op.execute(
+            f"ALTER TABLE {table} ADD COLUMN IF NOT EXISTS search_vector tsvector "
+            f"GENERATED ALWAYS AS ({expression}) STORED"
+        )
+        op.execute(
+            f"CREATE INDEX IF NOT EXISTS ix_{table}_search_vector ON {table} USING gin (search_vector)"
+        )
+
+
+def downgrade() -> None:
+    """Drop search vectors."""
+    for table in SEARCH_VECTORS:
+        op.execute(f"DROP INDEX IF EXISTS ix_{table}_search_vector")
+        op.execute(f"ALTER TABLE {table} DROP COLUMN IF EXISTS search_vector")
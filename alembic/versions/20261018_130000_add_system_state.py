@@ -0,0 +1,34 @@
+"""add system state
+
+Revision ID: 9a2f4c7e1b36
+Revises: 6b1e8d4f2a07
+Create Date: 2026-10-18 13:00:00.000000+00:00
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "9a2f4c7e1b36"
+down_revision: Union[str, None] = "6b1e8d4f2a07"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Create system_state key/value table (catalog version marker)."""
+    op.create_table(
+        "system_state",
+        sa.Column("key", sa.String(length=100), nullable=False),
+        sa.Column("value", sa.String(length=255), nullable=False),
+        sa.Column("updated_at", sa.DateTime(timezone=True), server_default=sa.text("now()"), nullable=False),
+        sa.PrimaryKeyConstraint("key"),
+    )
+
+
+def downgrade() -> None:
+    """Drop system_state table."""
+    op.drop_table("system_state")
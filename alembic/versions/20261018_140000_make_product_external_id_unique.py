@@ -0,0 +1,38 @@
+"""make product external_id unique
+
+Revision ID: 4e8b1d6a9c53
+Revises: 9a2f4c7e1b36
+Create Date: 2026-10-18 14:00:00.000000+00:00
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = "4e8b1d6a9c53"
+down_revision: Union[str, None] = "9a2f4c7e1b36"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Remove duplicated imports and make external_id the upsert key."""
+    # Previous imports appended the whole catalog again: keep the newest copy
+    op.execute(
+        """
+        DELETE FROM products p
+        USING products newer
+        WHERE p.external_id = newer.external_id
+          AND p.id < newer.id
+        """
+    )
+    op.drop_index("ix_products_external_id", table_name="products")
+    op.create_index("ix_products_external_id", "products", ["external_id"], unique=True)
+
+
+def downgrade() -> None:
+    """Restore non-unique external_id index."""
+    op.drop_index("ix_products_external_id", table_name="products")
+    op.create_index("ix_products_external_id", "products", ["external_id"], unique=False)
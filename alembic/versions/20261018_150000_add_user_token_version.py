@@ -0,0 +1,37 @@
+"""add user token version
+
+Revision ID: 7c3d9e2b5f14
+Revises: 4e8b1d6a9c53
+Create Date: 2026-10-18 15:00:00.000000+00:00
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "7c3d9e2b5f14"
+down_revision: Union[str, None] = "4e8b1d6a9c53"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Add users.token_version."""
+    op.add_column(
+        "users",
+        sa.Column(
+            "token_version",
+            sa.Integer(),
+            server_default="0",
+            nullable=False,
+            comment="Incremented to invalidate issued tokens (password change)",
+        ),
+    )
+
+
+def downgrade() -> None:
+    """Drop users.token_version."""
+    op.drop_column("users", "token_version")
@@ -4,7 +4,7 @@ API v1 router configuration.
 
 from fastapi import APIRouter
 
-from app.api.v1 import auth, users, analyses, recommendations, calendar, products, medcard, profile, biomarkers
+from app.api.v1 import auth, users, analyses, recommendations, calendar, products, medcard, profile, biomarkers, search
 
 api_router = APIRouter()
 
@@ -60,3 +60,9 @@ api_router.include_router(
     prefix="/profile",
     tags=["Профиль пациента"],
 )
+
+api_router.include_router(
+    search.router,
+    prefix="/search",
+    tags=["Поиск"],
+)
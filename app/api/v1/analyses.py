@@ -2,305 +2,22 @@
 Analysis API endpoints for uploading and managing medical analyses.
 """
 
-import os
-import uuid
+import asyncio
+import logging
 from datetime import datetime
-from pathlib import Path
 from typing import List, Optional
 
-from fastapi import APIRouter, HTTPException, status, Depends, UploadFile, File, Query, BackgroundTasks
-from sqlalchemy import select, func, and_
+from fastapi import APIRouter, HTTPException, status, Depends, UploadFile, File, Query, BackgroundTasks, Request
+from fastapi.responses import StreamingResponse
+from sqlalchemy import select, func, and_, update
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import selectinload
 
 from app.core.config import settings
-from app.core.database import get_async_session
+from app.core.database import async_session_maker, get_async_session, get_read_session, replica_router
 from app.core.security import get_current_user_id
-from app.models.analysis import Analysis, AnalysisFile, AnalysisStatus, AnalysisType, LabProvider
-from app.models.biomarker import UserBiomarker, Biomarker, BiomarkerReference, BiomarkerStatus, BiomarkerCategory
-
-
-def detect_biomarker_category(name: str, code: str) -> BiomarkerCategory:
-    """Определяет категорию биомаркера по названию или коду."""
-    name_lower = (name or "").lower()
-    code_lower = (code or "").lower()
-    combined = f"{name_lower} {code_lower}"
-    
-    # Гематология (кровь) - проверяем КОДЫ в первую очередь
-    hematology_codes = [
-        'hgb', 'hb', 'rbc', 'wbc', 'plt', 'hct',
-        'mcv', 'mch', 'mchc', 'rdw', 'mpv', 'pct', 'pdw',
-        'neu', 'neut', 'lym', 'lymph', 'mono', 'eos', 'baso',
-        'esr',
-    ]
-    if any(kw in code_lower for kw in hematology_codes):
-        return BiomarkerCategory.HEMATOLOGY
-    
-    # Гематология (кровь) - проверяем названия
-    hematology_keywords = [
-        'гемоглобин', 'hemoglobin',
-        'эритроцит', 'erythrocyte',
-        'лейкоцит', 'leukocyte',
-        'тромбоцит', 'platelet',
-        'гематокрит', 'hematocrit',
-        'тромбокрит', 'thrombocrit',
-        'ретикулоцит', 'reticulocyte',
-        'нейтрофил', 'neutrophil',
-        'лимфоцит', 'lymphocyte',
-        'моноцит', 'monocyte',
-        'эозинофил', 'eosinophil',
-        'базофил', 'basophil',
-        'соэ', 'coe',
-        'цп', 'цпэ', 'цветовой показатель', 'color index',
-        'палочкоядер', 'сегментоядер', 'юные',
-        'средний объем', 'среднее содержание', 'средняя концентрация',
-        'ширина распределения',
-    ]
-    if any(kw in combined for kw in hematology_keywords):
-        return BiomarkerCategory.HEMATOLOGY
-    
-    # Гормоны
-    hormone_keywords = [
-        'тестостерон', 'testosterone',
-        'эстрадиол', 'estradiol', 'e2',
-        'прогестерон', 'progesterone',
-        'пролактин', 'prolactin',
-        'лг', 'lh', 'лютеинизирующий',
-        'фсг', 'fsh', 'фолликулостимулирующий',
-        'кортизол', 'cortisol',
-        'инсулин', 'insulin',
-        'дгэа', 'dhea', 'dheas',
-        'андростендион', 'androstenedione',
-        'соматотропин', 'hgh', 'стг',
-    ]
-    if any(kw in combined for kw in hormone_keywords):
-        return BiomarkerCategory.HORMONES
-    
-    # Щитовидная железа
-    thyroid_keywords = [
-        'ттг', 'tsh', 'тиреотропный',
-        'т3', 't3', 'трийодтиронин',
-        'т4', 't4', 'тироксин',
-        'ат-тпо', 'anti-tpo', 'антитела к тиреоидной',
-        'ат-тг', 'anti-tg', 'тиреоглобулин',
-    ]
-    if any(kw in combined for kw in thyroid_keywords):
-        return BiomarkerCategory.THYROID
-    
-    # Витамины
-    vitamin_keywords = [
-        'витамин', 'vitamin', 'vit',
-        'b12', 'b6', 'b1', 'b2', 'b9',
-        'фолиевая', 'folic', 'folate',
-        'кальциферол', 'calciferol', '25-oh',
-        'ретинол', 'retinol',
-        'токоферол', 'tocopherol',
-        'аскорбиновая', 'ascorbic',
-    ]
-    if any(kw in combined for kw in vitamin_keywords):
-        return BiomarkerCategory.VITAMINS
-    
-    # Минералы
-    mineral_keywords = [
-        'железо', 'iron', 'fe ', 'ферритин', 'ferritin',
-        'цинк', 'zinc', 'zn',
-        'магний', 'magnesium', 'mg',
-        'кальций', 'calcium', 'ca',
-        'калий', 'potassium', 'k+',
-        'натрий', 'sodium', 'na+',
-        'селен', 'selenium',
-        'медь', 'copper', 'cu',
-        'фосфор', 'phosphorus',
-    ]
-    if any(kw in combined for kw in mineral_keywords):
-        return BiomarkerCategory.MINERALS
-    
-    # Липиды
-    lipid_keywords = [
-        'холестерин', 'cholesterol', 'chol',
-        'лпвп', 'hdl', 'лпнп', 'ldl', 'лпонп', 'vldl',
-        'триглицерид', 'triglyceride', 'tg',
-        'липопротеин', 'lipoprotein',
-    ]
-    if any(kw in combined for kw in lipid_keywords):
-        return BiomarkerCategory.LIPIDS
-    
-    # Печень
-    liver_keywords = [
-        'алт', 'alt', 'аланин',
-        'аст', 'ast', 'аспартат',
-        'ггт', 'ggt', 'гамма-глутамил',
-        'билирубин', 'bilirubin',
-        'щелочная фосфатаза', 'alkaline phosphatase', 'alp',
-    ]
-    if any(kw in combined for kw in liver_keywords):
-        return BiomarkerCategory.LIVER
-    
-    # Почки
-    kidney_keywords = [
-        'креатинин', 'creatinine',
-        'мочевина', 'urea', 'bun',
-        'мочевая кислота', 'uric acid',
-        'скф', 'gfr', 'клиренс',
-        'цистатин', 'cystatin',
-    ]
-    if any(kw in combined for kw in kidney_keywords):
-        return BiomarkerCategory.KIDNEY
-    
-    # Биохимия (общая)
-    biochem_keywords = [
-        'глюкоза', 'glucose', 'glu',
-        'белок', 'protein', 'альбумин', 'albumin',
-        'амилаза', 'amylase',
-        'липаза', 'lipase',
-        'лактатдегидрогеназа', 'ldh',
-        'кфк', 'ck', 'креатинкиназа',
-    ]
-    if any(kw in combined for kw in biochem_keywords):
-        return BiomarkerCategory.BIOCHEMISTRY
-    
-    # Воспаление
-    inflammation_keywords = [
-        'срб', 'crp', 'с-реактивный',
-        'прокальцитонин', 'procalcitonin',
-        'интерлейкин', 'interleukin', 'il-',
-    ]
-    if any(kw in combined for kw in inflammation_keywords):
-        return BiomarkerCategory.INFLAMMATION
-    
-    # ЖКТ (Желудочно-кишечный тракт)
-    gastrointestinal_keywords = [
-        'желудок', 'gastric', 'пепсин', 'pepsin',
-        'кишечник', 'intestinal',
-        'кальпротектин', 'calprotectin',
-        'эластаза', 'elastase',
-        'хеликобактер', 'helicobacter', 'h. pylori',
-        'гастрин', 'gastrin',
-    ]
-    if any(kw in combined for kw in gastrointestinal_keywords):
-        return BiomarkerCategory.GASTROINTESTINAL
-    
-    # Костная система
-    bone_keywords = [
-        'остеокальцин', 'osteocalcin',
-        'дезоксипиридинолин', 'dpd',
-        'β-crosslaps', 'crosslaps',
-        'костная щелочная фосфатаза', 'bone alp',
-    ]
-    if any(kw in combined for kw in bone_keywords):
-        return BiomarkerCategory.BONE
-    
-    # Костно-мышечная система
-    musculoskeletal_keywords = [
-        'миоглобин', 'myoglobin',
-        'креатинкиназа', 'creatine kinase', 'cpk',
-        'лактат', 'lactate',
-    ]
-    if any(kw in combined for kw in musculoskeletal_keywords):
-        return BiomarkerCategory.MUSCULOSKELETAL
-    
-    # Надпочечники
-    adrenal_keywords = [
-        'кортизол', 'cortisol',
-        'альдостерон', 'aldosterone',
-        'ренин', 'renin',
-        'адреналин', 'adrenaline', 'epinephrine',
-        'норадреналин', 'noradrenaline', 'norepinephrine',
-        'метанефрин', 'metanephrine',
-        'акт', 'acth', 'адренокортикотропный',
-    ]
-    if any(kw in combined for kw in adrenal_keywords):
-        return BiomarkerCategory.ADRENAL
-    
-    # Нервная система
-    nervous_keywords = [
-        'серотонин', 'serotonin',
-        'дофамин', 'dopamine',
-        'гомоцистеин', 'homocysteine',
-        'ацетилхолин', 'acetylcholine',
-    ]
-    if any(kw in combined for kw in nervous_keywords):
-        return BiomarkerCategory.NERVOUS
-    
-    # Поджелудочная железа
-    pancreas_keywords = [
-        'амилаза', 'amylase',
-        'липаза', 'lipase',
-        'инсулин', 'insulin',
-        'с-пептид', 'c-peptide',
-        'hba1c', 'гликированный гемоглобин', 'glycated',
-    ]
-    if any(kw in combined for kw in pancreas_keywords):
-        return BiomarkerCategory.PANCREAS
-    
-    # Паращитовидная железа
-    parathyroid_keywords = [
-        'паратгормон', 'parathyroid', 'pth',
-        'паратиреоидный', 'parathormone',
-    ]
-    if any(kw in combined for kw in parathyroid_keywords):
-        return BiomarkerCategory.PARATHYROID
-    
-    # Сердечно-сосудистая система
-    cardiovascular_keywords = [
-        'тропонин', 'troponin',
-        'bnp', 'мозговой натрийуретический',
-        'nt-probnp',
-        'миокард', 'cardiac',
-        'гомоцистеин', 'homocysteine',
-    ]
-    if any(kw in combined for kw in cardiovascular_keywords):
-        return BiomarkerCategory.CARDIOVASCULAR
-    
-    # Репродуктивная система
-    reproductive_keywords = [
-        'тестостерон', 'testosterone',
-        'эстрадиол', 'estradiol',
-        'прогестерон', 'progesterone',
-        'пролактин', 'prolactin',
-        'лг', 'lh', 'лютеинизирующий',
-        'фсг', 'fsh', 'фолликулостимулирующий',
-        'амг', 'amh', 'антимюллеров',
-        'ингибин', 'inhibin',
-        'хгч', 'hcg', 'хорионический',
-        'спермограмма', 'sperm',
-    ]
-    if any(kw in combined for kw in reproductive_keywords):
-        return BiomarkerCategory.REPRODUCTIVE
-    
-    # Мочевыделительная система
-    urinary_keywords = [
-        'моча', 'urine', 'urinary',
-        'альбумин в моче', 'microalbumin',
-        'белок в моче', 'proteinuria',
-    ]
-    if any(kw in combined for kw in urinary_keywords):
-        return BiomarkerCategory.URINARY
-    
-    # Иммунная система
-    immune_keywords = [
-        'иммуноглобулин', 'immunoglobulin', 'igg', 'iga', 'igm', 'ige',
-        'лимфоцит', 'lymphocyte',
-        'cd4', 'cd8', 'cd3',
-        'интерферон', 'interferon',
-        'цитокин', 'cytokine',
-    ]
-    if any(kw in combined for kw in immune_keywords):
-        return BiomarkerCategory.IMMUNE
-    
-    # Свертываемость крови
-    coagulation_keywords = [
-        'протромбин', 'prothrombin', 'пти', 'pt',
-        'мно', 'inr',
-        'ачтв', 'aptt', 'аптт',
-        'фибриноген', 'fibrinogen',
-        'д-димер', 'd-dimer',
-        'антитромбин', 'antithrombin',
-    ]
-    if any(kw in combined for kw in coagulation_keywords):
-        return BiomarkerCategory.COAGULATION
-    
-    return BiomarkerCategory.OTHER
+from app.models.analysis import Analysis, AnalysisFile, AnalysisStage, AnalysisStatus, AnalysisType, LabProvider
+from app.models.biomarker import UserBiomarker, Biomarker, BiomarkerReference, BiomarkerStatus
 from app.models.user import User
 from app.schemas.analysis import (
     AnalysisCreate,
@@ -314,10 +31,135 @@ from app.schemas.analysis import (
     AnalysisFileResponse,
 )
 from app.services.ocr import OCRService, OCRError
-from app.services.ai_parser import AIParserService
-from app.services.recommendations import RecommendationService
+from app.services.ai_parser import AIParserService, SummaryStreamInterrupted
+from app.services.biomarker_categories import detect_biomarker_category
+from app.services.recommendations import RecommendationService, invalidate_user_recommendations
+from app.services.events import analysis_events, format_sse
+from app.services.renditions import rendition_service
+from app.services.storage import blob_store
+from app.services.uploads import UploadTooLargeError
 
 router = APIRouter()
+logger = logging.getLogger(__name__)
+
+TERMINAL_STATUSES = (AnalysisStatus.COMPLETED, AnalysisStatus.FAILED)
+TERMINAL_STATUS_VALUES = tuple(s.value for s in TERMINAL_STATUSES)
+
+
+async def _publish_progress(
+    analysis_id: int,
+    analysis_status: AnalysisStatus,
+    stage: AnalysisStage,
+    summary_ready: bool = False,
+    recommendations_ready: bool = False,
+    **extra,
+) -> None:
+    """Publish a processing progress event for SSE subscribers."""
+    await analysis_events.publish(analysis_id, {
+        "type": "status",
+        "analysis_id": analysis_id,
+        "status": analysis_status.value,
+        "stage": stage.value,
+        "progress": calculate_progress(analysis_status, stage, summary_ready, recommendations_ready),
+        "summary_ready": summary_ready,
+        "recommendations_ready": recommendations_ready,
+        **extra,
+    })
+
+
+def _stage_from_ready(summary_ready: bool, recommendations_ready: bool) -> AnalysisStage:
+    """
+    Checkpoint after the concurrent summary/recommendations stages.
+    
+    The stages do not write Analysis.stage themselves (they would race);
+    the pipeline stores this value once both have finished.
+    """
+    if recommendations_ready:
+        return AnalysisStage.RECOMMENDATIONS_READY
+    if summary_ready:
+        return AnalysisStage.SUMMARY_READY
+    return AnalysisStage.BIOMARKERS_READY
+
+
+async def _run_summary_stage(
+    ai_parser: AIParserService,
+    analysis_id: int,
+    biomarkers_data: List[dict],
+    user_gender: Optional[str],
+    user_age: Optional[int],
+    profile_data: Optional[dict],
+    ready: dict,
+) -> None:
+    """
+    Pipeline stage: generate AI summary and store it in its own session.
+    In streaming mode tokens are published to SSE subscribers as they arrive.
+    """
+    summary = None
+    if settings.llm_stream_summary:
+        parts = []
+        try:
+            async for delta in ai_parser.stream_summary(
+                biomarkers_data,
+                user_gender,
+                user_age,
+                patient_profile=profile_data,
+            ):
+                parts.append(delta)
+                await analysis_events.publish(analysis_id, {
+                    "type": "summary_delta",
+                    "analysis_id": analysis_id,
+                    "delta": delta,
+                })
+            summary = "".join(parts)
+        except SummaryStreamInterrupted:
+            # Partial text is not a summary: tell clients to drop what they
+            # rendered and regenerate it in one piece below
+            await analysis_events.publish(analysis_id, {
+                "type": "summary_reset",
+                "analysis_id": analysis_id,
+            })
+    
+    if summary is None:
+        summary = await ai_parser.generate_summary(
+            biomarkers_data,
+            user_gender,
+            user_age,
+            patient_profile=profile_data,  # ← Передаём профиль в AI
+        )
+    
+    async with async_session_maker() as session:
+        await session.execute(
+            update(Analysis)
+            .where(Analysis.id == analysis_id)
+            .values(ai_summary=summary)
+        )
+        await session.commit()
+    
+    await analysis_events.publish(analysis_id, {
+        "type": "summary",
+        "analysis_id": analysis_id,
+        "summary": summary,
+    })
+    ready["summary_ready"] = True
+    await _publish_progress(analysis_id, AnalysisStatus.PROCESSING, _stage_from_ready(**ready), **ready)
+
+
+async def _run_recommendations_stage(
+    analysis_id: int,
+    recommendation_input: Optional[dict],
+    ready: dict,
+) -> None:
+    """Pipeline stage: map biomarkers to ingredients, match products and store them in its own session."""
+    if not recommendation_input:
+        return
+    
+    async with async_session_maker() as session:
+        recommendation_service = RecommendationService(session)
+        keywords_data = recommendation_service.generate_keywords(recommendation_input)
+        await recommendation_service.save_recommendations(analysis_id, keywords_data, recommendation_input)
+    
+    ready["recommendations_ready"] = True
+    await _publish_progress(analysis_id, AnalysisStatus.PROCESSING, _stage_from_ready(**ready), **ready)
 
 
 async def process_analysis_file(
@@ -330,6 +172,7 @@ async def process_analysis_file(
     """
     ocr_service = OCRService()
     ai_parser = AIParserService()
+    analysis = None
     
     try:
         # Get analysis and file
@@ -341,15 +184,13 @@ async def process_analysis_file(
         
         # Update status
         analysis.status = AnalysisStatus.PROCESSING
-        await db.flush()
+        await db.commit()
+        await _publish_progress(analysis_id, analysis.status, analysis.stage)
         
         # Run OCR
-        import logging
         import base64
-        logger = logging.getLogger(__name__)
         
-        with open(file_record.file_path, "rb") as f:
-            file_bytes = f.read()
+        file_bytes = await blob_store.read(file_record.content_hash, file_record.file_path)
         
         ocr_text = ""
         ocr_success = False
@@ -370,8 +211,13 @@ async def process_analysis_file(
         if ocr_text:
             file_record.ocr_text = ocr_text
             analysis.raw_text = (analysis.raw_text or "") + f"\n\n{ocr_text}"
-            await db.flush()
-            
+        
+        # Checkpoint: text recognition finished
+        analysis.stage = AnalysisStage.OCR_DONE
+        await db.commit()
+        await _publish_progress(analysis_id, analysis.status, analysis.stage)
+        
+        if ocr_text:
             # Parse with AI from OCR text
             extracted_data = await ai_parser.extract_biomarkers(
                 ocr_text,
@@ -418,6 +264,9 @@ async def process_analysis_file(
             analysis.status = AnalysisStatus.FAILED
             analysis.error_message = "Не удалось распознать данные. Попробуйте более четкое фото или другой формат."
             await db.commit()
+            await _publish_progress(
+                analysis_id, analysis.status, analysis.stage, message=analysis.error_message,
+            )
             return
 
         # Get user for reference ranges
@@ -503,9 +352,17 @@ async def process_analysis_file(
             )
             db.add(user_biomarker)
         
-        await db.flush()
+        # Checkpoint: biomarkers are stored and visible to clients. Commit
+        # before the concurrent stages below, which write to the same
+        # analysis from their own sessions
+        analysis.stage = AnalysisStage.BIOMARKERS_READY
+        await db.commit()
+        await _publish_progress(
+            analysis_id, analysis.status, analysis.stage,
+            biomarkers_found=len(extracted_data["biomarkers"]),
+        )
         
-        # Generate AI summary
+        # Data for AI summary
         biomarkers_data = []
         stmt = (
             select(UserBiomarker)
@@ -544,27 +401,46 @@ async def process_analysis_file(
                 "gender_health": patient_profile.gender_health or {},
             }
         
-        summary = await ai_parser.generate_summary(
-            biomarkers_data,
-            user.gender.value if user and user.gender else None,
-            user.age if user else None,
-            patient_profile=profile_data,  # ← Передаём профиль в AI
-        )
-        
-        analysis.ai_summary = summary
-        analysis.status = AnalysisStatus.COMPLETED
-        analysis.processed_at = datetime.utcnow()
-        
-        await db.flush()
-        
-        # Generate recommendations
         recommendation_service = RecommendationService(db)
-        await recommendation_service.generate_recommendations_for_analysis(
+        recommendation_input = await recommendation_service.collect_recommendation_input(
             analysis_id,
             analysis.user_id,
         )
+        # Release the connection while waiting for the LLM
+        await db.commit()
+        
+        # Summary (LLM) and recommendations (rule engine) are independent:
+        # run them concurrently, each stage persists its own result
+        ready = {"summary_ready": False, "recommendations_ready": False}
+        stage_results = await asyncio.gather(
+            _run_summary_stage(
+                ai_parser,
+                analysis_id,
+                biomarkers_data,
+                user.gender.value if user and user.gender else None,
+                user.age if user else None,
+                profile_data,
+                ready,
+            ),
+            _run_recommendations_stage(analysis_id, recommendation_input, ready),
+            return_exceptions=True,
+        )
+        for stage, stage_result in zip(("summary", "recommendations"), stage_results):
+            if isinstance(stage_result, Exception):
+                logger.error(
+                    f"Stage {stage} failed for analysis {analysis_id}: {stage_result}",
+                    exc_info=stage_result,
+                )
+        
+        analysis.status = AnalysisStatus.COMPLETED
+        analysis.stage = _stage_from_ready(**ready)
+        analysis.processed_at = datetime.utcnow()
         
         await db.commit()
+        await _publish_progress(
+            analysis_id, analysis.status, analysis.stage,
+            biomarkers_found=len(extracted_data["biomarkers"]), **ready,
+        )
         
     except OCRError as e:
         await db.rollback()  # Откатываем битую транзакцию
@@ -573,9 +449,10 @@ async def process_analysis_file(
             analysis.status = AnalysisStatus.FAILED
             analysis.error_message = str(e)
             await db.commit()
+            await _publish_progress(
+                analysis_id, analysis.status, analysis.stage, message=analysis.error_message,
+            )
     except Exception as e:
-        import logging
-        logger = logging.getLogger(__name__)
         logger.error(f"Error processing analysis {analysis_id}: {str(e)}", exc_info=True)
         
         await db.rollback()  # Откатываем битую транзакцию
@@ -584,6 +461,13 @@ async def process_analysis_file(
             analysis.status = AnalysisStatus.FAILED
             analysis.error_message = f"Ошибка обработки: {str(e)}"
             await db.commit()
+            await _publish_progress(
+                analysis_id, analysis.status, analysis.stage, message=analysis.error_message,
+            )
+    finally:
+        # The pipeline writes outside of the owner's requests: keep their reads on the primary
+        if analysis is not None:
+            await replica_router.record_write(analysis.user_id)
 
 
 @router.post(
@@ -614,7 +498,8 @@ async def upload_analysis(
     2. AI извлечение биомаркеров
     3. Генерация рекомендаций
     
-    Статус обработки можно отслеживать через `/analyses/{id}/status`
+    Статус обработки можно отслеживать через `/analyses/{id}/events` (SSE)
+    или `/analyses/{id}/status`
     """
     # Validate file
     if not file.filename:
@@ -630,48 +515,46 @@ async def upload_analysis(
             detail=f"Неподдерживаемый формат файла. Разрешены: {', '.join(settings.allowed_extensions)}",
         )
     
-    # Check file size
-    content = await file.read()
-    if len(content) > settings.max_upload_size:
+    # Save file (streamed to disk, rejected early if too large, deduplicated by hash)
+    try:
+        stored = await blob_store.save_upload(db, file, settings.max_upload_size)
+    except UploadTooLargeError:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail=f"Файл слишком большой. Максимум: {settings.max_upload_size // 1024 // 1024}MB",
         )
     
-    # Create analysis record
-    analysis = Analysis(
-        user_id=user_id,
-        title=title or f"Анализ от {datetime.now().strftime('%d.%m.%Y')}",
-        analysis_type=analysis_type,
-        lab_provider=lab_provider,
-        status=AnalysisStatus.PENDING,
-    )
-    db.add(analysis)
-    await db.flush()
-    
-    # Save file
-    upload_dir = Path(settings.upload_dir) / str(user_id)
-    upload_dir.mkdir(parents=True, exist_ok=True)
-    
-    filename = f"{uuid.uuid4()}.{ext}"
-    file_path = upload_dir / filename
-    
-    with open(file_path, "wb") as f:
-        f.write(content)
-    
-    # Create file record
-    analysis_file = AnalysisFile(
-        analysis_id=analysis.id,
-        filename=filename,
-        original_filename=file.filename,
-        content_type=file.content_type or f"image/{ext}",
-        file_size=len(content),
-        file_path=str(file_path),
-    )
-    db.add(analysis_file)
-    await db.flush()
-    
-    await db.commit()
+    try:
+        # Create analysis record
+        analysis = Analysis(
+            user_id=user_id,
+            title=title or f"Анализ от {datetime.now().strftime('%d.%m.%Y')}",
+            analysis_type=analysis_type,
+            lab_provider=lab_provider,
+            status=AnalysisStatus.PENDING,
+        )
+        db.add(analysis)
+        await db.flush()
+        
+        # Create file record
+        analysis_file = AnalysisFile(
+            analysis_id=analysis.id,
+            filename=f"{stored.sha256}.{ext}",
+            original_filename=file.filename,
+            content_type=file.content_type or f"image/{ext}",
+            file_size=stored.size,
+            file_path=blob_store.key_for(stored.sha256),
+            content_hash=stored.sha256,
+        )
+        db.add(analysis_file)
+        await db.flush()
+        
+        await db.commit()
+    except Exception:
+        # The object was written before the commit: do not leave it orphaned
+        await db.rollback()
+        await blob_store.discard_upload(stored.sha256)
+        raise
     
     # Start background processing
     background_tasks.add_task(
@@ -681,6 +564,13 @@ async def upload_analysis(
         db,
     )
     
+    # Thumbnail/preview run detached: rendering a large PDF must not delay OCR
+    rendition_service.schedule(
+        analysis_file.content_hash,
+        analysis_file.file_path,
+        analysis_file.content_type,
+    )
+    
     return AnalysisUploadResponse(
         analysis_id=analysis.id,
         file_id=analysis_file.id,
@@ -698,7 +588,7 @@ async def list_analyses(
     page_size: int = Query(20, ge=1, le=100),
     analysis_type: Optional[AnalysisType] = None,
     user_id: int = Depends(get_current_user_id),
-    db: AsyncSession = Depends(get_async_session),
+    db: AsyncSession = Depends(get_read_session),
 ):
     """
     Получение списка анализов пользователя с пагинацией.
@@ -814,7 +704,7 @@ async def list_analyses(
 async def get_analysis(
     analysis_id: int,
     user_id: int = Depends(get_current_user_id),
-    db: AsyncSession = Depends(get_async_session),
+    db: AsyncSession = Depends(get_read_session),
 ):
     """
     Получение полной информации об анализе, включая все биомаркеры.
@@ -882,6 +772,7 @@ async def get_analysis(
         lab_name=analysis.lab_name,
         analysis_date=analysis.analysis_date,
         status=analysis.status,
+        stage=analysis.stage,
         error_message=analysis.error_message,
         ai_summary=analysis.ai_summary,
         ai_recommendations=analysis.ai_recommendations,
@@ -902,6 +793,7 @@ async def get_analysis(
 )
 async def get_analysis_status(
     analysis_id: int,
+    include_results: bool = Query(False, description="Вернуть уже готовые частичные результаты"),
     user_id: int = Depends(get_current_user_id),
     db: AsyncSession = Depends(get_async_session),
 ):
@@ -909,11 +801,19 @@ async def get_analysis_status(
     Получение текущего статуса обработки анализа.
     
     Используйте для polling после загрузки файла.
+    
+    Обработка проходит этапы `ocr_done` → `biomarkers_ready` → `summary_ready` /
+    `recommendations_ready`. Биомаркеры доступны сразу после `biomarkers_ready`,
+    расшифровка и рекомендации появляются позже (`include_results=true`).
     """
     stmt = select(Analysis).where(
         Analysis.id == analysis_id,
         Analysis.user_id == user_id,
     )
+    if include_results:
+        stmt = stmt.options(
+            selectinload(Analysis.biomarkers).selectinload(UserBiomarker.biomarker)
+        )
     result = await db.execute(stmt)
     analysis = result.scalar_one_or_none()
     
@@ -923,31 +823,371 @@ async def get_analysis_status(
             detail="Анализ не найден",
         )
     
-    # Calculate progress
-    progress_map = {
-        AnalysisStatus.PENDING: 0,
-        AnalysisStatus.PROCESSING: 50,
-        AnalysisStatus.COMPLETED: 100,
-        AnalysisStatus.FAILED: 100,
-        AnalysisStatus.MANUAL_REVIEW: 80,
-    }
+    summary_ready = analysis.ai_summary is not None
+    recommendations_ready = analysis.ai_recommendations is not None
     
     # Count biomarkers
-    bio_count_stmt = (
-        select(func.count(UserBiomarker.id))
-        .where(UserBiomarker.analysis_id == analysis_id)
-    )
-    biomarkers_found = (await db.execute(bio_count_stmt)).scalar() or 0
+    if include_results:
+        biomarkers_found = len(analysis.biomarkers)
+    else:
+        bio_count_stmt = (
+            select(func.count(UserBiomarker.id))
+            .where(UserBiomarker.analysis_id == analysis_id)
+        )
+        biomarkers_found = (await db.execute(bio_count_stmt)).scalar() or 0
     
-    return AnalysisProcessingStatus(
+    response = AnalysisProcessingStatus(
         analysis_id=analysis.id,
         status=analysis.status,
-        progress=progress_map.get(analysis.status, 0),
+        stage=analysis.stage,
+        progress=calculate_progress(analysis.status, analysis.stage, summary_ready, recommendations_ready),
         message=analysis.error_message,
         biomarkers_found=biomarkers_found,
+        summary_ready=summary_ready,
+        recommendations_ready=recommendations_ready,
+    )
+    
+    if include_results:
+        response.biomarkers = [
+            AnalysisBiomarkerResponse(
+                id=ub.id,
+                biomarker_code=ub.biomarker.code,
+                biomarker_name=ub.biomarker.name_ru,
+                value=ub.value,
+                unit=ub.unit,
+                status=ub.status.value,
+                ref_min=ub.ref_min,
+                ref_max=ub.ref_max,
+                raw_name=ub.raw_name,
+            )
+            for ub in analysis.biomarkers
+        ]
+        response.ai_summary = analysis.ai_summary
+        response.ai_recommendations = analysis.ai_recommendations
+    
+    return response
+
+
+@router.get(
+    "/{analysis_id}/events",
+    summary="Поток статуса обработки (SSE)",
+    response_class=StreamingResponse,
+)
+async def stream_analysis_events(
+    analysis_id: int,
+    request: Request,
+    user_id: int = Depends(get_current_user_id),
+    db: AsyncSession = Depends(get_async_session),
+):
+    """
+    Server-Sent Events с этапами обработки анализа (замена polling `/status`).
+    
+    Первое событие — текущее состояние, далее события `status` при каждом
+    переходе этапа. Поток закрывается после `completed` / `failed`.
+    Без Redis события других воркеров не доходят, поэтому состояние
+    перечитывается из БД при каждом keepalive.
+    """
+    # Subscribe before reading the snapshot so no transition is missed
+    subscription = await analysis_events.subscribe(analysis_id)
+    try:
+        analysis = await _get_user_analysis(db, analysis_id, user_id)
+    except Exception:
+        await subscription.close()
+        raise
+    
+    snapshot = _status_snapshot(analysis)
+    last_snapshot = snapshot
+    
+    def handle(event: dict):
+        if event.get("type") != "status":
+            return None, False
+        return format_sse(event, event="status"), event["status"] in TERMINAL_STATUS_VALUES
+    
+    async def poll():
+        nonlocal last_snapshot
+        async with async_session_maker() as session:
+            current = await session.get(Analysis, analysis_id)
+        if current is None:
+            return None, True
+        current_snapshot = _status_snapshot(current)
+        if current_snapshot == last_snapshot:
+            return None, False
+        last_snapshot = current_snapshot
+        return format_sse(current_snapshot, event="status"), current.status in TERMINAL_STATUSES
+    
+    return _event_stream_response(
+        request,
+        subscription,
+        initial=format_sse(snapshot, event="status"),
+        done=analysis.status in TERMINAL_STATUSES,
+        handle=handle,
+        poll=poll,
     )
 
 
+def _status_snapshot(analysis: Analysis) -> dict:
+    """Status event built from the stored analysis."""
+    summary_ready = analysis.ai_summary is not None
+    recommendations_ready = analysis.ai_recommendations is not None
+    return {
+        "type": "status",
+        "analysis_id": analysis.id,
+        "status": analysis.status.value,
+        "stage": analysis.stage.value,
+        "progress": calculate_progress(analysis.status, analysis.stage, summary_ready, recommendations_ready),
+        "summary_ready": summary_ready,
+        "recommendations_ready": recommendations_ready,
+        "message": analysis.error_message,
+    }
+
+
+@router.get(
+    "/{analysis_id}/summary/stream",
+    summary="Потоковая AI-расшифровка (SSE)",
+    response_class=StreamingResponse,
+)
+async def stream_analysis_summary(
+    analysis_id: int,
+    request: Request,
+    user_id: int = Depends(get_current_user_id),
+    db: AsyncSession = Depends(get_async_session),
+):
+    """
+    Server-Sent Events с AI-расшифровкой по мере генерации.
+    
+    - `delta` — очередной фрагмент текста
+    - `reset` — поток прервался, полученные фрагменты нужно сбросить
+    - `summary` — полный текст (сразу, если расшифровка уже готова)
+    - `status` — обработка завершилась ошибкой
+    """
+    subscription = await analysis_events.subscribe(analysis_id)
+    try:
+        analysis = await _get_user_analysis(db, analysis_id, user_id)
+    except Exception:
+        await subscription.close()
+        raise
+    
+    if analysis.ai_summary is not None:
+        initial = format_sse({"analysis_id": analysis.id, "summary": analysis.ai_summary}, event="summary")
+        done = True
+    elif analysis.status in TERMINAL_STATUSES:
+        initial = format_sse(
+            {"analysis_id": analysis.id, "status": analysis.status.value, "message": analysis.error_message},
+            event="status",
+        )
+        done = True
+    else:
+        initial = ": waiting for summary\n\n"
+        done = False
+    
+    def handle(event: dict):
+        event_type = event.get("type")
+        if event_type == "summary_delta":
+            return format_sse({"delta": event["delta"]}, event="delta"), False
+        if event_type == "summary_reset":
+            return format_sse({"analysis_id": analysis_id}, event="reset"), False
+        if event_type == "summary":
+            return format_sse({"analysis_id": analysis_id, "summary": event["summary"]}, event="summary"), True
+        if event_type == "status" and event["status"] == AnalysisStatus.FAILED.value:
+            return format_sse(event, event="status"), True
+        return None, False
+    
+    async def poll():
+        async with async_session_maker() as session:
+            current = await session.get(Analysis, analysis_id)
+        if current is None:
+            return None, True
+        if current.ai_summary is not None:
+            return format_sse({"analysis_id": analysis_id, "summary": current.ai_summary}, event="summary"), True
+        if current.status == AnalysisStatus.FAILED:
+            return format_sse(
+                {"analysis_id": analysis_id, "status": current.status.value, "message": current.error_message},
+                event="status",
+            ), True
+        return None, False
+    
+    return _event_stream_response(request, subscription, initial=initial, done=done, handle=handle, poll=poll)
+
+
+async def _get_user_analysis(db: AsyncSession, analysis_id: int, user_id: int) -> Analysis:
+    """Load an analysis owned by the user or raise 404."""
+    stmt = select(Analysis).where(
+        Analysis.id == analysis_id,
+        Analysis.user_id == user_id,
+    )
+    result = await db.execute(stmt)
+    analysis = result.scalar_one_or_none()
+    
+    if not analysis:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Анализ не найден",
+        )
+    return analysis
+
+
+def _event_stream_response(
+    request: Request,
+    subscription,
+    initial: str,
+    done: bool,
+    handle,
+    poll=None,
+) -> StreamingResponse:
+    """
+    SSE response fed by an event bus subscription.
+    
+    `handle(event)` returns (message or None to skip, whether the stream is finished).
+    Without Redis the subscription only sees events of this worker's pipelines,
+    so `await poll()` (same result shape, read from the database) runs on each
+    keepalive instead. The subscription is closed when the stream ends or the
+    client disconnects.
+    """
+    async def event_stream():
+        try:
+            yield initial
+            if done:
+                return
+            
+            loop = asyncio.get_running_loop()
+            deadline = loop.time() + settings.events_stream_timeout_seconds
+            while loop.time() < deadline:
+                if await request.is_disconnected():
+                    break
+                
+                event = await subscription.get(timeout=settings.events_keepalive_seconds)
+                if event is None:
+                    if poll is not None and subscription.in_process:
+                        message, finished = await poll()
+                        if message:
+                            yield message
+                        if finished:
+                            break
+                    yield ": keepalive\n\n"
+                    continue
+                
+                message, finished = handle(event)
+                if message:
+                    yield message
+                if finished:
+                    break
+        finally:
+            await subscription.close()
+    
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={
+            "Cache-Control": "no-cache",
+            "X-Accel-Buffering": "no",  # Disable proxy buffering (nginx)
+        },
+    )
+
+
+def calculate_progress(
+    analysis_status: AnalysisStatus,
+    stage: AnalysisStage,
+    summary_ready: bool,
+    recommendations_ready: bool,
+) -> int:
+    """Processing progress in percent based on the committed checkpoints."""
+    if analysis_status in (AnalysisStatus.COMPLETED, AnalysisStatus.FAILED):
+        return 100
+    if analysis_status == AnalysisStatus.MANUAL_REVIEW:
+        return 80
+    if analysis_status == AnalysisStatus.PENDING:
+        return 0
+    
+    stage_progress = {
+        AnalysisStage.UPLOADED: 10,
+        AnalysisStage.OCR_DONE: 35,
+    }
+    if stage in stage_progress:
+        return stage_progress[stage]
+    
+    # Biomarkers are ready, summary and recommendations finish in any order
+    return 60 + 15 * summary_ready + 15 * recommendations_ready
+
+
+@router.get(
+    "/{analysis_id}/files/{file_id}/thumbnail",
+    summary="Миниатюра файла анализа",
+)
+async def get_analysis_file_thumbnail(
+    analysis_id: int,
+    file_id: int,
+    request: Request,
+    user_id: int = Depends(get_current_user_id),
+    db: AsyncSession = Depends(get_async_session),
+):
+    """
+    Миниатюра загруженного файла (до 256px, WebP или JPEG по заголовку Accept).
+    
+    Для PDF строится по первой странице.
+    """
+    return await _file_rendition_response(request, db, analysis_id, file_id, user_id, "thumbnail")
+
+
+@router.get(
+    "/{analysis_id}/files/{file_id}/preview",
+    summary="Превью файла анализа",
+)
+async def get_analysis_file_preview(
+    analysis_id: int,
+    file_id: int,
+    request: Request,
+    user_id: int = Depends(get_current_user_id),
+    db: AsyncSession = Depends(get_async_session),
+):
+    """
+    Уменьшенное превью загруженного файла (до 1024px, WebP или JPEG по заголовку Accept).
+    """
+    return await _file_rendition_response(request, db, analysis_id, file_id, user_id, "preview")
+
+
+async def _file_rendition_response(
+    request: Request,
+    db: AsyncSession,
+    analysis_id: int,
+    file_id: int,
+    user_id: int,
+    name: str,
+):
+    """Serve a rendition of a file that belongs to the user's analysis."""
+    stmt = (
+        select(AnalysisFile)
+        .join(Analysis, Analysis.id == AnalysisFile.analysis_id)
+        .where(
+            AnalysisFile.id == file_id,
+            AnalysisFile.analysis_id == analysis_id,
+            Analysis.user_id == user_id,
+        )
+    )
+    result = await db.execute(stmt)
+    file_record = result.scalar_one_or_none()
+    
+    if not file_record:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Файл не найден",
+        )
+    
+    rendition = await rendition_service.get(
+        file_record.content_hash,
+        file_record.file_path,
+        file_record.content_type,
+        name,
+        accept=request.headers.get("accept", ""),
+    )
+    if rendition is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Превью для файла недоступно",
+        )
+    
+    return await rendition_service.response(request, rendition, file_record.created_at)
+
+
 @router.delete(
     "/{analysis_id}",
     status_code=status.HTTP_204_NO_CONTENT,
@@ -979,15 +1219,20 @@ async def delete_analysis(
     files_result = await db.execute(files_stmt)
     files = files_result.scalars().all()
     
-    for file_record in files:
-        try:
-            os.unlink(file_record.file_path)
-        except OSError:
-            pass
+    released = [
+        file_record
+        for file_record in files
+        if await blob_store.release(db, file_record.content_hash, file_record.file_path)
+    ]
     
     # Delete analysis (cascade will delete files, biomarkers, recommendations)
     await db.delete(analysis)
     await db.commit()
+    
+    # Physical deletes only once the records are gone for good
+    for file_record in released:
+        await blob_store.purge(file_record.content_hash, file_record.file_path)
+    await invalidate_user_recommendations(user_id)
 
 
 
@@ -2,21 +2,27 @@
 Authentication API endpoints.
 """
 
+from typing import Optional
+
 from fastapi import APIRouter, HTTPException, status, Depends
 from sqlalchemy import select
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.core.database import get_async_session
 from app.core.security import (
-    verify_password,
-    get_password_hash,
+    verify_and_update_password_async,
+    get_password_hash_async,
     create_token_pair,
     decode_token,
+    get_current_token,
     get_current_user_id,
+    revoke_all_user_tokens,
+    revoke_token,
+    TokenPayload,
 )
 from app.models.user import User
 from app.schemas.user import UserCreate, UserLogin, UserResponse
-from app.schemas.auth import Token, RefreshTokenRequest
+from app.schemas.auth import Token, RefreshTokenRequest, LogoutRequest
 
 router = APIRouter()
 
@@ -55,7 +61,7 @@ async def register(
     # Create user
     user = User(
         email=user_data.email,
-        hashed_password=get_password_hash(user_data.password),
+        hashed_password=await get_password_hash_async(user_data.password),
         first_name=user_data.first_name,
         last_name=user_data.last_name,
         phone=user_data.phone,
@@ -92,12 +98,23 @@ async def login(
     result = await db.execute(stmt)
     user = result.scalar_one_or_none()
     
-    if not user or not verify_password(credentials.password, user.hashed_password):
+    if not user:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Неверный email или пароль",
+        )
+    
+    valid, new_hash = await verify_and_update_password_async(credentials.password, user.hashed_password)
+    if not valid:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Неверный email или пароль",
         )
     
+    # Stored hash uses an outdated cost: replace it while we know the password
+    if new_hash:
+        user.hashed_password = new_hash
+    
     if not user.is_active:
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
@@ -105,7 +122,7 @@ async def login(
         )
     
     # Create tokens
-    return create_token_pair(user.id)
+    return create_token_pair(user.id, user.token_version)
 
 
 @router.post(
@@ -119,8 +136,11 @@ async def refresh_token(
 ):
     """
     Обновление access_token с помощью refresh_token.
+    
+    Refresh token одноразовый: при обновлении он отзывается и выдается
+    новая пара токенов.
     """
-    token_data = decode_token(request.refresh_token)
+    token_data = await decode_token(request.refresh_token)
     
     if not token_data or token_data.type != "refresh":
         raise HTTPException(
@@ -139,7 +159,59 @@ async def refresh_token(
             detail="Пользователь не найден или деактивирован",
         )
     
-    return create_token_pair(user.id)
+    # Rotation: a refresh token is accepted once (concurrent reuse loses the race)
+    if not await revoke_token(token_data):
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Невалидный refresh token",
+        )
+    
+    return create_token_pair(user.id, user.token_version)
+
+
+@router.post(
+    "/logout",
+    status_code=status.HTTP_204_NO_CONTENT,
+    summary="Выход",
+)
+async def logout(
+    request: Optional[LogoutRequest] = None,
+    token_data: Optional[TokenPayload] = Depends(get_current_token),
+):
+    """
+    Отзыв текущего access token и (если передан) refresh token.
+    """
+    if token_data:
+        await revoke_token(token_data)
+    
+    if request and request.refresh_token:
+        refresh_data = await decode_token(request.refresh_token)
+        if refresh_data and refresh_data.type == "refresh" and (
+            token_data is None or refresh_data.sub == token_data.sub
+        ):
+            await revoke_token(refresh_data)
+
+
+@router.post(
+    "/logout-all",
+    status_code=status.HTTP_204_NO_CONTENT,
+    summary="Выход на всех устройствах",
+)
+async def logout_all(
+    user_id: int = Depends(get_current_user_id),
+    db: AsyncSession = Depends(get_async_session),
+):
+    """
+    Отзыв всех выданных пользователю токенов.
+    """
+    user = await db.get(User, user_id)
+    if not user:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Пользователь не найден",
+        )
+    
+    await revoke_all_user_tokens(db, user)
 
 
 @router.get(
@@ -10,11 +10,13 @@ from sqlalchemy import select, func, desc, case
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import selectinload
 
-from app.core.database import get_async_session
+from app.core.database import get_async_session, get_read_session
 from app.core.security import get_current_user_id
 from app.models.biomarker import UserBiomarker, Biomarker, BiomarkerStatus, BiomarkerCategory
 from app.models.analysis import Analysis
 from app.models.user import User
+from app.services.biomarker_categories import detect_biomarker_category
+from app.services.recommendations import invalidate_user_recommendations
 from app.schemas.biomarker import (
     BiomarkerListResponse,
     BiomarkerListItem,
@@ -36,7 +38,7 @@ router = APIRouter()
 async def list_biomarkers(
     category: Optional[BiomarkerCategory] = None,
     user_id: int = Depends(get_current_user_id),
-    db: AsyncSession = Depends(get_async_session),
+    db: AsyncSession = Depends(get_read_session),
 ):
     """
     Получение списка всех уникальных биомаркеров пользователя.
@@ -117,7 +119,7 @@ async def list_biomarkers(
 async def get_biomarker_detail(
     biomarker_code: str,
     user_id: int = Depends(get_current_user_id),
-    db: AsyncSession = Depends(get_async_session),
+    db: AsyncSession = Depends(get_read_session),
 ):
     """
     Получение полной истории конкретного биомаркера.
@@ -230,8 +232,6 @@ async def create_biomarker_value(
     
     if not biomarker:
         # Auto-create missing biomarker
-        from app.api.v1.analyses import detect_biomarker_category
-        
         # Use provided code as name initially (frontend sends generated code from name)
         # If the code is just upper case name (e.g. "КАЛИЙ"), use it as name_ru properly
         name_ru = biomarker_code.title() if biomarker_code.isupper() and len(biomarker_code) > 3 else biomarker_code
@@ -273,6 +273,7 @@ async def create_biomarker_value(
     await db.flush()
     await db.refresh(user_biomarker)
     await db.commit()
+    await invalidate_user_recommendations(user_id)
     
     return BiomarkerValueResponse(
         id=user_biomarker.id,
@@ -354,6 +355,7 @@ async def update_biomarker_value(
             user_biomarker.status = BiomarkerStatus.NORMAL
     
     await db.commit()
+    await invalidate_user_recommendations(user_id)
     await db.refresh(user_biomarker)
     
     return BiomarkerValueResponse(
@@ -408,6 +410,7 @@ async def delete_biomarker_value(
     
     await db.delete(user_biomarker)
     await db.commit()
+    await invalidate_user_recommendations(user_id)
 
 
 
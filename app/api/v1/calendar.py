@@ -9,7 +9,7 @@ from fastapi import APIRouter, HTTPException, status, Depends, Query
 from sqlalchemy import select, and_, func, extract
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from app.core.database import get_async_session
+from app.core.database import get_async_session, get_read_session
 from app.core.security import get_current_user_id
 from app.models.reminder import HealthReminder, ReminderType, ReminderFrequency
 from app.schemas.reminder import (
@@ -143,7 +143,7 @@ async def list_reminders(
     reminder_type: Optional[ReminderType] = None,
     include_completed: bool = Query(False, description="Включить выполненные"),
     user_id: int = Depends(get_current_user_id),
-    db: AsyncSession = Depends(get_async_session),
+    db: AsyncSession = Depends(get_read_session),
 ):
     """
     Получение списка напоминаний пользователя.
@@ -190,7 +190,7 @@ async def list_reminders(
 )
 async def get_upcoming_reminders(
     user_id: int = Depends(get_current_user_id),
-    db: AsyncSession = Depends(get_async_session),
+    db: AsyncSession = Depends(get_read_session),
 ):
     """
     Получение предстоящих напоминаний, сгруппированных по периодам:
@@ -277,7 +277,7 @@ async def get_month_calendar(
     year: int,
     month: int,
     user_id: int = Depends(get_current_user_id),
-    db: AsyncSession = Depends(get_async_session),
+    db: AsyncSession = Depends(get_read_session),
 ):
     """
     Получение календарной сетки на месяц с отметками о напоминаниях.
@@ -346,7 +346,7 @@ async def get_month_calendar(
 async def get_reminder(
     reminder_id: int,
     user_id: int = Depends(get_current_user_id),
-    db: AsyncSession = Depends(get_async_session),
+    db: AsyncSession = Depends(get_read_session),
 ):
     """
     Получение полной информации о напоминании.
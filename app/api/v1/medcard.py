@@ -4,17 +4,16 @@ Medical Card API - storage for arbitrary medical documents
 
 import os
 import shutil
-from datetime import datetime
 from pathlib import Path
 from typing import Optional
 
-from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Form, status, Query
-from fastapi.responses import FileResponse
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, UploadFile, File, Form, status, Query, Request
+from fastapi.responses import RedirectResponse, Response
 from sqlalchemy import select, func
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.core.config import settings
-from app.core.database import get_async_session
+from app.core.database import get_async_session, get_read_session
 from app.core.security import get_current_user
 from app.models.user import User
 from app.models.medical_document import MedicalDocument, DocumentCategory
@@ -24,6 +23,10 @@ from app.schemas.medical_document import (
     MedicalDocumentResponse,
     MedicalDocumentList,
 )
+from app.services.file_serving import conditional_file_response
+from app.services.renditions import rendition_service
+from app.services.storage import blob_store, content_disposition
+from app.services.uploads import UploadTooLargeError
 
 router = APIRouter(prefix="/medcard", tags=["Медкарта"])
 
@@ -33,6 +36,7 @@ MAX_FILE_SIZE = 10 * 1024 * 1024  # 10 MB
 
 @router.post("/upload", response_model=MedicalDocumentResponse, status_code=status.HTTP_201_CREATED)
 async def upload_document(
+    background_tasks: BackgroundTasks,
     file: UploadFile = File(..., description="Файл документа (PDF, JPG, PNG)"),
     title: str = Form(..., description="Название документа"),
     category: DocumentCategory = Form(..., description="Категория документа"),
@@ -56,26 +60,15 @@ async def upload_document(
             detail=f"Неподдерживаемый формат файла. Разрешены: {', '.join(ALLOWED_EXTENSIONS)}",
         )
     
-    # Read file content
-    content = await file.read()
-    file_size = len(content)
-    
-    if file_size > MAX_FILE_SIZE:
+    # Save file (streamed to disk, rejected early if too large, deduplicated by hash)
+    try:
+        stored = await blob_store.save_upload(db, file, MAX_FILE_SIZE)
+    except UploadTooLargeError:
         raise HTTPException(
             status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
             detail=f"Файл слишком большой. Максимум {MAX_FILE_SIZE // (1024*1024)} МБ",
         )
     
-    # Generate unique filename
-    timestamp = int(datetime.utcnow().timestamp())
-    safe_filename = f"{current_user.id}_{timestamp}_{file.filename}"
-    file_path = Path(settings.upload_dir) / "medcard" / safe_filename
-    file_path.parent.mkdir(parents=True, exist_ok=True)
-    
-    # Save file
-    with open(file_path, "wb") as f:
-        f.write(content)
-    
     # Parse visit_date if provided
     parsed_visit_date = None
     if visit_date:
@@ -92,17 +85,32 @@ async def upload_document(
         description=description,
         tags=tags,
         category=category,
-        file_path=str(file_path),
+        file_path=blob_store.key_for(stored.sha256),
         file_name=file.filename,
         file_type=file.content_type or "application/octet-stream",
-        file_size=file_size,
+        file_size=stored.size,
+        content_hash=stored.sha256,
         visit_date=parsed_visit_date,
     )
     
     db.add(document)
-    await db.commit()
+    try:
+        await db.commit()
+    except Exception:
+        # The object was written before the commit: do not leave it orphaned
+        await db.rollback()
+        await blob_store.discard_upload(stored.sha256)
+        raise
     await db.refresh(document)
     
+    # Thumbnail and preview are generated after the response is sent
+    background_tasks.add_task(
+        rendition_service.generate,
+        document.content_hash,
+        document.file_path,
+        document.file_type,
+    )
+    
     return document
 
 
@@ -112,7 +120,7 @@ async def get_documents(
     skip: int = Query(0, ge=0),
     limit: int = Query(50, ge=1, le=100),
     current_user: User = Depends(get_current_user),
-    db: AsyncSession = Depends(get_async_session),
+    db: AsyncSession = Depends(get_read_session),
 ):
     """
     Получить список документов пользователя.
@@ -145,7 +153,7 @@ async def get_documents(
 async def get_document(
     document_id: int,
     current_user: User = Depends(get_current_user),
-    db: AsyncSession = Depends(get_async_session),
+    db: AsyncSession = Depends(get_read_session),
 ):
     """Получить информацию о документе по ID."""
     result = await db.execute(
@@ -219,25 +227,33 @@ async def delete_document(
             detail="Документ не найден",
         )
     
-    # Delete file from disk
-    file_path = Path(document.file_path)
-    if file_path.exists():
-        file_path.unlink()
+    # Release stored file (deleted when no other record references it)
+    unused = await blob_store.release(db, document.content_hash, document.file_path)
     
     # Delete from DB
     await db.delete(document)
     await db.commit()
     
+    if unused:
+        await blob_store.purge(document.content_hash, document.file_path)
+    
     return None
 
 
 @router.get("/{document_id}/download")
 async def download_document(
     document_id: int,
+    request: Request,
     current_user: User = Depends(get_current_user),
     db: AsyncSession = Depends(get_async_session),
 ):
-    """Скачать файл документа."""
+    """
+    Скачать файл документа.
+    
+    Поддерживаются Range-запросы (частичная загрузка PDF) и условные
+    запросы по ETag/Last-Modified (ответ 304).
+    При хранении в S3 выполняется редирект (307) на временную подписанную ссылку.
+    """
     result = await db.execute(
         select(MedicalDocument).where(
             MedicalDocument.id == document_id,
@@ -252,23 +268,13 @@ async def download_document(
             detail="Документ не найден",
         )
     
-    file_path = Path(document.file_path)
-    if not file_path.exists():
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="Файл не найден на диске",
-        )
-    
-    return FileResponse(
-        path=str(file_path),
-        filename=document.file_name,
-        media_type=document.file_type,
-    )
+    return await _document_file_response(request, document, inline=False)
 
 
 @router.get("/{document_id}/view")
 async def view_document(
     document_id: int,
+    request: Request,
     current_user: User = Depends(get_current_user),
     db: AsyncSession = Depends(get_async_session),
 ):
@@ -276,6 +282,9 @@ async def view_document(
     Просмотр документа (inline в браузере).
     
     Для PDF/изображений отображается встроенным просмотрщиком браузера.
+    Поддерживаются Range-запросы (частичная загрузка PDF) и условные
+    запросы по ETag/Last-Modified (ответ 304).
+    При хранении в S3 выполняется редирект (307) на временную подписанную ссылку.
     """
     result = await db.execute(
         select(MedicalDocument).where(
@@ -291,16 +300,126 @@ async def view_document(
             detail="Документ не найден",
         )
     
-    file_path = Path(document.file_path)
-    if not file_path.exists():
+    return await _document_file_response(request, document, inline=True)
+
+
+@router.get("/{document_id}/thumbnail")
+async def get_document_thumbnail(
+    document_id: int,
+    request: Request,
+    current_user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_session),
+):
+    """
+    Миниатюра документа (до 256px, WebP или JPEG по заголовку Accept).
+    
+    Для PDF строится по первой странице. Предназначена для списков.
+    """
+    return await _document_rendition_response(request, db, document_id, current_user.id, "thumbnail")
+
+
+@router.get("/{document_id}/preview")
+async def get_document_preview(
+    document_id: int,
+    request: Request,
+    current_user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_session),
+):
+    """
+    Уменьшенное превью документа (до 1024px, WebP или JPEG по заголовку Accept).
+    
+    Для PDF строится по первой странице.
+    """
+    return await _document_rendition_response(request, db, document_id, current_user.id, "preview")
+
+
+async def _document_rendition_response(
+    request: Request,
+    db: AsyncSession,
+    document_id: int,
+    user_id: int,
+    name: str,
+) -> Response:
+    """Serve a rendition of a user's document."""
+    result = await db.execute(
+        select(MedicalDocument).where(
+            MedicalDocument.id == document_id,
+            MedicalDocument.user_id == user_id,
+        )
+    )
+    document = result.scalar_one_or_none()
+    
+    if not document:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
-            detail="Файл не найден на диске",
+            detail="Документ не найден",
         )
     
-    return FileResponse(
-        path=str(file_path),
-        media_type=document.file_type,
-        headers={"Content-Disposition": f"inline; filename={document.file_name}"},
+    rendition = await rendition_service.get(
+        document.content_hash,
+        document.file_path,
+        document.file_type,
+        name,
+        accept=request.headers.get("accept", ""),
     )
+    if rendition is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Превью для документа недоступно",
+        )
+    
+    return await rendition_service.response(request, rendition, document.created_at)
 
+
+async def _document_file_response(request: Request, document: MedicalDocument, inline: bool) -> Response:
+    """
+    Response with the document file.
+    
+    With an object store backend the client is redirected to a short-lived
+    presigned URL, so file bytes do not pass through the API workers.
+    Ownership is checked by the caller before the URL is issued.
+    Otherwise the file is served with ETag/Last-Modified validators and
+    byte-range support.
+    """
+    presigned_url = await blob_store.presigned_url(
+        document.content_hash,
+        document.file_name,
+        document.file_type,
+        inline=inline,
+    )
+    if presigned_url:
+        return RedirectResponse(
+            presigned_url,
+            status_code=status.HTTP_307_TEMPORARY_REDIRECT,
+            headers={"Cache-Control": "private, no-store"},
+        )
+    
+    headers = {"Content-Disposition": content_disposition(document.file_name, inline=inline)}
+    file_path = blob_store.local_path(document.content_hash, document.file_path)
+    content = None
+    
+    if file_path is not None:
+        if not file_path.exists():
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="Файл не найден на диске",
+            )
+    else:
+        try:
+            content = await blob_store.read(document.content_hash, document.file_path)
+        except Exception:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="Файл не найден в хранилище",
+            )
+    
+    return conditional_file_response(
+        request,
+        media_type=document.file_type,
+        content_hash=document.content_hash,
+        last_modified=document.created_at,
+        path=file_path,
+        content=content,
+        headers=headers,
+        max_age=settings.file_cache_max_age_seconds,
+    )
@@ -1,11 +1,12 @@
 from typing import Any, List, Optional
 from fastapi import APIRouter, Depends, Query
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, or_
-from app.core.database import get_async_session
+from sqlalchemy import select
+from app.core.database import get_read_session
 from app.core.security import get_current_user
 from app.models.user import User
 from app.models.product import Product
+from app.services.product_search import ProductSearchService
 from pydantic import BaseModel, ConfigDict
 
 router = APIRouter()
@@ -26,21 +27,13 @@ async def search_products(
     limit: int = 20,
     offset: int = 0,
     current_user: User = Depends(get_current_user),
-    session: AsyncSession = Depends(get_async_session),
+    session: AsyncSession = Depends(get_read_session),
 ):
-    """Search products."""
-    stmt = select(Product)
+    """Search products (ranked by relevance when q is given)."""
+    if q and q.strip():
+        return await ProductSearchService(session).search(q, limit=limit, offset=offset)
     
-    if q:
-        stmt = stmt.where(
-            or_(
-                Product.name.ilike(f"%{q}%"),
-                Product.description.ilike(f"%{q}%"),
-                Product.composition.ilike(f"%{q}%")
-            )
-        )
-        
-    stmt = stmt.limit(limit).offset(offset)
+    stmt = select(Product).limit(limit).offset(offset)
     result = await session.execute(stmt)
     products = result.scalars().all()
     
@@ -6,6 +6,7 @@ from app.core.database import get_async_session
 from app.core.security import get_current_user
 from app.models.user import User
 from app.models.patient_profile import PatientProfile
+from app.services.recommendations import invalidate_user_recommendations
 from pydantic import BaseModel, ConfigDict
 
 router = APIRouter()
@@ -65,6 +66,7 @@ async def update_my_profile(
         setattr(profile, field, value)
         
     await session.commit()
+    await invalidate_user_recommendations(current_user.id)
     await session.refresh(profile)
     return profile
 
@@ -8,7 +8,7 @@ from fastapi import APIRouter, HTTPException, status, Depends, Query
 from sqlalchemy import select, desc
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from app.core.database import get_async_session
+from app.core.database import get_async_session, get_read_session
 from app.core.security import get_current_user_id
 from app.services.recommendations import RecommendationService
 from app.models.analysis import Analysis, AnalysisStatus
@@ -22,7 +22,7 @@ router = APIRouter()
 )
 async def get_latest_recommendations(
     user_id: int = Depends(get_current_user_id),
-    db: AsyncSession = Depends(get_async_session),
+    db: AsyncSession = Depends(get_read_session),
 ) -> List[Dict[str, Any]]:
     """
     Получение рекомендаций из последнего обработанного анализа.
@@ -0,0 +1,157 @@
+"""
+Full-text search over the user's analyses and medical documents.
+"""
+
+from typing import List, Optional
+
+from fastapi import APIRouter, Depends, Query
+from sqlalchemy import Integer, String, func, literal, literal_column, select, union_all
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.database import get_read_session
+from app.core.security import get_current_user_id
+from app.models.analysis import Analysis, AnalysisFile
+from app.models.medical_document import MedicalDocument
+from app.schemas.search import SearchResponse, SearchResult, SearchResultType
+
+router = APIRouter()
+
+# Same configuration as the generated search_vector columns
+SEARCH_CONFIG = literal_column("'russian'::regconfig")
+
+HEADLINE_OPTIONS = 'StartSel=<b>, StopSel=</b>, MaxWords=25, MinWords=8, MaxFragments=2, FragmentDelimiter=" … "'
+
+# ts_rank_cd normalization: divide by 1 + log(document length)
+RANK_NORMALIZATION = 1
+
+
+@router.get(
+    "",
+    response_model=SearchResponse,
+    summary="Полнотекстовый поиск",
+)
+async def search(
+    q: str = Query(..., min_length=2, max_length=200, description="Поисковый запрос"),
+    types: Optional[List[SearchResultType]] = Query(None, description="Типы результатов (по умолчанию все)"),
+    limit: int = Query(20, ge=1, le=100),
+    user_id: int = Depends(get_current_user_id),
+    db: AsyncSession = Depends(get_read_session),
+):
+    """
+    Поиск по анализам (название, лаборатория, распознанный текст),
+    тексту загруженных файлов и документам медкарты.
+
+    Поддерживается синтаксис веб-поиска: "точная фраза", OR, -исключение.
+    Результаты отсортированы по релевантности, найденные слова в `snippet`
+    выделены тегами `<b></b>`.
+    """
+    ts_query = func.websearch_to_tsquery(SEARCH_CONFIG, q)
+    wanted = set(types or SearchResultType)
+
+    queries = []
+    if SearchResultType.ANALYSIS in wanted:
+        queries.append(_analysis_query(ts_query, user_id, limit))
+    if SearchResultType.ANALYSIS_FILE in wanted:
+        queries.append(_analysis_file_query(ts_query, user_id, limit))
+    if SearchResultType.DOCUMENT in wanted:
+        queries.append(_document_query(ts_query, user_id, limit))
+
+    # Each branch is ranked and limited on its own (headlines are only built
+    # for its top rows), then merged by rank in one round trip
+    hits = union_all(*[select(query.subquery()) for query in queries]).subquery()
+    stmt = select(hits).order_by(hits.c.rank.desc()).limit(limit)
+
+    result = await db.execute(stmt)
+    items = [
+        SearchResult(
+            type=row.type,
+            id=row.id,
+            analysis_id=row.analysis_id,
+            title=row.title,
+            snippet=row.snippet,
+            rank=row.rank,
+            created_at=row.created_at,
+        )
+        for row in result.all()
+    ]
+
+    return SearchResponse(query=q, total=len(items), items=items)
+
+
+def _analysis_query(ts_query, user_id: int, limit: int):
+    rank = func.ts_rank_cd(Analysis.search_vector, ts_query, RANK_NORMALIZATION)
+    return (
+        select(
+            literal(SearchResultType.ANALYSIS.value, String).label("type"),
+            Analysis.id.label("id"),
+            Analysis.id.label("analysis_id"),
+            Analysis.title.label("title"),
+            func.ts_headline(
+                SEARCH_CONFIG,
+                func.coalesce(Analysis.raw_text, Analysis.title),
+                ts_query,
+                HEADLINE_OPTIONS,
+            ).label("snippet"),
+            rank.label("rank"),
+            Analysis.created_at.label("created_at"),
+        )
+        .where(
+            Analysis.user_id == user_id,
+            Analysis.search_vector.op("@@")(ts_query),
+        )
+        .order_by(rank.desc())
+        .limit(limit)
+    )
+
+
+def _analysis_file_query(ts_query, user_id: int, limit: int):
+    rank = func.ts_rank_cd(AnalysisFile.search_vector, ts_query, RANK_NORMALIZATION)
+    return (
+        select(
+            literal(SearchResultType.ANALYSIS_FILE.value, String).label("type"),
+            AnalysisFile.id.label("id"),
+            AnalysisFile.analysis_id.label("analysis_id"),
+            Analysis.title.label("title"),
+            func.ts_headline(
+                SEARCH_CONFIG,
+                AnalysisFile.ocr_text,
+                ts_query,
+                HEADLINE_OPTIONS,
+            ).label("snippet"),
+            rank.label("rank"),
+            AnalysisFile.created_at.label("created_at"),
+        )
+        .join(Analysis, Analysis.id == AnalysisFile.analysis_id)
+        .where(
+            Analysis.user_id == user_id,
+            AnalysisFile.search_vector.op("@@")(ts_query),
+        )
+        .order_by(rank.desc())
+        .limit(limit)
+    )
+
+
+def _document_query(ts_query, user_id: int, limit: int):
+    rank = func.ts_rank_cd(MedicalDocument.search_vector, ts_query, RANK_NORMALIZATION)
+    return (
+        select(
+            literal(SearchResultType.DOCUMENT.value, String).label("type"),
+            MedicalDocument.id.label("id"),
+            literal(None, Integer).label("analysis_id"),
+            MedicalDocument.title.label("title"),
+            func.ts_headline(
+                SEARCH_CONFIG,
+                func.concat_ws(" ", MedicalDocument.title, MedicalDocument.tags, MedicalDocument.description),
+                ts_query,
+                HEADLINE_OPTIONS,
+            ).label("snippet"),
+            rank.label("rank"),
+            MedicalDocument.created_at.label("created_at"),
+        )
+        .where(
+            MedicalDocument.user_id == user_id,
+            MedicalDocument.search_vector.op("@@")(ts_query),
+        )
+        .order_by(rank.desc())
+        .limit(limit)
+    )
@@ -6,8 +6,15 @@ from fastapi import APIRouter, HTTPException, status, Depends
 from sqlalchemy import select, func
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from app.core.database import get_async_session
-from app.core.security import get_current_user_id, get_password_hash
+from app.core.database import get_async_session, get_read_session
+from app.core.security import (
+    create_token_pair,
+    get_current_user_id,
+    get_password_hash_async,
+    invalidate_user_principal,
+    revoke_all_user_tokens,
+    verify_password_async,
+)
 from app.models.user import User
 from app.models.analysis import Analysis
 from app.models.biomarker import UserBiomarker, BiomarkerStatus
@@ -24,7 +31,7 @@ router = APIRouter()
 )
 async def get_profile(
     user_id: int = Depends(get_current_user_id),
-    db: AsyncSession = Depends(get_async_session),
+    db: AsyncSession = Depends(get_read_session),
 ):
     """
     Получение профиля текущего пользователя.
@@ -77,8 +84,9 @@ async def update_profile(
     for field, value in update_dict.items():
         setattr(user, field, value)
     
-    await db.flush()
+    await db.commit()
     await db.refresh(user)
+    await invalidate_user_principal(user.id, user.token_version)
     
     return user
 
@@ -90,7 +98,7 @@ async def update_profile(
 )
 async def get_health_summary(
     user_id: int = Depends(get_current_user_id),
-    db: AsyncSession = Depends(get_async_session),
+    db: AsyncSession = Depends(get_read_session),
 ):
     """
     Получение общей сводки по здоровью пользователя:
@@ -182,9 +190,9 @@ async def change_password(
     Смена пароля пользователя.
     
     Требуется текущий пароль для подтверждения.
+    Ранее выданные токены перестают действовать, в ответе возвращается
+    новая пара токенов.
     """
-    from app.core.security import verify_password
-    
     stmt = select(User).where(User.id == user_id)
     result = await db.execute(stmt)
     user = result.scalar_one_or_none()
@@ -195,7 +203,7 @@ async def change_password(
             detail="Пользователь не найден",
         )
     
-    if not verify_password(current_password, user.hashed_password):
+    if not await verify_password_async(current_password, user.hashed_password):
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Неверный текущий пароль",
@@ -207,10 +215,11 @@ async def change_password(
             detail="Новый пароль должен содержать минимум 6 символов",
         )
     
-    user.hashed_password = get_password_hash(new_password)
-    await db.flush()
+    user.hashed_password = await get_password_hash_async(new_password)
+    await revoke_all_user_tokens(db, user)
     
-    return {"message": "Пароль успешно изменен"}
+    tokens = create_token_pair(user.id, user.token_version)
+    return {"message": "Пароль успешно изменен", **tokens.model_dump()}
 
 
 
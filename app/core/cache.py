@@ -0,0 +1,130 @@
+"""
+Small JSON cache with per-scope generations.
+
+Values live in Redis when it is enabled (shared by all workers) and in an
+in-process TTL/LRU map otherwise or when Redis is unavailable. Entries are
+deleted one by one or invalidated in bulk by bumping a scope generation
+(e.g. per user) that is part of every key, so no key scans are needed.
+"""
+
+import json
+import logging
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+from app.core.redis import get_redis
+
+logger = logging.getLogger(__name__)
+
+
+class LocalTTLCache:
+    """In-process LRU map with per-entry expiry."""
+
+    def __init__(self, maxsize: int, ttl: float):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data: "OrderedDict[str, Tuple[float, Any]]" = OrderedDict()
+
+    def get(self, key: str) -> Optional[Any]:
+        item = self._data.get(key)
+        if item is None:
+            return None
+        expires_at, value = item
+        if expires_at < time.monotonic():
+            del self._data[key]
+            return None
+        self._data.move_to_end(key)
+        return value
+
+    def set(self, key: str, value: Any, ttl: Optional[float] = None) -> None:
+        self._data[key] = (time.monotonic() + (ttl or self.ttl), value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def delete(self, key: str) -> None:
+        self._data.pop(key, None)
+
+    def clear(self) -> None:
+        self._data.clear()
+
+
+class Cache:
+    """Namespaced JSON cache (Redis or in-process) with scope generations."""
+
+    def __init__(self, namespace: str, ttl: int, maxsize: int = 1024):
+        self.namespace = namespace
+        self.ttl = ttl
+        self._local = LocalTTLCache(maxsize, ttl)
+        self._local_generations: Dict[str, int] = {}
+        self.hits = 0
+        self.misses = 0
+
+    def key(self, *parts: Any) -> str:
+        return ":".join([self.namespace, *(str(part) for part in parts)])
+
+    async def get(self, key: str) -> Optional[Any]:
+        value = await self._get(key)
+        if value is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return value
+
+    async def set(self, key: str, value: Any) -> None:
+        redis = get_redis()
+        if redis is not None:
+            try:
+                await redis.set(key, json.dumps(value, ensure_ascii=False), ex=self.ttl)
+                return
+            except Exception as e:
+                logger.warning(f"Redis cache unavailable, using local cache: {e}")
+        self._local.set(key, value)
+
+    async def delete(self, key: str) -> None:
+        self._local.delete(key)
+        redis = get_redis()
+        if redis is not None:
+            try:
+                await redis.delete(key)
+            except Exception as e:
+                logger.warning(f"Redis cache delete failed for {key}: {e}")
+
+    async def generation(self, scope: str) -> int:
+        """Current generation of a scope (part of cache keys)."""
+        redis = get_redis()
+        if redis is not None:
+            try:
+                return int(await redis.get(self._generation_key(scope)) or 0)
+            except Exception as e:
+                logger.warning(f"Redis cache unavailable, using local generation: {e}")
+        return self._local_generations.get(scope, 0)
+
+    async def invalidate(self, scope: str) -> None:
+        """Invalidate all entries keyed with the scope generation."""
+        # The local generation is bumped too: entries cached locally while
+        # Redis was down must not survive the invalidation
+        self._local_generations[scope] = self._local_generations.get(scope, 0) + 1
+        redis = get_redis()
+        if redis is not None:
+            try:
+                await redis.incr(self._generation_key(scope))
+            except Exception as e:
+                logger.warning(f"Redis cache invalidation failed for {scope}: {e}")
+
+    def stats(self) -> Dict[str, int]:
+        return {"hits": self.hits, "misses": self.misses}
+
+    async def _get(self, key: str) -> Optional[Any]:
+        redis = get_redis()
+        if redis is not None:
+            try:
+                raw = await redis.get(key)
+                return json.loads(raw) if raw is not None else None
+            except Exception as e:
+                logger.warning(f"Redis cache unavailable, using local cache: {e}")
+        return self._local.get(key)
+
+    def _generation_key(self, scope: str) -> str:
+        return self.key("generation", scope)
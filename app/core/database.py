@@ -3,25 +3,101 @@ Async database connection and session management.
 Uses SQLAlchemy 2.0 async API.
 """
 
+import itertools
+import logging
+import time
+import uuid
 from collections.abc import AsyncGenerator
-from typing import Annotated
+from typing import Annotated, Any, Dict, List, Optional
 
-from fastapi import Depends
+from fastapi import Depends, Request
+from sqlalchemy import event, exc
 from sqlalchemy.ext.asyncio import (
+    AsyncEngine,
     AsyncSession,
     async_sessionmaker,
     create_async_engine,
 )
-from sqlalchemy.orm import DeclarativeBase
+from sqlalchemy.orm import DeclarativeBase, Session
+from sqlalchemy.pool import AsyncAdaptedQueuePool
 
+from app.core.cache import Cache
 from app.core.config import settings
 
+logger = logging.getLogger(__name__)
+
 
 class Base(DeclarativeBase):
     """Base class for all SQLAlchemy models."""
     pass
 
 
+class InstrumentedQueuePool(AsyncAdaptedQueuePool):
+    """Queue pool that records how long checkouts wait for a connection."""
+    
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.checkouts = 0
+        self.timeouts = 0
+        self.wait_seconds_total = 0.0
+        self.wait_seconds_max = 0.0
+    
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            return super()._do_get()
+        except exc.TimeoutError:
+            self.timeouts += 1
+            raise
+        finally:
+            waited = time.perf_counter() - started
+            self.checkouts += 1
+            self.wait_seconds_total += waited
+            self.wait_seconds_max = max(self.wait_seconds_max, waited)
+    
+    def stats(self) -> Dict[str, Any]:
+        """Gauges and checkout wait counters for /metrics."""
+        return {
+            "size": self.size(),
+            "in_use": self.checkedout(),
+            "idle": self.checkedin(),
+            "overflow": max(0, self.overflow()),
+            "max_overflow": self._max_overflow,
+            "checkouts": self.checkouts,
+            "timeouts": self.timeouts,
+            "wait_ms_avg": round(self.wait_seconds_total / self.checkouts * 1000, 3) if self.checkouts else 0.0,
+            "wait_ms_max": round(self.wait_seconds_max * 1000, 3),
+        }
+
+
+def _postgres_engine_kwargs() -> Dict[str, Any]:
+    """Pool and asyncpg settings for PostgreSQL."""
+    statement_cache_size = settings.db_statement_cache_size
+    prepared_statement_cache_size = settings.db_prepared_statement_cache_size
+    connect_args: Dict[str, Any] = {}
+    
+    if settings.db_pgbouncer:
+        # In transaction pooling mode consecutive statements may run on different
+        # server connections: never reuse prepared statements, and name them
+        # uniquely so they cannot collide on a shared server connection
+        statement_cache_size = 0
+        prepared_statement_cache_size = 0
+        connect_args["prepared_statement_name_func"] = lambda: f"__asyncpg_{uuid.uuid4().hex}__"
+    
+    connect_args["statement_cache_size"] = statement_cache_size
+    connect_args["prepared_statement_cache_size"] = prepared_statement_cache_size
+    
+    return {
+        "poolclass": InstrumentedQueuePool,
+        "pool_size": settings.db_pool_size,
+        "max_overflow": settings.db_max_overflow,
+        "pool_timeout": settings.db_pool_timeout,
+        "pool_recycle": settings.db_pool_recycle,
+        "pool_pre_ping": settings.db_pool_pre_ping,
+        "connect_args": connect_args,
+    }
+
+
 # Create async engine
 # SQLite doesn't support pool_size/max_overflow
 engine_kwargs = {
@@ -30,14 +106,19 @@ engine_kwargs = {
 
 # Only add pool settings for PostgreSQL
 if "postgresql" in settings.async_database_url:
-    engine_kwargs.update({
-        "pool_pre_ping": True,
-        "pool_size": 5,
-        "max_overflow": 10,
-    })
+    engine_kwargs.update(_postgres_engine_kwargs())
 
 engine = create_async_engine(settings.async_database_url, **engine_kwargs)
 
+
+def pool_stats(db_engine: Optional[AsyncEngine] = None) -> Dict[str, Any]:
+    """Connection pool metrics (empty for pools without instrumentation)."""
+    pool = (db_engine or engine).sync_engine.pool
+    if isinstance(pool, InstrumentedQueuePool):
+        return pool.stats()
+    return {}
+
+
 # Session factory
 async_session_maker = async_sessionmaker(
     engine,
@@ -48,12 +129,121 @@ async_session_maker = async_sessionmaker(
 )
 
 
-async def get_async_session() -> AsyncGenerator[AsyncSession, None]:
+WRITE_FLAG = "wrote"
+
+
+@event.listens_for(Session, "after_flush")
+def _flag_flush_write(session: Session, flush_context) -> None:
+    session.info[WRITE_FLAG] = True
+
+
+@event.listens_for(Session, "do_orm_execute")
+def _flag_statement_write(orm_execute_state) -> None:
+    if orm_execute_state.is_insert or orm_execute_state.is_update or orm_execute_state.is_delete:
+        orm_execute_state.session.info[WRITE_FLAG] = True
+
+
+def _request_user_id(request: Request) -> Optional[int]:
+    """User id of a valid bearer token on the request, if any."""
+    from app.core.security import verify_token_signature
+    
+    scheme, _, token = request.headers.get("authorization", "").partition(" ")
+    if scheme.lower() != "bearer" or not token:
+        return None
+    token_data = verify_token_signature(token)
+    if token_data is None:
+        return None
+    try:
+        return int(token_data.sub)
+    except ValueError:
+        return None
+
+
+class ReplicaRouter:
+    """
+    Routes read-only sessions to read replicas.
+    
+    - Replicas are used round-robin; one that fails to connect is skipped
+      for `replica_failover_seconds` and reads fall back to the primary.
+    - Read-your-writes: after a user's own write, their reads go to the
+      primary for `replica_sticky_seconds` (longer than replication lag).
+      Stickiness is shared through Redis when enabled, per worker otherwise.
+    """
+    
+    def __init__(self, urls: List[str]):
+        self.engines = [create_async_engine(url, **engine_kwargs) for url in urls]
+        self._session_makers = [
+            async_sessionmaker(replica, class_=AsyncSession, expire_on_commit=False, autoflush=False)
+            for replica in self.engines
+        ]
+        self._down_until = [0.0] * len(self.engines)
+        self._next = itertools.count()
+        self._sticky = Cache("db_sticky", ttl=settings.replica_sticky_seconds, maxsize=10000)
+        self.replica_reads = 0
+        self.primary_reads = 0
+        self.failovers = 0
+    
+    @property
+    def enabled(self) -> bool:
+        return bool(self.engines)
+    
+    async def record_write(self, user_id: Optional[int]) -> None:
+        """Pin a user's reads to the primary after they wrote."""
+        if self.enabled and user_id is not None:
+            await self._sticky.set(self._sticky.key(user_id), 1)
+    
+    async def session(self, user_id: Optional[int]) -> AsyncSession:
+        """Replica session if possible, primary session otherwise."""
+        if self.enabled and not (user_id is not None and await self._sticky.get(self._sticky.key(user_id))):
+            start = next(self._next)
+            for offset in range(len(self.engines)):
+                index = (start + offset) % len(self.engines)
+                if self._down_until[index] > time.monotonic():
+                    continue
+                session = self._session_makers[index]()
+                try:
+                    # Check out a connection now so a dead replica fails over here
+                    await session.connection()
+                except Exception as e:
+                    await session.close()
+                    self._down_until[index] = time.monotonic() + settings.replica_failover_seconds
+                    self.failovers += 1
+                    logger.warning(f"Read replica {index} unavailable, failing over: {e}")
+                    continue
+                self.replica_reads += 1
+                return session
+        
+        self.primary_reads += 1
+        return async_session_maker()
+    
+    def stats(self) -> Dict[str, Any]:
+        now = time.monotonic()
+        return {
+            "replica_reads": self.replica_reads,
+            "primary_reads": self.primary_reads,
+            "failovers": self.failovers,
+            "replicas": [
+                {"healthy": self._down_until[index] <= now, "pool": pool_stats(replica)}
+                for index, replica in enumerate(self.engines)
+            ],
+        }
+    
+    async def dispose(self) -> None:
+        for replica in self.engines:
+            await replica.dispose()
+
+
+replica_router = ReplicaRouter(settings.async_replica_urls)
+
+
+async def get_async_session(request: Request) -> AsyncGenerator[AsyncSession, None]:
     """Dependency that provides an async database session."""
     async with async_session_maker() as session:
         try:
             yield session
             await session.commit()
+            if replica_router.enabled and session.info.get(WRITE_FLAG):
+                await replica_router.record_write(_request_user_id(request))
         except Exception:
             await session.rollback()
             raise
@@ -61,6 +251,18 @@ async def get_async_session() -> AsyncGenerator[AsyncSession, None]:
             await session.close()
 
 
+async def get_read_session(request: Request) -> AsyncGenerator[AsyncSession, None]:
+    """
+    Dependency for read-only endpoints: a read replica session when replicas
+    are configured (see ReplicaRouter), the primary otherwise. Never commits.
+    """
+    session = await replica_router.session(_request_user_id(request))
+    try:
+        yield session
+    finally:
+        await session.close()
+
+
 # Type alias for dependency injection
 AsyncSessionDep = Annotated[AsyncSession, Depends(get_async_session)]
-
+ReadSessionDep = Annotated[AsyncSession, Depends(get_read_session)]
@@ -0,0 +1,224 @@
+"""
+Rate limiting for expensive endpoints (OCR, LLM, bcrypt).
+
+Sliding-window counters (previous window weighted by its remaining
+overlap plus the current window): constant memory per client and no
+burst at window boundaries. Counters live in Redis when it is enabled,
+so limits hold across workers; otherwise (or when Redis is unavailable)
+they are kept per worker.
+
+Clients are identified by the user id of a valid bearer token, or by IP
+address for anonymous requests (login). Rules are configured per route in
+`settings.rate_limits`.
+"""
+
+import logging
+import math
+import re
+import time
+from dataclasses import dataclass
+from typing import Dict, Optional, Tuple
+
+from starlette.responses import JSONResponse
+from starlette.types import ASGIApp, Receive, Scope, Send
+
+from app.core.cache import LocalTTLCache
+from app.core.config import settings
+from app.core.redis import get_redis
+
+logger = logging.getLogger(__name__)
+
+SLIDING_WINDOW_SCRIPT = """
+local window = tonumber(ARGV[1])
+local limit = tonumber(ARGV[2])
+local t = redis.call('TIME')
+local now = tonumber(t[1]) + tonumber(t[2]) / 1000000
+local current = math.floor(now / window)
+local elapsed = now - current * window
+local current_key = KEYS[1] .. ':' .. current
+local previous = tonumber(redis.call('GET', KEYS[1] .. ':' .. (current - 1)) or '0')
+local count = tonumber(redis.call('GET', current_key) or '0')
+if previous * (window - elapsed) / window + count >= limit then
+    return {0, tostring(previous), tostring(count), tostring(elapsed)}
+end
+redis.call('INCR', current_key)
+redis.call('EXPIRE', current_key, window * 2)
+return {1, tostring(previous), tostring(count + 1), tostring(elapsed)}
+"""
+
+PERIODS = {"second": 1, "minute": 60, "hour": 3600, "day": 86400}
+RULE_RE = re.compile(r"^\s*(\d+)\s*/\s*(\d*)\s*(second|minute|hour|day)s?\s*$")
+
+
+@dataclass(frozen=True)
+class RateLimitRule:
+    """At most `limit` requests per `window` seconds."""
+    limit: int
+    window: int
+
+    @classmethod
+    def parse(cls, value: str) -> "RateLimitRule":
+        """Parse "10/minute", "100/hour" or "5/30second"."""
+        match = RULE_RE.match(value)
+        if not match:
+            raise ValueError(f"Invalid rate limit: {value!r}")
+        limit, multiplier, period = match.groups()
+        return cls(limit=int(limit), window=int(multiplier or 1) * PERIODS[period])
+
+
+def retry_after(rule: RateLimitRule, previous: float, count: float, elapsed: float) -> int:
+    """Seconds until the weighted count drops below the limit."""
+    window = rule.window
+    if count < rule.limit and previous > 0:
+        # Wait for the previous window's weight to decay enough
+        wait = window * (1 - (rule.limit - count) / previous) - elapsed
+    else:
+        # Current window is full: it becomes the previous one at the boundary
+        wait = (window - elapsed) + max(0.0, window * (1 - rule.limit / count))
+    return max(1, math.ceil(wait))
+
+
+class LocalSlidingWindow:
+    """Per-worker sliding-window counters."""
+
+    def __init__(self, maxsize: int = 100_000):
+        # key -> (window index, previous count, current count)
+        self._counters = LocalTTLCache(maxsize, ttl=86400)
+
+    def hit(self, key: str, rule: RateLimitRule) -> Tuple[bool, float, float, float]:
+        now = time.time()
+        current = int(now // rule.window)
+        elapsed = now - current * rule.window
+
+        window, previous, count = self._counters.get(key) or (current, 0, 0)
+        if window == current - 1:
+            previous, count = count, 0
+        elif window != current:
+            previous, count = 0, 0
+
+        allowed = previous * (rule.window - elapsed) / rule.window + count < rule.limit
+        if allowed:
+            count += 1
+        self._counters.set(key, (current, previous, count), ttl=rule.window * 2)
+        return allowed, previous, count, elapsed
+
+
+class RateLimiter:
+    """Sliding-window limiter with Redis and local backends."""
+
+    def __init__(self, rules: Dict[Tuple[str, str], RateLimitRule]):
+        self.rules = rules
+        self._local = LocalSlidingWindow()
+        self.rejected = 0
+
+    @classmethod
+    def from_settings(cls) -> "RateLimiter":
+        """Rules from settings.rate_limits ("METHOD /path" -> "N/period")."""
+        rules = {}
+        for route, value in settings.rate_limits.items():
+            method, _, path = route.partition(" ")
+            rules[(method.upper(), path)] = RateLimitRule.parse(value)
+        return cls(rules)
+
+    def rule_for(self, method: str, path: str) -> Optional[RateLimitRule]:
+        return self.rules.get((method, path.rstrip("/") or "/"))
+
+    async def hit(self, key: str, rule: RateLimitRule) -> Tuple[bool, int, int]:
+        """
+        Count a request.
+
+        Returns:
+            (allowed, remaining, retry_after seconds)
+        """
+        allowed, previous, count, elapsed = await self._hit(key, rule)
+        if allowed:
+            weighted = previous * (rule.window - elapsed) / rule.window + count
+            return True, max(0, int(rule.limit - weighted)), 0
+
+        self.rejected += 1
+        return False, 0, retry_after(rule, previous, count, elapsed)
+
+    def stats(self) -> Dict[str, int]:
+        return {"rejected": self.rejected}
+
+    async def _hit(self, key: str, rule: RateLimitRule) -> Tuple[bool, float, float, float]:
+        redis = get_redis()
+        if redis is not None:
+            try:
+                allowed, previous, count, elapsed = await redis.eval(
+                    SLIDING_WINDOW_SCRIPT, 1, f"ratelimit:{key}:{rule.window}", rule.window, rule.limit
+                )
+                return bool(int(allowed)), float(previous), float(count), float(elapsed)
+            except Exception as e:
+                logger.warning(f"Redis rate limiter unavailable, using local counters: {e}")
+        return self._local.hit(key, rule)
+
+
+rate_limiter = RateLimiter.from_settings()
+
+
+def _client_key(scope: Scope) -> str:
+    """user:<id> for a valid bearer token, ip:<address> otherwise."""
+    from app.core.security import verify_token_signature
+
+    headers = dict(scope.get("headers") or [])
+    authorization = headers.get(b"authorization", b"").decode("latin-1")
+    scheme, _, token = authorization.partition(" ")
+    if scheme.lower() == "bearer" and token:
+        token_data = verify_token_signature(token)
+        if token_data is not None:
+            return f"user:{token_data.sub}"
+
+    if settings.rate_limit_trust_forwarded:
+        forwarded = headers.get(b"x-forwarded-for", b"").decode("latin-1")
+        if forwarded:
+            return f"ip:{forwarded.split(',')[0].strip()}"
+
+    client = scope.get("client")
+    return f"ip:{client[0] if client else 'unknown'}"
+
+
+class RateLimitMiddleware:
+    """ASGI middleware answering 429 with Retry-After when a route limit is exceeded."""
+
+    def __init__(self, app: ASGIApp, limiter: RateLimiter = rate_limiter):
+        self.app = app
+        self.limiter = limiter
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or not settings.rate_limit_enabled:
+            await self.app(scope, receive, send)
+            return
+
+        rule = self.limiter.rule_for(scope["method"], scope["path"])
+        if rule is None:
+            await self.app(scope, receive, send)
+            return
+
+        client = _client_key(scope)
+        key = f"{scope['method']}:{scope['path']}:{client}"
+        allowed, remaining, wait = await self.limiter.hit(key, rule)
+
+        if not allowed:
+            logger.info(f"Rate limit exceeded: {scope['method']} {scope['path']} by {client}")
+            response = JSONResponse(
+                status_code=429,
+                content={"detail": "Слишком много запросов, повторите позже"},
+                headers={
+                    "Retry-After": str(wait),
+                    "X-RateLimit-Limit": str(rule.limit),
+                    "X-RateLimit-Remaining": "0",
+                },
+            )
+            await response(scope, receive, send)
+            return
+
+        async def send_with_headers(message) -> None:
+            if message["type"] == "http.response.start":
+                headers = list(message.get("headers", []))
+                headers.append((b"x-ratelimit-limit", str(rule.limit).encode()))
+                headers.append((b"x-ratelimit-remaining", str(remaining).encode()))
+                message["headers"] = headers
+            await send(message)
+
+        await self.app(scope, receive, send_with_headers)
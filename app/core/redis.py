@@ -0,0 +1,42 @@
+"""
+Shared Redis client.
+Redis is optional: when disabled in settings, helpers return None and
+callers fall back to in-process state.
+"""
+
+import logging
+from typing import TYPE_CHECKING, Optional
+
+from app.core.config import settings
+
+if TYPE_CHECKING:
+    from redis.asyncio import Redis
+
+logger = logging.getLogger(__name__)
+
+_client: Optional["Redis"] = None
+
+
+def get_redis() -> Optional["Redis"]:
+    """Return the shared async Redis client, or None if Redis is disabled."""
+    global _client
+
+    if not settings.redis_enabled:
+        return None
+
+    if _client is None:
+        from redis.asyncio import Redis
+
+        _client = Redis.from_url(settings.redis_url, decode_responses=True)
+        logger.info("Redis client initialized")
+
+    return _client
+
+
+async def close_redis() -> None:
+    """Close the shared Redis client (on application shutdown)."""
+    global _client
+
+    if _client is not None:
+        await _client.close()
+        _client = None
@@ -0,0 +1,172 @@
+"""
+Token revocation.
+
+Two mechanisms, both O(1) per request:
+
+- Single tokens (logout, refresh rotation) are revoked by `jti`. Revoked
+  ids are Redis keys expiring with the token; revoked_tokens is the
+  durable copy and is checked on a Redis miss (evicted key, Redis
+  disabled or down), with a short negative cache so unrevoked tokens do
+  not hit the database on every request.
+- All tokens of a user (logout everywhere, password change) are revoked
+  by bumping users.token_version; tokens carry the version they were
+  issued with. Current versions are cached in Redis and per worker.
+
+A token checked as unrevoked shortly before another worker revoked it is
+seen as revoked after at most `revocation_cache_ttl_seconds` (the negative
+cache); so is a token version bump without Redis.
+"""
+
+import logging
+from datetime import datetime, timezone
+from typing import Optional
+
+from sqlalchemy import delete, select
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+
+from app.core.cache import LocalTTLCache
+from app.core.config import settings
+from app.core.database import async_session_maker
+from app.core.redis import get_redis
+from app.models.revoked_token import RevokedToken
+from app.models.user import User
+
+logger = logging.getLogger(__name__)
+
+REVOKED_KEY = "revoked:{jti}"
+TOKEN_VERSION_KEY = "token_version:{user_id}"
+
+# Redis copy of token versions is a cache: bounds staleness if a publish fails
+TOKEN_VERSION_TTL = 3600
+
+
+class RevocationStore:
+    """Revoked jti set and per-user token versions."""
+
+    def __init__(self, cache_ttl: int, cache_size: int):
+        # jti -> True (revoked here) / False (checked, not revoked)
+        self._revoked = LocalTTLCache(cache_size, cache_ttl)
+        self._versions = LocalTTLCache(cache_size, cache_ttl)
+
+    async def revoke(self, jti: str, user_id: int, expires_at: datetime) -> bool:
+        """
+        Revoke a single token until its expiry.
+
+        Returns:
+            True if this call revoked the token, False if it was already revoked
+            (lets refresh rotation accept each refresh token exactly once)
+        """
+        ttl = int((expires_at - datetime.now(timezone.utc)).total_seconds()) + 1
+        if ttl <= 0:
+            return False
+
+        async with async_session_maker() as db:
+            result = await db.execute(
+                pg_insert(RevokedToken)
+                .values(jti=jti, user_id=user_id, expires_at=expires_at)
+                .on_conflict_do_nothing(index_elements=[RevokedToken.jti])
+                .returning(RevokedToken.jti)
+            )
+            revoked = result.scalar_one_or_none() is not None
+            # Expired revocations are useless: keep the table small
+            await db.execute(delete(RevokedToken).where(RevokedToken.expires_at < datetime.now(timezone.utc)))
+            await db.commit()
+
+        self._revoked.set(jti, True, ttl=ttl)
+        redis = get_redis()
+        if redis is not None:
+            try:
+                await redis.set(REVOKED_KEY.format(jti=jti), 1, ex=ttl)
+            except Exception as e:
+                logger.warning(f"Redis unavailable, revocation of {jti} stored in database only: {e}")
+        return revoked
+
+    async def is_revoked(self, jti: str) -> bool:
+        """
+        Whether a token id was revoked.
+
+        A Redis hit is authoritative; a miss is not (the key may have been
+        evicted or never written while Redis was down), so it falls through
+        to revoked_tokens and re-populates Redis. The negative cache keeps
+        unrevoked tokens from reaching the database on every request.
+        """
+        cached = self._revoked.get(jti)
+        if cached is not None:
+            return cached
+
+        redis = get_redis()
+        if redis is not None:
+            try:
+                if await redis.exists(REVOKED_KEY.format(jti=jti)):
+                    self._revoked.set(jti, True)
+                    return True
+            except Exception as e:
+                logger.warning(f"Redis unavailable, checking revocation in database: {e}")
+                redis = None
+
+        async with async_session_maker() as db:
+            result = await db.execute(select(RevokedToken.expires_at).where(RevokedToken.jti == jti))
+            expires_at = result.scalar_one_or_none()
+        revoked = expires_at is not None
+        self._revoked.set(jti, revoked)
+
+        if revoked and redis is not None:
+            ttl = int((expires_at - datetime.now(timezone.utc)).total_seconds()) + 1
+            if ttl > 0:
+                try:
+                    await redis.set(REVOKED_KEY.format(jti=jti), 1, ex=ttl)
+                except Exception as e:
+                    logger.warning(f"Could not cache revocation of {jti}: {e}")
+        return revoked
+
+    async def token_version(self, user_id: int) -> Optional[int]:
+        """Current token version of a user (None if the user does not exist)."""
+        cached = self._versions.get(user_id)
+        if cached is not None:
+            return cached
+
+        redis = get_redis()
+        key = TOKEN_VERSION_KEY.format(user_id=user_id)
+        if redis is not None:
+            try:
+                value = await redis.get(key)
+                if value is not None:
+                    self._versions.set(user_id, int(value))
+                    return int(value)
+            except Exception as e:
+                logger.warning(f"Redis unavailable, reading token version from database: {e}")
+                redis = None
+
+        async with async_session_maker() as db:
+            result = await db.execute(select(User.token_version).where(User.id == user_id))
+            version = result.scalar_one_or_none()
+        if version is None:
+            return None
+
+        self._versions.set(user_id, version)
+        if redis is not None:
+            try:
+                await redis.set(key, version, ex=TOKEN_VERSION_TTL)
+            except Exception as e:
+                logger.warning(f"Could not cache token version of user {user_id}: {e}")
+        return version
+
+    async def set_token_version(self, user_id: int, version: int) -> None:
+        """Publish a new token version (after it was committed to users)."""
+        self._versions.set(user_id, version)
+        redis = get_redis()
+        if redis is not None:
+            try:
+                await redis.set(
+                    TOKEN_VERSION_KEY.format(user_id=user_id),
+                    version,
+                    ex=TOKEN_VERSION_TTL,
+                )
+            except Exception as e:
+                logger.warning(f"Could not publish token version of user {user_id}: {e}")
+
+
+revocation_store = RevocationStore(
+    cache_ttl=settings.revocation_cache_ttl_seconds,
+    cache_size=settings.revocation_cache_size,
+)
@@ -2,23 +2,50 @@
 Security utilities: password hashing, JWT tokens, authentication.
 """
 
-from datetime import datetime, timedelta, timezone
-from typing import Annotated, Optional
+import asyncio
+import enum
+import hashlib
+import logging
+import os
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime, timedelta, timezone
+from typing import Annotated, Any, Dict, Optional, Tuple
 
 from fastapi import Depends, HTTPException, status
 from fastapi.security import HTTPAuthorizationCredentials, HTTPBearer
 from jose import JWTError, jwt
 from passlib.context import CryptContext
 from pydantic import BaseModel
+from sqlalchemy import DateTime, Enum as SQLEnum
 from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import make_transient_to_detached
 
+from app.core.cache import Cache, LocalTTLCache
 from app.core.config import settings
 from app.core.database import get_async_session
+from app.core.revocation import revocation_store
 from app.models.user import User
 
-
-# Password hashing
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+logger = logging.getLogger(__name__)
+
+# Password hashing. Hashes with a different cost than bcrypt_rounds are
+# reported by verify_and_update and rehashed on the next login.
+pwd_context = CryptContext(
+    schemes=["bcrypt"],
+    deprecated="auto",
+    bcrypt__default_rounds=settings.bcrypt_rounds,
+    bcrypt__min_rounds=settings.bcrypt_rounds,
+    bcrypt__max_rounds=settings.bcrypt_rounds,
+)
+
+# bcrypt releases the GIL, so a bounded thread pool keeps the event loop
+# free and scales hashing with CPU cores
+_password_executor = ThreadPoolExecutor(
+    max_workers=settings.password_hash_workers or os.cpu_count() or 1,
+    thread_name_prefix="password-hash",
+)
 
 # Bearer token scheme
 bearer_scheme = HTTPBearer(auto_error=False)
@@ -29,6 +56,8 @@ class TokenPayload(BaseModel):
     sub: str  # user_id
     exp: datetime
     type: str  # "access" or "refresh"
+    ver: int = 0  # User.token_version at issue time
+    jti: Optional[str] = None  # Token id (revocation), absent in older tokens
 
 
 class TokenPair(BaseModel):
@@ -48,69 +77,185 @@ def get_password_hash(password: str) -> str:
     return pwd_context.hash(password)
 
 
-def create_token(subject: str, token_type: str, expires_delta: timedelta) -> str:
+async def verify_password_async(plain_password: str, hashed_password: str) -> bool:
+    """Verify a password in the hashing thread pool."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_password_executor, verify_password, plain_password, hashed_password)
+
+
+async def verify_and_update_password_async(
+    plain_password: str,
+    hashed_password: str,
+) -> Tuple[bool, Optional[str]]:
+    """
+    Verify a password in the hashing thread pool.
+    
+    Returns:
+        (valid, new_hash) - new_hash is set when the stored hash uses an
+        outdated scheme or cost and should be replaced
+    """
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(
+        _password_executor, pwd_context.verify_and_update, plain_password, hashed_password
+    )
+
+
+async def get_password_hash_async(password: str) -> str:
+    """Hash a password in the hashing thread pool."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_password_executor, get_password_hash, password)
+
+
+def shutdown_password_executor() -> None:
+    """Stop hashing threads (on application shutdown)."""
+    _password_executor.shutdown(wait=False, cancel_futures=True)
+
+
+def create_token(subject: str, token_type: str, expires_delta: timedelta, version: int = 0) -> str:
     """Create a JWT token."""
     expire = datetime.now(timezone.utc) + expires_delta
     to_encode = {
         "sub": str(subject),
         "exp": expire,
         "type": token_type,
+        "ver": version,
+        "jti": uuid.uuid4().hex,
     }
     return jwt.encode(to_encode, settings.secret_key, algorithm=settings.algorithm)
 
 
-def create_access_token(user_id: int) -> str:
+def create_access_token(user_id: int, token_version: int = 0) -> str:
     """Create an access token for a user."""
     return create_token(
         subject=str(user_id),
         token_type="access",
         expires_delta=timedelta(minutes=settings.access_token_expire_minutes),
+        version=token_version,
     )
 
 
-def create_refresh_token(user_id: int) -> str:
+def create_refresh_token(user_id: int, token_version: int = 0) -> str:
     """Create a refresh token for a user."""
     return create_token(
         subject=str(user_id),
         token_type="refresh",
         expires_delta=timedelta(days=settings.refresh_token_expire_days),
+        version=token_version,
     )
 
 
-def create_token_pair(user_id: int) -> TokenPair:
+def create_token_pair(user_id: int, token_version: int = 0) -> TokenPair:
     """Create both access and refresh tokens."""
     return TokenPair(
-        access_token=create_access_token(user_id),
-        refresh_token=create_refresh_token(user_id),
+        access_token=create_access_token(user_id, token_version),
+        refresh_token=create_refresh_token(user_id, token_version),
     )
 
 
-def decode_token(token: str) -> Optional[TokenPayload]:
-    """Decode and validate a JWT token."""
+def _load_jwt_decoder():
+    """Signature-verifying decoder of the configured JWT backend."""
+    if settings.jwt_backend == "pyjwt":
+        try:
+            import jwt as pyjwt
+        except ImportError:
+            logger.warning("PyJWT is not installed, using python-jose for JWT decoding")
+        else:
+            def decode_pyjwt(token: str) -> Optional[dict]:
+                try:
+                    return pyjwt.decode(token, settings.secret_key, algorithms=[settings.algorithm])
+                except pyjwt.PyJWTError:
+                    return None
+            return decode_pyjwt
+
+    def decode_jose(token: str) -> Optional[dict]:
+        try:
+            return jwt.decode(token, settings.secret_key, algorithms=[settings.algorithm])
+        except JWTError:
+            return None
+    return decode_jose
+
+
+_decode_jwt = _load_jwt_decoder()
+
+# Verified tokens by digest. Entries expire with the token, so a cached
+# token is never accepted after its exp.
+_token_cache = LocalTTLCache(settings.token_cache_size, ttl=settings.access_token_expire_minutes * 60)
+
+
+async def decode_token(token: str) -> Optional[TokenPayload]:
+    """Decode and validate a JWT token, rejecting revoked tokens."""
+    token_data = verify_token_signature(token)
+    if token_data is None:
+        return None
+    
+    # Tokens revoked one by one (logout, used refresh tokens)
+    if token_data.jti and await revocation_store.is_revoked(token_data.jti):
+        return None
+    
+    # Tokens revoked in bulk (logout everywhere, password change)
+    try:
+        user_id = int(token_data.sub)
+    except ValueError:
+        return None
+    if await revocation_store.token_version(user_id) != token_data.ver:
+        return None
+    
+    return token_data
+
+
+async def revoke_token(token_data: TokenPayload) -> bool:
+    """Revoke a single token until it expires. False if it was already revoked."""
+    if not token_data.jti:
+        return False
+    return await revocation_store.revoke(token_data.jti, int(token_data.sub), token_data.exp)
+
+
+async def revoke_all_user_tokens(db: AsyncSession, user: User) -> None:
+    """Invalidate every token issued to the user so far (commits the session)."""
+    previous_version = user.token_version
+    user.token_version = previous_version + 1
+    await db.commit()
+    await revocation_store.set_token_version(user.id, user.token_version)
+    await invalidate_user_principal(user.id, previous_version)
+
+
+def verify_token_signature(token: str) -> Optional[TokenPayload]:
+    """Signature and expiry check (no revocation check), cached per token."""
+    if not settings.token_cache_size:
+        return _decode_token(token)
+    
+    digest = hashlib.sha256(token.encode()).hexdigest()
+    cached = _token_cache.get(digest)
+    if cached is not None:
+        return cached
+    
+    token_data = _decode_token(token)
+    if token_data is not None:
+        remaining = token_data.exp.timestamp() - time.time()
+        if remaining > 0:
+            _token_cache.set(digest, token_data, ttl=remaining)
+    return token_data
+
+
+def _decode_token(token: str) -> Optional[TokenPayload]:
+    payload = _decode_jwt(token)
+    if payload is None:
+        return None
     try:
-        payload = jwt.decode(
-            token,
-            settings.secret_key,
-            algorithms=[settings.algorithm],
-        )
         return TokenPayload(**payload)
-    except JWTError:
+    except ValueError:
         return None
 
 
-async def get_current_user_id(
+async def get_current_token(
     credentials: Annotated[Optional[HTTPAuthorizationCredentials], Depends(bearer_scheme)]
-) -> int:
+) -> Optional[TokenPayload]:
     """
-    Dependency that extracts and validates the current user from JWT.
-    Returns user_id.
-    
-    In demo mode (no token), returns demo user id = 1.
+    Dependency that validates the access token.
+    Returns None in demo mode (no token).
     """
-    # Demo mode: if no credentials, use demo user
     if not credentials:
-        # Return demo user id for testing/demo purposes
-        return 1
+        return None
     
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
@@ -118,7 +263,7 @@ async def get_current_user_id(
         headers={"WWW-Authenticate": "Bearer"},
     )
     
-    token_data = decode_token(credentials.credentials)
+    token_data = await decode_token(credentials.credentials)
     
     if not token_data:
         raise credentials_exception
@@ -129,27 +274,123 @@ async def get_current_user_id(
             detail="Используйте access token для авторизации",
         )
     
+    return token_data
+
+
+async def get_current_user_id(
+    token_data: Annotated[Optional[TokenPayload], Depends(get_current_token)]
+) -> int:
+    """
+    Dependency that extracts and validates the current user from JWT.
+    Returns user_id.
+    
+    In demo mode (no token), returns demo user id = 1.
+    """
+    # Demo mode: if no credentials, use demo user
+    if token_data is None:
+        # Return demo user id for testing/demo purposes
+        return 1
+    
     return int(token_data.sub)
 
 
+# Authenticated user snapshots: skip the users lookup on every request.
+# Keys include the token version, so tokens issued before a password
+# change never resolve to a cached principal.
+principal_cache = Cache(
+    "principal",
+    ttl=settings.principal_cache_ttl_seconds,
+    maxsize=settings.principal_cache_size,
+)
+
+
+def _principal_key(user_id: int, token_version: Optional[int]) -> str:
+    return principal_cache.key(user_id, "demo" if token_version is None else token_version)
+
+
+# Credentials never leave the database; on a cached principal these
+# attributes are unloaded
+PRINCIPAL_EXCLUDED_COLUMNS = frozenset({"hashed_password"})
+
+
+def _user_snapshot(user: User) -> Dict[str, Any]:
+    """JSON-serializable column values of a user."""
+    snapshot = {}
+    for column in User.__table__.columns:
+        if column.key in PRINCIPAL_EXCLUDED_COLUMNS:
+            continue
+        value = getattr(user, column.key)
+        if isinstance(value, (datetime, date)):
+            value = value.isoformat()
+        elif isinstance(value, enum.Enum):
+            value = value.value
+        snapshot[column.key] = value
+    return snapshot
+
+
+def _user_from_snapshot(snapshot: Dict[str, Any]) -> User:
+    """Detached User built from a snapshot (attach with merge(load=False))."""
+    values = {}
+    for column in User.__table__.columns:
+        if column.key not in snapshot:
+            continue
+        value = snapshot[column.key]
+        if value is not None and isinstance(column.type, DateTime):
+            value = datetime.fromisoformat(value)
+        elif value is not None and isinstance(column.type, SQLEnum) and column.type.enum_class:
+            value = column.type.enum_class(value)
+        values[column.key] = value
+    user = User(**values)
+    make_transient_to_detached(user)
+    return user
+
+
+async def invalidate_user_principal(user_id: int, token_version: int) -> None:
+    """Drop the cached principal (profile, password or active flag changed)."""
+    await principal_cache.delete(_principal_key(user_id, token_version))
+    if user_id == 1:
+        await principal_cache.delete(_principal_key(user_id, None))
+
+
 async def get_current_user(
     user_id: Annotated[int, Depends(get_current_user_id)],
+    token_data: Annotated[Optional[TokenPayload], Depends(get_current_token)],
     db: Annotated[AsyncSession, Depends(get_async_session)],
 ) -> User:
     """
     Dependency that returns the current authenticated user.
+    
+    Served from the principal cache when possible; the cached snapshot is
+    attached to the session without a SELECT.
     """
-    user = await db.get(User, user_id)
+    token_version = token_data.ver if token_data else None
+    cache_key = _principal_key(user_id, token_version)
+    
+    snapshot = await principal_cache.get(cache_key)
+    if snapshot is not None:
+        user = await db.merge(_user_from_snapshot(snapshot), load=False)
+    else:
+        user = await db.get(User, user_id)
+    
     if not user:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Пользователь не найден",
         )
+    if token_version is not None and user.token_version != token_version:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Токен отозван, авторизуйтесь заново",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
     if not user.is_active:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Пользователь неактивен",
         )
+    
+    if snapshot is None:
+        await principal_cache.set(cache_key, _user_snapshot(user))
     return user
 
 
@@ -12,7 +12,10 @@ from fastapi.responses import JSONResponse
 from fastapi.staticfiles import StaticFiles
 
 from app.core.config import settings
-from app.core.database import engine
+from app.core.database import engine, replica_router
+from app.core.rate_limit import RateLimitMiddleware
+from app.core.redis import close_redis
+from app.core.security import shutdown_password_executor
 from app.api.v1 import api_router
 
 # Configure logging
@@ -34,153 +37,44 @@ async def lifespan(app: FastAPI):
     upload_dir.mkdir(parents=True, exist_ok=True)
     logger.info(f"Upload directory: {upload_dir.absolute()}")
     
-    # Create demo user if not exists
-    await create_demo_user()
+    # Schema hotfixes, backfills and the demo user are applied by
+    # app/scripts/migrate.py before startup (see start.sh); only check here
+    await check_schema_version()
     
-    # HOTFIX: Ensure DB schema is correct (Railway workaround)
-    await ensure_db_schema()
+    # Build the in-memory product catalog index for recommendations
+    await build_catalog_index()
     
     yield
     
     # Shutdown
     logger.info("Shutting down...")
     await engine.dispose()
+    await replica_router.dispose()
+    await close_redis()
+    shutdown_password_executor()
 
 
-async def create_demo_user():
-    """Create demo user for testing if not exists."""
-    from app.core.database import async_session_maker, Base, engine
-    from app.models.user import User
-    from app.core.security import get_password_hash
-    from sqlalchemy import select
+async def check_schema_version():
+    """Warn if schema hotfixes/backfills were not applied (app/scripts/migrate.py)."""
+    from app.services.system_state import SCHEMA_VERSION, get_schema_version
     
-    try:
-        # Ensure tables exist (for fresh deployments)
-        async with engine.begin() as conn:
-            await conn.run_sync(Base.metadata.create_all)
-        
-        async with async_session_maker() as session:
-            # Check if demo user exists
-            result = await session.execute(select(User).where(User.id == 1))
-            user = result.scalar_one_or_none()
-            
-            if not user:
-                demo_user = User(
-                    id=1,
-                    email="demo@healthtracker.app",
-                    hashed_password=get_password_hash("demo123"),
-                    first_name="Демо",
-                    last_name="Пользователь",
-                    is_active=True,
-                    is_verified=True,
-                )
-                session.add(demo_user)
-                await session.commit()
-                logger.info("Demo user created (id=1)")
-            else:
-                logger.info("Demo user already exists")
-    except Exception as e:
-        logger.warning(f"Could not create demo user: {e}")
-
-
-async def ensure_db_schema():
-    """Ensure database schema is up to date (HOTFIX for Railway)."""
-    from app.core.database import engine
-    from sqlalchemy import text
-    
-    try:
-        async with engine.begin() as conn:
-            logger.info("🔧 Checking DB schema...")
-            # Try to make analysis_id nullable. This is idempotent in Postgres (mostly) 
-            # or harmless if it fails due to other reasons.
-            await conn.execute(text("ALTER TABLE user_biomarkers ALTER COLUMN analysis_id DROP NOT NULL"))
-            logger.info("✅ HOTFIX APPLIED: user_biomarkers.analysis_id is now nullable")
-            
-            # Add lab_name column if not exists
-            await conn.execute(text("""
-                ALTER TABLE user_biomarkers 
-                ADD COLUMN IF NOT EXISTS lab_name VARCHAR(100)
-            """))
-            logger.info("✅ Added lab_name column to user_biomarkers")
-            
-            # Make biomarkers.default_unit nullable (HOTFIX for AI extraction without units)
-            await conn.execute(text("ALTER TABLE biomarkers ALTER COLUMN default_unit DROP NOT NULL"))
-            logger.info("✅ HOTFIX APPLIED: biomarkers.default_unit is now nullable")
-    except Exception as e:
-        # It's okay if it fails (e.g. table doesn't exist yet, handled by migrations)
-        logger.warning(f"Schema hotfix note: {e}")
-    
-    # Add new biomarker category enum values (HOTFIX for Railway migration issues)
-    await add_biomarker_category_enums()
-    
-    # Update biomarker categories
-    await update_biomarker_categories()
-
-
-async def add_biomarker_category_enums():
-    """Add new biomarker category enum values if they don't exist."""
-    from app.core.database import engine
-    from sqlalchemy import text
-    from sqlalchemy.ext.asyncio import create_async_engine
-    
-    new_categories = [
-        'gastrointestinal', 'bone', 'musculoskeletal', 'adrenal',
-        'nervous', 'pancreas', 'parathyroid', 'cardiovascular',
-        'reproductive', 'urinary', 'immune', 'coagulation'
-    ]
-    
-    # ALTER TYPE ... ADD VALUE cannot run inside a transaction!
-    # Create a new engine with isolation_level AUTOCOMMIT
-    try:
-        autocommit_engine = create_async_engine(
-            str(engine.url),
-            isolation_level="AUTOCOMMIT"
+    version = await get_schema_version()
+    if version != SCHEMA_VERSION:
+        logger.warning(
+            f"Database schema version is {version}, expected {SCHEMA_VERSION}: "
+            "run `python app/scripts/migrate.py`"
         )
-        
-        async with autocommit_engine.connect() as conn:
-            for category in new_categories:
-                try:
-                    await conn.execute(text(f"ALTER TYPE biomarkercategory ADD VALUE IF NOT EXISTS '{category}'"))
-                    logger.info(f"  + Added enum value: {category}")
-                except Exception as e:
-                    # Value might already exist or other error - continue
-                    if 'already exists' not in str(e).lower() and 'duplicate' not in str(e).lower():
-                        logger.warning(f"  Could not add {category}: {e}")
-            
-        await autocommit_engine.dispose()
-        logger.info(f"✅ Biomarker category enum values checked/added")
-    except Exception as e:
-        logger.warning(f"Could not add biomarker category enums: {e}")
 
 
-async def update_biomarker_categories():
-    """Update categories for existing biomarkers based on their names."""
-    from app.core.database import async_session_maker
-    from app.models.biomarker import Biomarker, BiomarkerCategory
-    from app.api.v1.analyses import detect_biomarker_category
-    from sqlalchemy import select, update
+async def build_catalog_index():
+    """Load the product catalog into the in-memory recommendation index."""
+    from app.services.catalog_index import catalog_index
     
     try:
-        async with async_session_maker() as session:
-            # Get all biomarkers with OTHER category
-            stmt = select(Biomarker).where(Biomarker.category == BiomarkerCategory.OTHER)
-            result = await session.execute(stmt)
-            biomarkers = result.scalars().all()
-            
-            updated = 0
-            for bio in biomarkers:
-                new_category = detect_biomarker_category(bio.name_ru, bio.code)
-                if new_category != BiomarkerCategory.OTHER:
-                    bio.category = new_category
-                    updated += 1
-            
-            if updated > 0:
-                await session.commit()
-                logger.info(f"✅ Updated categories for {updated} biomarkers")
-            else:
-                logger.info("📋 All biomarker categories are up to date")
+        await catalog_index.refresh()
     except Exception as e:
-        logger.warning(f"Could not update biomarker categories: {e}")
+        # Recommendations fall back to database search until the index is built
+        logger.warning(f"Could not build catalog index: {e}")
 
 
 # Create FastAPI app
@@ -212,6 +106,9 @@ app = FastAPI(
     lifespan=lifespan,
 )
 
+# Rate limiting of expensive endpoints (added before CORS so 429s carry CORS headers)
+app.add_middleware(RateLimitMiddleware)
+
 # CORS middleware - allow all origins for development
 app.add_middleware(
     CORSMiddleware,
@@ -251,6 +148,25 @@ async def health_check():
     }
 
 
+@app.get("/metrics", tags=["Health"])
+async def metrics():
+    """Runtime metrics for capacity planning (DB pool, LLM queue, caches)."""
+    from app.services.llm_limiter import llm_limiter
+    from app.services.recommendations import recommendation_cache
+    from app.core.security import principal_cache
+    from app.core.rate_limit import rate_limiter
+    from app.core.database import pool_stats
+    
+    return {
+        "db_pool": pool_stats(),
+        "db_replicas": replica_router.stats(),
+        "llm": llm_limiter.stats(),
+        "recommendation_cache": recommendation_cache.stats(),
+        "principal_cache": principal_cache.stats(),
+        "rate_limit": rate_limiter.stats(),
+    }
+
+
 # Root redirect to docs
 @app.get("/", include_in_schema=False)
 async def root():
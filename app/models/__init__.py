@@ -5,6 +5,9 @@ from app.models.medical_document import MedicalDocument
 from app.models.product import Product
 from app.models.reminder import HealthReminder
 from app.models.patient_profile import PatientProfile
+from app.models.stored_blob import StoredBlob
+from app.models.system_state import SystemState
+from app.models.revoked_token import RevokedToken
 from app.core.database import Base
 
 __all__ = [
@@ -16,4 +19,7 @@ __all__ = [
     "Product",
     "HealthReminder",
     "PatientProfile",
+    "StoredBlob",
+    "SystemState",
+    "RevokedToken",
 ]
@@ -8,8 +8,9 @@ import enum
 
 from sqlalchemy import (
     String, Text, DateTime, ForeignKey, Integer,
-    Enum as SQLEnum, JSON
+    Enum as SQLEnum, JSON, Computed, Index
 )
+from sqlalchemy.dialects.postgresql import TSVECTOR
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 from sqlalchemy.sql import func
 
@@ -29,6 +30,15 @@ class AnalysisStatus(str, enum.Enum):
     MANUAL_REVIEW = "manual_review"  # Needs manual data entry
 
 
+class AnalysisStage(str, enum.Enum):
+    """Last pipeline checkpoint committed for an analysis."""
+    UPLOADED = "uploaded"                  # File stored, processing not started
+    OCR_DONE = "ocr_done"                  # Text recognition finished
+    BIOMARKERS_READY = "biomarkers_ready"  # Biomarkers stored and visible
+    SUMMARY_READY = "summary_ready"        # AI summary stored
+    RECOMMENDATIONS_READY = "recommendations_ready"  # Recommendations stored
+
+
 class AnalysisType(str, enum.Enum):
     """Type of medical analysis."""
     BLOOD_GENERAL = "blood_general"      # Общий анализ крови
@@ -49,6 +59,17 @@ class LabProvider(str, enum.Enum):
     OTHER = "other"
 
 
+# Full-text search vectors, maintained by PostgreSQL as generated columns.
+# The `russian` configuration stems Cyrillic words with the Russian stemmer
+# and Latin words (HGB, TSH, lab names) with the English one.
+ANALYSIS_SEARCH_VECTOR = (
+    "setweight(to_tsvector('russian', coalesce(title, '')), 'A') || "
+    "setweight(to_tsvector('russian', coalesce(lab_name, '')), 'B') || "
+    "setweight(to_tsvector('russian', coalesce(raw_text, '')), 'C')"
+)
+ANALYSIS_FILE_SEARCH_VECTOR = "setweight(to_tsvector('russian', coalesce(ocr_text, '')), 'C')"
+
+
 class Analysis(Base):
     """
     Medical analysis record.
@@ -95,6 +116,12 @@ class Analysis(Base):
         SQLEnum(AnalysisStatus),
         default=AnalysisStatus.PENDING,
     )
+    stage: Mapped[AnalysisStage] = mapped_column(
+        SQLEnum(AnalysisStage, native_enum=False, length=32),
+        default=AnalysisStage.UPLOADED,
+        server_default=AnalysisStage.UPLOADED.name,
+        comment="Last committed pipeline checkpoint",
+    )
     error_message: Mapped[Optional[str]] = mapped_column(
         Text,
         nullable=True,
@@ -135,6 +162,17 @@ class Analysis(Base):
         nullable=True,
     )
     
+    # Full-text search
+    search_vector = mapped_column(
+        TSVECTOR,
+        Computed(ANALYSIS_SEARCH_VECTOR, persisted=True),
+        deferred=True,
+    )
+    
+    __table_args__ = (
+        Index("ix_analyses_search_vector", "search_vector", postgresql_using="gin"),
+    )
+    
     # Relationships
     user: Mapped["User"] = relationship("User", back_populates="analyses")
     files: Mapped[list["AnalysisFile"]] = relationship(
@@ -169,10 +207,16 @@ class AnalysisFile(Base):
     content_type: Mapped[str] = mapped_column(String(100))
     file_size: Mapped[int] = mapped_column(Integer)
     file_path: Mapped[str] = mapped_column(String(500))
+    content_hash: Mapped[Optional[str]] = mapped_column(String(64), nullable=True, index=True)  # SHA-256, NULL for legacy files
     
     # Processing
     page_number: Mapped[int] = mapped_column(Integer, default=1)
     ocr_text: Mapped[Optional[str]] = mapped_column(Text, nullable=True)
+    search_vector = mapped_column(
+        TSVECTOR,
+        Computed(ANALYSIS_FILE_SEARCH_VECTOR, persisted=True),
+        deferred=True,
+    )
     
     # Timestamps
     created_at: Mapped[datetime] = mapped_column(
@@ -180,6 +224,10 @@ class AnalysisFile(Base):
         server_default=func.now(),
     )
     
+    __table_args__ = (
+        Index("ix_analysis_files_search_vector", "search_vector", postgresql_using="gin"),
+    )
+    
     # Relationships
     analysis: Mapped["Analysis"] = relationship("Analysis", back_populates="files")
 
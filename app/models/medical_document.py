@@ -6,8 +6,9 @@ from datetime import datetime
 from enum import Enum
 from typing import Optional
 
-from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Text, Enum as SQLEnum
-from sqlalchemy.orm import relationship
+from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Text, Enum as SQLEnum, Computed, Index
+from sqlalchemy.dialects.postgresql import TSVECTOR
+from sqlalchemy.orm import deferred, relationship
 
 from app.core.database import Base
 
@@ -20,6 +21,14 @@ class DocumentCategory(str, Enum):
     OTHER = "other"  # Прочие документы
 
 
+# Full-text search vector (generated column, see ANALYSIS_SEARCH_VECTOR)
+DOCUMENT_SEARCH_VECTOR = (
+    "setweight(to_tsvector('russian', coalesce(title, '')), 'A') || "
+    "setweight(to_tsvector('russian', coalesce(tags, '')), 'B') || "
+    "setweight(to_tsvector('russian', coalesce(description, '')), 'B')"
+)
+
+
 class MedicalDocument(Base):
     """Medical document storage (medcard)"""
     __tablename__ = "medical_documents"
@@ -37,12 +46,20 @@ class MedicalDocument(Base):
     file_name = Column(String(255), nullable=False)  # Оригинальное имя файла
     file_type = Column(String(50), nullable=False)  # MIME type (application/pdf, image/jpeg)
     file_size = Column(Integer, nullable=False)  # Размер в байтах
+    content_hash = Column(String(64), nullable=True, index=True)  # SHA-256 содержимого (NULL для старых файлов)
     
     # Dates
     visit_date = Column(DateTime, nullable=True)  # Дата визита/обследования
     created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
+    # Full-text search
+    search_vector = deferred(Column(TSVECTOR, Computed(DOCUMENT_SEARCH_VECTOR, persisted=True)))
+    
+    __table_args__ = (
+        Index("ix_medical_documents_search_vector", "search_vector", postgresql_using="gin"),
+    )
+    
     # Relationships
     user = relationship("User", back_populates="medical_documents")
 
@@ -1,11 +1,21 @@
-from sqlalchemy import Column, Integer, String, Float, Text
+from sqlalchemy import Column, Integer, String, Float, Text, Computed, Index
+from sqlalchemy.dialects.postgresql import TSVECTOR
+from sqlalchemy.orm import deferred
 from app.core.database import Base
 
+# Full-text search vector (generated column). The trigram index on name
+# needs the pg_trgm extension and is created by migrations.
+PRODUCT_SEARCH_VECTOR = (
+    "setweight(to_tsvector('russian', coalesce(name, '')), 'A') || "
+    "setweight(to_tsvector('russian', coalesce(composition, '')), 'B') || "
+    "setweight(to_tsvector('russian', coalesce(description, '')), 'C')"
+)
+
 class Product(Base):
     __tablename__ = "products"
 
     id = Column(Integer, primary_key=True, index=True)
-    external_id = Column(String, index=True, nullable=True) 
+    external_id = Column(String, unique=True, index=True, nullable=True)  # Feed id, upsert key
     
     name = Column(String, index=True)
     description = Column(Text, nullable=True)
@@ -19,3 +29,9 @@ class Product(Base):
     filter_stocks = Column(String, nullable=True)
     
     value = Column(String, nullable=True)
+    
+    search_vector = deferred(Column(TSVECTOR, Computed(PRODUCT_SEARCH_VECTOR, persisted=True)))
+    
+    __table_args__ = (
+        Index("ix_products_search_vector", "search_vector", postgresql_using="gin"),
+    )
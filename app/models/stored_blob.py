@@ -0,0 +1,32 @@
+"""
+Stored blob model - reference-counted content-addressed file storage.
+"""
+
+from datetime import datetime
+
+from sqlalchemy import BigInteger, DateTime, Integer, String
+from sqlalchemy.orm import Mapped, mapped_column
+from sqlalchemy.sql import func
+
+from app.core.database import Base
+
+
+class StoredBlob(Base):
+    """
+    File content stored once per SHA-256 hash.
+    Refcount tracks how many analysis files and documents point to it.
+    """
+
+    __tablename__ = "stored_blobs"
+
+    sha256: Mapped[str] = mapped_column(String(64), primary_key=True)
+    size: Mapped[int] = mapped_column(BigInteger)
+    refcount: Mapped[int] = mapped_column(Integer, default=0)
+
+    created_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True),
+        server_default=func.now(),
+    )
+
+    def __repr__(self) -> str:
+        return f"<StoredBlob(sha256={self.sha256[:12]}, refcount={self.refcount})>"
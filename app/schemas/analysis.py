@@ -8,7 +8,7 @@ from typing import Optional, List
 from pydantic import BaseModel, Field
 
 from app.schemas.base import BaseSchema, PaginatedResponse
-from app.models.analysis import AnalysisStatus, AnalysisType, LabProvider
+from app.models.analysis import AnalysisStage, AnalysisStatus, AnalysisType, LabProvider
 
 
 class AnalysisCreate(BaseModel):
@@ -68,6 +68,7 @@ class AnalysisResponse(BaseSchema):
     lab_name: Optional[str] = None
     analysis_date: Optional[datetime] = None
     status: AnalysisStatus
+    stage: AnalysisStage = AnalysisStage.UPLOADED
     error_message: Optional[str] = None
     ai_summary: Optional[str] = None
     ai_recommendations: Optional[dict] = None
@@ -114,13 +115,21 @@ class AnalysisUploadResponse(BaseModel):
 
 
 class AnalysisProcessingStatus(BaseModel):
-    """Processing status response."""
+    """Processing status response with partial results."""
     
     analysis_id: int
     status: AnalysisStatus
+    stage: AnalysisStage = AnalysisStage.UPLOADED
     progress: int = Field(0, ge=0, le=100)
     message: Optional[str] = None
     biomarkers_found: int = 0
+    summary_ready: bool = False
+    recommendations_ready: bool = False
+    
+    # Partial results (filled in as stages complete, only with include_results)
+    biomarkers: List[AnalysisBiomarkerResponse] = []
+    ai_summary: Optional[str] = None
+    ai_recommendations: Optional[dict] = None
 
 
 
@@ -22,6 +22,8 @@ class TokenPayload(BaseModel):
     sub: str
     exp: datetime
     type: str
+    ver: int = 0
+    jti: Optional[str] = None
 
 
 class RefreshTokenRequest(BaseModel):
@@ -30,4 +32,7 @@ class RefreshTokenRequest(BaseModel):
     refresh_token: str
 
 
-
+class LogoutRequest(BaseModel):
+    """Request to log out (optionally also revoking a refresh token)."""
+    
+    refresh_token: Optional[str] = None
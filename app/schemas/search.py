@@ -0,0 +1,38 @@
+"""
+Full-text search schemas.
+"""
+
+from datetime import datetime
+from enum import Enum
+from typing import List, Optional
+
+from pydantic import BaseModel
+
+from app.schemas.base import BaseSchema
+
+
+class SearchResultType(str, Enum):
+    """Kind of entity a search hit points to."""
+    ANALYSIS = "analysis"            # Analysis title, lab or OCR text
+    ANALYSIS_FILE = "analysis_file"  # OCR text of an uploaded file
+    DOCUMENT = "document"            # Medcard document
+
+
+class SearchResult(BaseSchema):
+    """Single search hit."""
+    
+    type: SearchResultType
+    id: int
+    analysis_id: Optional[int] = None
+    title: str
+    snippet: Optional[str] = None  # Matched fragment, terms wrapped in <b></b>
+    rank: float
+    created_at: datetime
+
+
+class SearchResponse(BaseModel):
+    """Ranked search results across analyses and documents."""
+    
+    query: str
+    total: int
+    items: List[SearchResult]
@@ -1,69 +1,240 @@
+"""
+Bulk product catalog import.
+
+Streams the CSV feed, validates and casts rows, loads them with PostgreSQL
+COPY into a temporary staging table and merges into `products` with
+`INSERT ... ON CONFLICT (external_id) DO UPDATE`. With --delete-missing,
+feed products (those with an external_id) missing from the feed are
+deleted; manually added products are never touched. Everything runs in
+one transaction, so a failed import leaves the catalog untouched.
+
+Usage: python app/scripts/import_products.py [catalog.csv] [--delete-missing]
+"""
+
+import argparse
 import asyncio
 import csv
-import sys
 import os
+import sys
+import time
+from typing import Iterator, List, Optional, Tuple
 
 # Add project root to path
 sys.path.append(os.getcwd())
 
+from sqlalchemy import text
+
 from app.core.database import async_session_maker
-from app.models.product import Product
-from sqlalchemy import select, delete
+from app.services.catalog_index import bump_catalog_version
+
+DEFAULT_CSV_FILE = "catalog_test_utf8.csv"
+
+# Rows sent per COPY call (bounds memory for large feeds)
+COPY_CHUNK_SIZE = 10_000
+
+STAGING_TABLE = "products_staging"
+
+# Staging columns in COPY order; line_no keeps the last row of duplicated ids
+STAGING_COLUMNS = [
+    "line_no",
+    "external_id",
+    "name",
+    "description",
+    "price",
+    "composition",
+    "composition_table",
+    "quantity",
+    "sale_count",
+    "filter_stocks",
+    "value",
+]
+
+PRODUCT_COLUMNS = STAGING_COLUMNS[1:]
+
+Record = Tuple
+
+
+class InvalidRow(ValueError):
+    """CSV row that cannot be imported."""
+
+
+def _text(value: Optional[str]) -> Optional[str]:
+    if value is None:
+        return None
+    value = value.strip()
+    return value or None
+
+
+def _float(value: Optional[str], field: str) -> float:
+    value = _text(value)
+    if value is None:
+        return 0.0
+    try:
+        return float(value.replace(",", ".").replace(" ", ""))
+    except ValueError:
+        raise InvalidRow(f"{field}: not a number ({value!r})")
+
+
+def _int(value: Optional[str], field: str) -> int:
+    value = _text(value)
+    if value is None:
+        return 0
+    try:
+        return int(float(value.replace(",", ".").replace(" ", "")))
+    except ValueError:
+        raise InvalidRow(f"{field}: not an integer ({value!r})")
+
 
-async def import_products():
+def parse_row(line_no: int, row: dict) -> Record:
+    """Validate and cast a CSV row into a staging record."""
+    external_id = _text(row.get("id"))
+    if not external_id:
+        raise InvalidRow("id is empty")
+    name = _text(row.get("name"))
+    if not name:
+        raise InvalidRow("name is empty")
+
+    return (
+        line_no,
+        external_id,
+        name,
+        row.get("description") or None,
+        _float(row.get("price"), "price"),
+        row.get("composition") or None,
+        row.get("composition_table") or None,
+        _int(row.get("quantity"), "quantity"),
+        _int(row.get("sale_count"), "sale_count"),
+        _text(row.get("filter_stocks")),
+        _text(row.get("value")),
+    )
+
+
+def read_chunks(csv_file: str, errors: List[str]) -> Iterator[List[Record]]:
+    """Stream valid records in chunks; invalid rows are collected in `errors`."""
+    chunk: List[Record] = []
+    with open(csv_file, "r", encoding="utf-8", newline="") as f:
+        reader = csv.DictReader(f, delimiter=";")
+        for line_no, row in enumerate(reader, start=2):
+            try:
+                chunk.append(parse_row(line_no, row))
+            except InvalidRow as e:
+                errors.append(f"line {line_no}: {e}")
+                continue
+            if len(chunk) >= COPY_CHUNK_SIZE:
+                yield chunk
+                chunk = []
+    if chunk:
+        yield chunk
+
+
+async def import_products(csv_file: str = DEFAULT_CSV_FILE, delete_missing: bool = False):
     print("Starting product import...")
-    
-    csv_file = 'catalog_test_utf8.csv'
+
     if not os.path.exists(csv_file):
         print(f"File {csv_file} not found!")
         return
 
+    started = time.perf_counter()
+    timings = {}
+    errors: List[str] = []
+
     async with async_session_maker() as session:
-        # Optional: Clear existing products
-        # await session.execute(delete(Product))
-        # await session.commit()
-        
-        batch_size = 1000
-        batch = []
-        count = 0
-        
-        with open(csv_file, 'r', encoding='utf-8') as f:
-            reader = csv.DictReader(f, delimiter=';')
-            
-            for row in reader:
-                try:
-                    product = Product(
-                        external_id=row.get('id'),
-                        name=row.get('name'),
-                        description=row.get('description'),
-                        price=float(row.get('price')) if row.get('price') and row.get('price').strip() else 0.0,
-                        composition=row.get('composition'),
-                        composition_table=row.get('composition_table'),
-                        quantity=int(row.get('quantity')) if row.get('quantity') and row.get('quantity').strip() else 0,
-                        sale_count=int(row.get('sale_count')) if row.get('sale_count') and row.get('sale_count').strip() else 0,
-                        filter_stocks=row.get('filter_stocks'),
-                        value=row.get('value')
-                    )
-                    batch.append(product)
-                    
-                    if len(batch) >= batch_size:
-                        session.add_all(batch)
-                        await session.commit()
-                        count += len(batch)
-                        print(f"Imported {count} products...")
-                        batch = []
-                        
-                except Exception as e:
-                    print(f"Error processing row {row.get('id')}: {e}")
-                    continue
-            
-            if batch:
-                session.add_all(batch)
-                await session.commit()
-                count += len(batch)
-                
-        print(f"Finished! Total imported: {count}")
+        connection = await session.connection()
+        raw_connection = await connection.get_raw_connection()
+        driver = raw_connection.driver_connection  # asyncpg connection (COPY support)
 
-if __name__ == "__main__":
-    asyncio.run(import_products())
+        await session.execute(text(f"""
+            CREATE TEMP TABLE {STAGING_TABLE} (
+                line_no integer NOT NULL,
+                external_id varchar NOT NULL,
+                name varchar NOT NULL,
+                description text,
+                price double precision,
+                composition text,
+                composition_table text,
+                quantity integer,
+                sale_count integer,
+                filter_stocks varchar,
+                value varchar
+            ) ON COMMIT DROP
+        """))
+
+        # 1. Stream the feed into the staging table
+        step = time.perf_counter()
+        loaded = 0
+        for chunk in read_chunks(csv_file, errors):
+            await driver.copy_records_to_table(STAGING_TABLE, records=chunk, columns=STAGING_COLUMNS)
+            loaded += len(chunk)
+            print(f"Loaded {loaded} rows...")
+        timings["copy"] = time.perf_counter() - step
+
+        if not loaded:
+            print("No valid rows in the feed, catalog left unchanged")
+            _print_errors(errors)
+            return
 
+        await session.execute(text(f"CREATE INDEX ON {STAGING_TABLE} (external_id)"))
+        await session.execute(text(f"ANALYZE {STAGING_TABLE}"))
+
+        # 2. Merge: the last row wins for duplicated ids; unchanged products are not rewritten
+        step = time.perf_counter()
+        columns = ", ".join(PRODUCT_COLUMNS)
+        updates = ", ".join(f"{column} = EXCLUDED.{column}" for column in PRODUCT_COLUMNS[1:])
+        changed = " OR ".join(
+            f"products.{column} IS DISTINCT FROM EXCLUDED.{column}" for column in PRODUCT_COLUMNS[1:]
+        )
+        result = await session.execute(text(f"""
+            INSERT INTO products ({columns})
+            SELECT DISTINCT ON (external_id) {columns}
+            FROM {STAGING_TABLE}
+            ORDER BY external_id, line_no DESC
+            ON CONFLICT (external_id) DO UPDATE SET {updates}
+            WHERE {changed}
+        """))
+        upserted = result.rowcount
+        timings["upsert"] = time.perf_counter() - step
+
+        # 3. Optionally remove imported products that are no longer in the feed
+        deleted = 0
+        if delete_missing:
+            step = time.perf_counter()
+            result = await session.execute(text(f"""
+                DELETE FROM products
+                WHERE products.external_id IS NOT NULL
+                AND NOT EXISTS (
+                    SELECT 1 FROM {STAGING_TABLE} s WHERE s.external_id = products.external_id
+                )
+            """))
+            deleted = result.rowcount
+            timings["delete"] = time.perf_counter() - step
+
+        # Tell running workers to rebuild their in-memory catalog index
+        await bump_catalog_version(session)
+
+        step = time.perf_counter()
+        await session.commit()
+        timings["commit"] = time.perf_counter() - step
+
+    total = time.perf_counter() - started
+    print(f"Finished! Rows loaded: {loaded}, inserted/updated: {upserted}, deleted: {deleted}, invalid: {len(errors)}")
+    print("Timings: " + ", ".join(f"{name} {seconds:.2f}s" for name, seconds in timings.items()) + f", total {total:.2f}s")
+    _print_errors(errors)
+
+
+def _print_errors(errors: List[str], limit: int = 20):
+    for error in errors[:limit]:
+        print(f"  Skipped {error}")
+    if len(errors) > limit:
+        print(f"  ... and {len(errors) - limit} more invalid rows")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Import product catalog from CSV")
+    parser.add_argument("csv_file", nargs="?", default=DEFAULT_CSV_FILE)
+    parser.add_argument(
+        "--delete-missing",
+        action="store_true",
+        help="Delete products with an external_id that are missing from the feed",
+    )
+    args = parser.parse_args()
+    asyncio.run(import_products(args.csv_file, delete_missing=args.delete_missing))
@@ -0,0 +1,272 @@
+"""
+One-shot schema hotfixes and data backfill.
+
+Runs after `alembic upgrade head` (see start.sh) instead of on every app
+startup: creates missing tables, applies the schema hotfixes, adds
+biomarker category enum values, backfills biomarker categories and creates
+the demo user.
+
+Safe to run from many replicas at once: a PostgreSQL advisory lock lets one
+process do the work while the others wait, and a schema version marker in
+system_state makes every later run a single query. Bump SCHEMA_VERSION
+(app/services/system_state.py) when a step changes (new hotfix, new
+category rules) so it runs again.
+
+Usage: python app/scripts/migrate.py [--force]
+"""
+
+import argparse
+import asyncio
+import logging
+import os
+import sys
+import time
+
+# Add project root to path
+sys.path.append(os.getcwd())
+
+from sqlalchemy import select, text
+from sqlalchemy.ext.asyncio import AsyncConnection
+
+from app.core.database import Base, async_session_maker, engine
+from app.services.system_state import (
+    SCHEMA_VERSION,
+    SCHEMA_VERSION_KEY,
+    get_schema_version,
+    set_state,
+)
+
+logger = logging.getLogger(__name__)
+
+# Arbitrary application-wide key for pg_advisory_lock
+MIGRATE_LOCK_ID = 7341902047
+
+NEW_BIOMARKER_CATEGORIES = [
+    'gastrointestinal', 'bone', 'musculoskeletal', 'adrenal',
+    'nervous', 'pancreas', 'parathyroid', 'cardiovascular',
+    'reproductive', 'urinary', 'immune', 'coagulation'
+]
+
+
+async def create_tables():
+    """Create tables missing from Alembic history (fresh deployments)."""
+    import app.models  # noqa: F401  (register all models on Base.metadata)
+
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    logger.info("✅ Tables checked/created")
+
+
+async def ensure_db_schema():
+    """Ensure database schema is up to date (HOTFIX for Railway)."""
+    async with engine.begin() as conn:
+        logger.info("🔧 Checking DB schema...")
+        await conn.execute(text("ALTER TABLE user_biomarkers ALTER COLUMN analysis_id DROP NOT NULL"))
+        logger.info("✅ HOTFIX APPLIED: user_biomarkers.analysis_id is now nullable")
+
+        # Add lab_name column if not exists
+        await conn.execute(text("""
+            ALTER TABLE user_biomarkers
+            ADD COLUMN IF NOT EXISTS lab_name VARCHAR(100)
+        """))
+        logger.info("✅ Added lab_name column to user_biomarkers")
+
+        # Add pipeline checkpoint column for progressive status
+        await conn.execute(text("""
+            ALTER TABLE analyses
+            ADD COLUMN IF NOT EXISTS stage VARCHAR(32) NOT NULL DEFAULT 'UPLOADED'
+        """))
+        logger.info("✅ Added stage column to analyses")
+
+        # Add token version for principal cache / token invalidation
+        await conn.execute(text("""
+            ALTER TABLE users
+            ADD COLUMN IF NOT EXISTS token_version INTEGER NOT NULL DEFAULT 0
+        """))
+        logger.info("✅ Added token_version column to users")
+
+        # Add content hash columns for content-addressed storage
+        for table in ("analysis_files", "medical_documents"):
+            await conn.execute(text(f"""
+                ALTER TABLE {table}
+                ADD COLUMN IF NOT EXISTS content_hash VARCHAR(64)
+            """))
+            await conn.execute(text(f"""
+                CREATE INDEX IF NOT EXISTS ix_{table}_content_hash ON {table} (content_hash)
+            """))
+        logger.info("✅ Added content_hash columns")
+
+        # Add full-text search vectors (generated columns, GIN indexed)
+        from app.models.analysis import ANALYSIS_SEARCH_VECTOR, ANALYSIS_FILE_SEARCH_VECTOR
+        from app.models.medical_document import DOCUMENT_SEARCH_VECTOR
+        from app.models.product import PRODUCT_SEARCH_VECTOR
+        search_vectors = {
+            "analyses": ANALYSIS_SEARCH_VECTOR,
+            "analysis_files": ANALYSIS_FILE_SEARCH_VECTOR,
+            "medical_documents": DOCUMENT_SEARCH_VECTOR,
+            "products": PRODUCT_SEARCH_VECTOR,
+        }
+        for table, expression in search_vectors.items():
+            await conn.execute(text(f"""
+                ALTER TABLE {table}
+                ADD COLUMN IF NOT EXISTS search_vector tsvector
+                GENERATED ALWAYS AS ({expression}) STORED
+            """))
+            await conn.execute(text(f"""
+                CREATE INDEX IF NOT EXISTS ix_{table}_search_vector ON {table} USING gin (search_vector)
+            """))
+        logger.info("✅ Added full-text search vectors")
+
+        # Make biomarkers.default_unit nullable (HOTFIX for AI extraction without units)
+        await conn.execute(text("ALTER TABLE biomarkers ALTER COLUMN default_unit DROP NOT NULL"))
+        logger.info("✅ HOTFIX APPLIED: biomarkers.default_unit is now nullable")
+
+
+async def create_trigram_index() -> bool:
+    """Trigram index for fuzzy product name search (needs pg_trgm extension)."""
+    try:
+        async with engine.begin() as conn:
+            await conn.execute(text("CREATE EXTENSION IF NOT EXISTS pg_trgm"))
+            await conn.execute(text("""
+                CREATE INDEX IF NOT EXISTS ix_products_name_trgm ON products USING gin (name gin_trgm_ops)
+            """))
+        logger.info("✅ Added trigram index on products.name")
+        return True
+    except Exception as e:
+        logger.warning(f"Could not create trigram index (pg_trgm unavailable?): {e}")
+        return False
+
+
+async def add_biomarker_category_enums(conn: AsyncConnection):
+    """
+    Add new biomarker category enum values if they don't exist.
+
+    ALTER TYPE ... ADD VALUE cannot run inside a transaction, so this uses
+    the AUTOCOMMIT connection holding the migration lock.
+    """
+    for category in NEW_BIOMARKER_CATEGORIES:
+        await conn.execute(text(f"ALTER TYPE biomarkercategory ADD VALUE IF NOT EXISTS '{category}'"))
+    logger.info("✅ Biomarker category enum values checked/added")
+
+
+async def update_biomarker_categories():
+    """Update categories for existing biomarkers based on their names."""
+    from app.models.biomarker import Biomarker, BiomarkerCategory
+    from app.services.biomarker_categories import detect_biomarker_category
+
+    async with async_session_maker() as session:
+        # Get all biomarkers with OTHER category
+        stmt = select(Biomarker).where(Biomarker.category == BiomarkerCategory.OTHER)
+        result = await session.execute(stmt)
+        biomarkers = result.scalars().all()
+
+        updated = 0
+        for bio in biomarkers:
+            new_category = detect_biomarker_category(bio.name_ru, bio.code)
+            if new_category != BiomarkerCategory.OTHER:
+                bio.category = new_category
+                updated += 1
+
+        if updated > 0:
+            await session.commit()
+            logger.info(f"✅ Updated categories for {updated} biomarkers")
+        else:
+            logger.info("📋 All biomarker categories are up to date")
+
+
+async def create_demo_user():
+    """Create demo user for testing if not exists."""
+    from app.models.user import User
+    from app.core.security import get_password_hash
+
+    async with async_session_maker() as session:
+        result = await session.execute(select(User).where(User.id == 1))
+        if result.scalar_one_or_none():
+            logger.info("Demo user already exists")
+            return
+
+        session.add(User(
+            id=1,
+            email="demo@healthtracker.app",
+            hashed_password=get_password_hash("demo123"),
+            first_name="Демо",
+            last_name="Пользователь",
+            is_active=True,
+            is_verified=True,
+        ))
+        await session.commit()
+        logger.info("Demo user created (id=1)")
+
+
+async def migrate(force: bool = False) -> bool:
+    """
+    Bring the schema and data up to SCHEMA_VERSION.
+
+    Returns:
+        True if the database is up to date afterwards
+    """
+    # Fast path: nothing to do, no lock taken
+    if not force and await get_schema_version() == SCHEMA_VERSION:
+        logger.info(f"Schema already at version {SCHEMA_VERSION}")
+        return True
+
+    async with engine.connect() as lock_conn:
+        lock_conn = await lock_conn.execution_options(isolation_level="AUTOCOMMIT")
+        started = time.perf_counter()
+        await lock_conn.execute(text("SELECT pg_advisory_lock(:id)"), {"id": MIGRATE_LOCK_ID})
+        waited = time.perf_counter() - started
+        if waited > 1:
+            logger.info(f"Waited {waited:.1f}s for the migration lock")
+
+        try:
+            # Another replica may have finished while we were waiting
+            if not force and await get_schema_version() == SCHEMA_VERSION:
+                logger.info(f"Schema already at version {SCHEMA_VERSION}")
+                return True
+
+            steps = [
+                ("create tables", create_tables),
+                ("schema hotfixes", ensure_db_schema),
+                ("category enums", lambda: add_biomarker_category_enums(lock_conn)),
+                ("category backfill", update_biomarker_categories),
+                ("demo user", create_demo_user),
+            ]
+            ok = True
+            for name, step in steps:
+                step_started = time.perf_counter()
+                try:
+                    await step()
+                    logger.info(f"   {name}: {time.perf_counter() - step_started:.2f}s")
+                except Exception as e:
+                    logger.warning(f"Migration step '{name}' failed: {e}")
+                    ok = False
+
+            # Optional: a missing pg_trgm only disables fuzzy product search
+            await create_trigram_index()
+
+            if not ok:
+                logger.warning("Schema version not updated, migration will be retried on next run")
+                return False
+
+            async with async_session_maker() as session:
+                await set_state(session, SCHEMA_VERSION_KEY, SCHEMA_VERSION)
+                await session.commit()
+            logger.info(f"✅ Schema at version {SCHEMA_VERSION} ({time.perf_counter() - started:.2f}s)")
+            return True
+        finally:
+            await lock_conn.execute(text("SELECT pg_advisory_unlock(:id)"), {"id": MIGRATE_LOCK_ID})
+
+
+async def main(force: bool) -> int:
+    try:
+        return 0 if await migrate(force) else 1
+    finally:
+        await engine.dispose()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+    parser = argparse.ArgumentParser(description="Apply schema hotfixes and backfills")
+    parser.add_argument("--force", action="store_true", help="Run all steps even if the schema is up to date")
+    args = parser.parse_args()
+    sys.exit(asyncio.run(main(args.force)))
@@ -1,16 +1,25 @@
 """
 Business logic services.
+
+Services are imported lazily on attribute access: OCR (PIL, pytesseract)
+and LLM (openai) stacks load only in processes that use them.
 """
 
-from app.services.ocr import OCRService
-from app.services.ai_parser import AIParserService
-from app.services.recommendations import RecommendationService
+from importlib import import_module
 
-__all__ = [
-    "OCRService",
-    "AIParserService",
-    "RecommendationService",
-]
+_LAZY_SERVICES = {
+    "OCRService": "app.services.ocr",
+    "AIParserService": "app.services.ai_parser",
+    "RecommendationService": "app.services.recommendations",
+}
 
+__all__ = list(_LAZY_SERVICES)
 
 
+def __getattr__(name: str):
+    module = _LAZY_SERVICES.get(name)
+    if module is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(import_module(module), name)
+    globals()[name] = value
+    return value
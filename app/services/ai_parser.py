@@ -6,12 +6,14 @@ Uses OpenAI GPT to extract and normalize biomarker values from OCR text.
 import json
 import logging
 import re
-from typing import Dict, List, Optional, Any
-
-from openai import AsyncOpenAI
+from typing import TYPE_CHECKING, AsyncIterator, Dict, List, Optional, Any
 
 from app.core.config import settings
 from app.models.analysis import LabProvider
+from app.services.llm_limiter import LLMPriority, llm_limiter
+
+if TYPE_CHECKING:
+    from openai import AsyncOpenAI
 
 logger = logging.getLogger(__name__)
 
@@ -197,6 +199,11 @@ SUMMARY_SYSTEM_PROMPT = """Ты — опытный врач-терапевт, с
 - Будь лаконичен но информативен"""
 
 
+class SummaryStreamInterrupted(Exception):
+    """The summary stream failed after some text was already yielded."""
+    pass
+
+
 class AIParserService:
     """
     Service for AI-powered analysis of medical documents.
@@ -205,19 +212,36 @@ class AIParserService:
     
     def __init__(self):
         """Initialize the AI parser service."""
-        # OpenRouter requires extra headers
-        self.client = AsyncOpenAI(
-            api_key=settings.openai_api_key,
-            base_url=settings.openai_base_url,
-            default_headers={
-                "HTTP-Referer": "https://healthtracker.app",
-                "X-Title": "Health Tracker Medical Analysis",
-            }
-        )
+        self._client: Optional["AsyncOpenAI"] = None
         self.model = settings.openai_model
         # Vision model - same as main model (gpt-4o-mini supports vision)
         self.vision_model = settings.openai_model
     
+    @property
+    def client(self) -> "AsyncOpenAI":
+        """OpenAI client, created (and the openai package imported) on first LLM call."""
+        if self._client is None:
+            from openai import AsyncOpenAI
+            
+            # OpenRouter requires extra headers
+            self._client = AsyncOpenAI(
+                api_key=settings.openai_api_key,
+                base_url=settings.openai_base_url,
+                default_headers={
+                    "HTTP-Referer": "https://healthtracker.app",
+                    "X-Title": "Health Tracker Medical Analysis",
+                },
+                max_retries=0,  # Retries are handled by llm_limiter
+            )
+        return self._client
+    
+    async def _chat_completion(self, priority: LLMPriority, **kwargs: Any):
+        """Create a chat completion through the shared LLM limiter."""
+        return await llm_limiter.run(
+            priority,
+            lambda: self.client.chat.completions.create(**kwargs),
+        )
+    
     async def extract_biomarkers_from_image(
         self,
         image_base64: str,
@@ -241,7 +265,8 @@ class AIParserService:
         try:
             logger.info("Using Vision API to extract biomarkers from image")
             
-            response = await self.client.chat.completions.create(
+            response = await self._chat_completion(
+                LLMPriority.EXTRACTION,
                 model=self.vision_model,
                 messages=[
                     {"role": "system", "content": EXTRACTION_SYSTEM_PROMPT},
@@ -328,7 +353,8 @@ class AIParserService:
             if lab_provider:
                 context = f"\n\nИзвестно, что это анализ из лаборатории: {lab_provider.value}"
             
-            response = await self.client.chat.completions.create(
+            response = await self._chat_completion(
+                LLMPriority.EXTRACTION,
                 model=self.model,
                 messages=[
                     {"role": "system", "content": EXTRACTION_SYSTEM_PROMPT},
@@ -389,139 +415,211 @@ class AIParserService:
             return self._generate_simple_summary(biomarkers)
         
         try:
-            # Prepare biomarker data for prompt
-            biomarker_text = self._format_biomarkers_for_prompt(biomarkers)
+            prompt = self._build_summary_prompt(biomarkers, user_gender, user_age, patient_profile)
             
-            # Build comprehensive patient context
-            context = "\n\n👤 **ПРОФИЛЬ ПАЦИЕНТА:**"
+            response = await self._chat_completion(
+                LLMPriority.SUMMARY,
+                **self._summary_request(prompt),
+            )
             
-            if user_gender:
-                context += f"\n- Пол: {'мужчина' if user_gender == 'male' else 'женщина'}"
-            if user_age:
-                context += f"\n- Возраст: {user_age} лет"
+            return response.choices[0].message.content
             
-            if patient_profile:
-                # Body parameters (height, weight, waist)
-                body = patient_profile.get("body_parameters", {})
-                if body:
-                    if body.get("height"):
-                        context += f"\n- Рост: {body['height']} см"
-                    if body.get("weight"):
-                        context += f"\n- Вес: {body['weight']} кг"
-                    if body.get("waist"):
-                        context += f"\n- Обхват талии: {body['waist']} см"
-                    # Calculate BMI if possible
-                    if body.get("height") and body.get("weight"):
-                        height_m = float(body["height"]) / 100
-                        bmi = float(body["weight"]) / (height_m * height_m)
-                        context += f"\n- ИМТ: {bmi:.1f}"
-                
-                # Allergies
-                allergies = patient_profile.get("allergies", [])
-                if allergies:
-                    context += f"\n- ⚠️ Аллергии: {', '.join(allergies)}"
-                
-                # Chronic diseases
-                chronic = patient_profile.get("chronic_diseases", [])
-                if chronic:
-                    context += f"\n- 🏥 Хронические заболевания: {', '.join(chronic)}"
-                
-                # Hereditary diseases
-                hereditary = patient_profile.get("hereditary_diseases", [])
-                if hereditary:
-                    context += f"\n- 🧬 Наследственные заболевания: {', '.join(hereditary)}"
-                
-                # Lifestyle
-                lifestyle = patient_profile.get("lifestyle", {})
-                if lifestyle:
-                    context += f"\n- Образ жизни: {json.dumps(lifestyle, ensure_ascii=False)}"
+        except Exception as e:
+            logger.error(f"Summary generation failed: {e}")
+            return self._generate_simple_summary(biomarkers)
+    
+    async def stream_summary(
+        self,
+        biomarkers: List[Dict[str, Any]],
+        user_gender: Optional[str] = None,
+        user_age: Optional[int] = None,
+        patient_profile: Optional[Dict[str, Any]] = None,
+    ) -> AsyncIterator[str]:
+        """
+        Stream a human-readable summary as text chunks.
+        Uses the chat completions stream API; same prompt as generate_summary.
+        
+        If AI is unavailable or fails before the first chunk, the simple
+        summary is yielded as a single chunk. A failure mid-stream raises
+        SummaryStreamInterrupted: the text received so far is incomplete and
+        must not be stored.
+        """
+        if not settings.openai_api_key:
+            yield self._generate_simple_summary(biomarkers)
+            return
+        
+        emitted = False
+        try:
+            prompt = self._build_summary_prompt(biomarkers, user_gender, user_age, patient_profile)
+            
+            chunks = llm_limiter.stream(
+                LLMPriority.SUMMARY,
+                lambda: self.client.chat.completions.create(
+                    **self._summary_request(prompt),
+                    stream=True,
+                ),
+            )
+            async for chunk in chunks:
+                if not chunk.choices:
+                    continue
+                delta = chunk.choices[0].delta.content
+                if delta:
+                    emitted = True
+                    yield delta
+                    
+        except Exception as e:
+            logger.error(f"Summary streaming failed: {e}")
+            if emitted:
+                raise SummaryStreamInterrupted(str(e)) from e
+            yield self._generate_simple_summary(biomarkers)
+    
+    def _summary_request(self, prompt: str) -> Dict[str, Any]:
+        """Chat completion parameters for summary generation."""
+        return {
+            "model": self.model,
+            "messages": [
+                {"role": "system", "content": SUMMARY_SYSTEM_PROMPT},
+                {"role": "user", "content": prompt},
+            ],
+            "temperature": 0.7,
+            "max_tokens": 2000,
+        }
+    
+    def _build_summary_prompt(
+        self,
+        biomarkers: List[Dict[str, Any]],
+        user_gender: Optional[str],
+        user_age: Optional[int],
+        patient_profile: Optional[Dict[str, Any]],
+    ) -> str:
+        """Build summary prompt with patient context."""
+        # Prepare biomarker data for prompt
+        biomarker_text = self._format_biomarkers_for_prompt(biomarkers)
+        
+        # Build comprehensive patient context
+        context = "\n\n👤 **ПРОФИЛЬ ПАЦИЕНТА:**"
+        
+        if user_gender:
+            context += f"\n- Пол: {'мужчина' if user_gender == 'male' else 'женщина'}"
+        if user_age:
+            context += f"\n- Возраст: {user_age} лет"
+        
+        if patient_profile:
+            # Body parameters (height, weight, waist)
+            body = patient_profile.get("body_parameters", {})
+            if body:
+                if body.get("height"):
+                    context += f"\n- Рост: {body['height']} см"
+                if body.get("weight"):
+                    context += f"\n- Вес: {body['weight']} кг"
+                if body.get("waist"):
+                    context += f"\n- Обхват талии: {body['waist']} см"
+                # Calculate BMI if possible
+                if body.get("height") and body.get("weight"):
+                    height_m = float(body["height"]) / 100
+                    bmi = float(body["weight"]) / (height_m * height_m)
+                    context += f"\n- ИМТ: {bmi:.1f}"
             
-            prompt = f"""Проанализируй результаты анализов с учётом профиля пациента.
+            # Allergies
+            allergies = patient_profile.get("allergies", [])
+            if allergies:
+                context += f"\n- ⚠️ Аллергии: {', '.join(allergies)}"
+            
+            # Chronic diseases
+            chronic = patient_profile.get("chronic_diseases", [])
+            if chronic:
+                context += f"\n- 🏥 Хронические заболевания: {', '.join(chronic)}"
+            
+            # Hereditary diseases
+            hereditary = patient_profile.get("hereditary_diseases", [])
+            if hereditary:
+                context += f"\n- 🧬 Наследственные заболевания: {', '.join(hereditary)}"
+            
+            # Lifestyle
+            lifestyle = patient_profile.get("lifestyle", {})
+            if lifestyle:
+                context += f"\n- Образ жизни: {json.dumps(lifestyle, ensure_ascii=False)}"
+        
+        prompt = f"""Проанализируй результаты анализов с учётом профиля пациента.
 {context}
 
 📊 **РЕЗУЛЬТАТЫ АНАЛИЗОВ:**
 {biomarker_text}
 
 Дай ПЕРСОНАЛИЗИРОВАННУЮ расшифровку, учитывая все особенности пациента."""
-            
-            response = await self.client.chat.completions.create(
-                model=self.model,
-                messages=[
-                    {"role": "system", "content": SUMMARY_SYSTEM_PROMPT},
-                    {"role": "user", "content": prompt},
-                ],
-                temperature=0.7,
-                max_tokens=2000,
-            )
-            
-            return response.choices[0].message.content
-            
-        except Exception as e:
-            logger.error(f"Summary generation failed: {e}")
-            return self._generate_simple_summary(biomarkers)
+        return prompt
     
-    async def generate_search_keywords(
+    async def rerank_products(
         self,
         biomarkers: List[Dict[str, Any]],
+        candidates: Dict[str, List[Dict[str, Any]]],
         patient_profile: Optional[Dict[str, Any]] = None,
-    ) -> Dict[str, List[str]]:
+        limit: int = 3,
+    ) -> Dict[str, List[int]]:
         """
-        Generate search keywords for finding products based on analysis.
+        Re-rank products matched by the rule engine.
         
+        Args:
+            biomarkers: Biomarkers the candidates were matched for
+            candidates: Group key (biomarker code) -> candidate products (id, name)
+            patient_profile: Profile used to avoid unsuitable products (allergies etc.)
+            limit: Max products per group
+            
         Returns:
-            Dict where key is biomarker code (or 'general') and value is list of keywords.
+            Group key -> product ids, best first (empty dict on failure)
         """
-        if not settings.openai_api_key:
+        if not settings.openai_api_key or not candidates:
             return {}
         
         try:
-            # Filter problem biomarkers
-            problem_biomarkers = [
-                b for b in biomarkers
-                if b.get("status") in ("low", "high", "critical_low", "critical_high")
-            ]
-            
-            if not problem_biomarkers:
-                return {}
-            
-            biomarker_text = self._format_biomarkers_for_prompt(problem_biomarkers)
+            biomarker_text = self._format_biomarkers_for_prompt(biomarkers)
+            candidates_text = "\n".join(
+                f"{group}: " + "; ".join(f"[{p['id']}] {p['name']}" for p in products)
+                for group, products in candidates.items()
+            )
             
             profile_text = ""
             if patient_profile:
                 profile_text = f"\nПрофиль пациента: {json.dumps(patient_profile, ensure_ascii=False)}"
             
-            prompt = f"""Проанализируй отклонения в анализах и предложи ключевые слова для поиска БАДов и товаров в интернет-магазине.
-            
+            prompt = f"""Для каждого показателя выбери до {limit} наиболее подходящих товаров из кандидатов и отсортируй их по убыванию пользы.
+Исключай товары, противопоказанные пациенту.
+
 Отклонения:
 {biomarker_text}
 {profile_text}
 
+Кандидаты (код: [id] название):
+{candidates_text}
+
 Верни JSON:
 {{
-    "biomarker_keywords": {{
-        "CODE": ["keyword1", "keyword2"]
-    }},
-    "general_keywords": ["keyword3", "keyword4"]
+    "CODE": [id1, id2]
 }}
 """
-            response = await self.client.chat.completions.create(
+            response = await self._chat_completion(
+                LLMPriority.RERANK,
                 model=self.model,
                 messages=[
                     {
-                        "role": "system", 
-                        "content": "Ты — помощник по поиску БАДов. Генерируй точные поисковые запросы на русском языке (например: 'Железо хелат', 'Витамин D3', 'Омега-3')."
+                        "role": "system",
+                        "content": "Ты — помощник по подбору БАДов. Выбирай только из предложенных кандидатов.",
                     },
                     {"role": "user", "content": prompt},
                 ],
-                temperature=0.3,
+                temperature=0,
                 response_format={"type": "json_object"},
             )
             
             result = json.loads(response.choices[0].message.content)
-            return result
+            return {
+                group: [int(product_id) for product_id in ids][:limit]
+                for group, ids in result.items()
+                if group in candidates and isinstance(ids, list)
+            }
             
         except Exception as e:
-            logger.error(f"Keyword generation failed: {e}")
+            logger.error(f"Product re-ranking failed: {e}")
             return {}
 
     async def generate_recommendations(
@@ -577,7 +675,8 @@ class AIParserService:
     ]
 }}"""
             
-            response = await self.client.chat.completions.create(
+            response = await self._chat_completion(
+                LLMPriority.RECOMMENDATIONS,
                 model=self.model,
                 messages=[
                     {
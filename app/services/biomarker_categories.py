@@ -0,0 +1,291 @@
+"""
+Biomarker category detection by name and code.
+
+Kept free of heavy dependencies: used by the analysis pipeline, manual
+biomarker entry and the category backfill in app/scripts/migrate.py.
+"""
+
+from app.models.biomarker import BiomarkerCategory
+
+
+def detect_biomarker_category(name: str, code: str) -> BiomarkerCategory:
+    """Определяет категорию биомаркера по названию или коду."""
+    name_lower = (name or "").lower()
+    code_lower = (code or "").lower()
+    combined = f"{name_lower} {code_lower}"
+    
+    # Гематология (кровь) - проверяем КОДЫ в первую очередь
+    hematology_codes = [
+        'hgb', 'hb', 'rbc', 'wbc', 'plt', 'hct',
+        'mcv', 'mch', 'mchc', 'rdw', 'mpv', 'pct', 'pdw',
+        'neu', 'neut', 'lym', 'lymph', 'mono', 'eos', 'baso',
+        'esr',
+    ]
+    if any(kw in code_lower for kw in hematology_codes):
+        return BiomarkerCategory.HEMATOLOGY
+    
+    # Гематология (кровь) - проверяем названия
+    hematology_keywords = [
+        'гемоглобин', 'hemoglobin',
+        'эритроцит', 'erythrocyte',
+        'лейкоцит', 'leukocyte',
+        'тромбоцит', 'platelet',
+        'гематокрит', 'hematocrit',
+        'тромбокрит', 'thrombocrit',
+        'ретикулоцит', 'reticulocyte',
+        'нейтрофил', 'neutrophil',
+        'лимфоцит', 'lymphocyte',
+        'моноцит', 'monocyte',
+        'эозинофил', 'eosinophil',
+        'базофил', 'basophil',
+        'соэ', 'coe',
+        'цп', 'цпэ', 'цветовой показатель', 'color index',
+        'палочкоядер', 'сегментоядер', 'юные',
+        'средний объем', 'среднее содержание', 'средняя концентрация',
+        'ширина распределения',
+    ]
+    if any(kw in combined for kw in hematology_keywords):
+        return BiomarkerCategory.HEMATOLOGY
+    
+    # Гормоны
+    hormone_keywords = [
+        'тестостерон', 'testosterone',
+        'эстрадиол', 'estradiol', 'e2',
+        'прогестерон', 'progesterone',
+        'пролактин', 'prolactin',
+        'лг', 'lh', 'лютеинизирующий',
+        'фсг', 'fsh', 'фолликулостимулирующий',
+        'кортизол', 'cortisol',
+        'инсулин', 'insulin',
+        'дгэа', 'dhea', 'dheas',
+        'андростендион', 'androstenedione',
+        'соматотропин', 'hgh', 'стг',
+    ]
+    if any(kw in combined for kw in hormone_keywords):
+        return BiomarkerCategory.HORMONES
+    
+    # Щитовидная железа
+    thyroid_keywords = [
+        'ттг', 'tsh', 'тиреотропный',
+        'т3', 't3', 'трийодтиронин',
+        'т4', 't4', 'тироксин',
+        'ат-тпо', 'anti-tpo', 'антитела к тиреоидной',
+        'ат-тг', 'anti-tg', 'тиреоглобулин',
+    ]
+    if any(kw in combined for kw in thyroid_keywords):
+        return BiomarkerCategory.THYROID
+    
+    # Витамины
+    vitamin_keywords = [
+        'витамин', 'vitamin', 'vit',
+        'b12', 'b6', 'b1', 'b2', 'b9',
+        'фолиевая', 'folic', 'folate',
+        'кальциферол', 'calciferol', '25-oh',
+        'ретинол', 'retinol',
+        'токоферол', 'tocopherol',
+        'аскорбиновая', 'ascorbic',
+    ]
+    if any(kw in combined for kw in vitamin_keywords):
+        return BiomarkerCategory.VITAMINS
+    
+    # Минералы
+    mineral_keywords = [
+        'железо', 'iron', 'fe ', 'ферритин', 'ferritin',
+        'цинк', 'zinc', 'zn',
+        'магний', 'magnesium', 'mg',
+        'кальций', 'calcium', 'ca',
+        'калий', 'potassium', 'k+',
+        'натрий', 'sodium', 'na+',
+        'селен', 'selenium',
+        'медь', 'copper', 'cu',
+        'фосфор', 'phosphorus',
+    ]
+    if any(kw in combined for kw in mineral_keywords):
+        return BiomarkerCategory.MINERALS
+    
+    # Липиды
+    lipid_keywords = [
+        'холестерин', 'cholesterol', 'chol',
+        'лпвп', 'hdl', 'лпнп', 'ldl', 'лпонп', 'vldl',
+        'триглицерид', 'triglyceride', 'tg',
+        'липопротеин', 'lipoprotein',
+    ]
+    if any(kw in combined for kw in lipid_keywords):
+        return BiomarkerCategory.LIPIDS
+    
+    # Печень
+    liver_keywords = [
+        'алт', 'alt', 'аланин',
+        'аст', 'ast', 'аспартат',
+        'ггт', 'ggt', 'гамма-глутамил',
+        'билирубин', 'bilirubin',
+        'щелочная фосфатаза', 'alkaline phosphatase', 'alp',
+    ]
+    if any(kw in combined for kw in liver_keywords):
+        return BiomarkerCategory.LIVER
+    
+    # Почки
+    kidney_keywords = [
+        'креатинин', 'creatinine',
+        'мочевина', 'urea', 'bun',
+        'мочевая кислота', 'uric acid',
+        'скф', 'gfr', 'клиренс',
+        'цистатин', 'cystatin',
+    ]
+    if any(kw in combined for kw in kidney_keywords):
+        return BiomarkerCategory.KIDNEY
+    
+    # Биохимия (общая)
+    biochem_keywords = [
+        'глюкоза', 'glucose', 'glu',
+        'белок', 'protein', 'альбумин', 'albumin',
+        'амилаза', 'amylase',
+        'липаза', 'lipase',
+        'лактатдегидрогеназа', 'ldh',
+        'кфк', 'ck', 'креатинкиназа',
+    ]
+    if any(kw in combined for kw in biochem_keywords):
+        return BiomarkerCategory.BIOCHEMISTRY
+    
+    # Воспаление
+    inflammation_keywords = [
+        'срб', 'crp', 'с-реактивный',
+        'прокальцитонин', 'procalcitonin',
+        'интерлейкин', 'interleukin', 'il-',
+    ]
+    if any(kw in combined for kw in inflammation_keywords):
+        return BiomarkerCategory.INFLAMMATION
+    
+    # ЖКТ (Желудочно-кишечный тракт)
+    gastrointestinal_keywords = [
+        'желудок', 'gastric', 'пепсин', 'pepsin',
+        'кишечник', 'intestinal',
+        'кальпротектин', 'calprotectin',
+        'эластаза', 'elastase',
+        'хеликобактер', 'helicobacter', 'h. pylori',
+        'гастрин', 'gastrin',
+    ]
+    if any(kw in combined for kw in gastrointestinal_keywords):
+        return BiomarkerCategory.GASTROINTESTINAL
+    
+    # Костная система
+    bone_keywords = [
+        'остеокальцин', 'osteocalcin',
+        'дезоксипиридинолин', 'dpd',
+        'β-crosslaps', 'crosslaps',
+        'костная щелочная фосфатаза', 'bone alp',
+    ]
+    if any(kw in combined for kw in bone_keywords):
+        return BiomarkerCategory.BONE
+    
+    # Костно-мышечная система
+    musculoskeletal_keywords = [
+        'миоглобин', 'myoglobin',
+        'креатинкиназа', 'creatine kinase', 'cpk',
+        'лактат', 'lactate',
+    ]
+    if any(kw in combined for kw in musculoskeletal_keywords):
+        return BiomarkerCategory.MUSCULOSKELETAL
+    
+    # Надпочечники
+    adrenal_keywords = [
+        'кортизол', 'cortisol',
+        'альдостерон', 'aldosterone',
+        'ренин', 'renin',
+        'адреналин', 'adrenaline', 'epinephrine',
+        'норадреналин', 'noradrenaline', 'norepinephrine',
+        'метанефрин', 'metanephrine',
+        'акт', 'acth', 'адренокортикотропный',
+    ]
+    if any(kw in combined for kw in adrenal_keywords):
+        return BiomarkerCategory.ADRENAL
+    
+    # Нервная система
+    nervous_keywords = [
+        'серотонин', 'serotonin',
+        'дофамин', 'dopamine',
+        'гомоцистеин', 'homocysteine',
+        'ацетилхолин', 'acetylcholine',
+    ]
+    if any(kw in combined for kw in nervous_keywords):
+        return BiomarkerCategory.NERVOUS
+    
+    # Поджелудочная железа
+    pancreas_keywords = [
+        'амилаза', 'amylase',
+        'липаза', 'lipase',
+        'инсулин', 'insulin',
+        'с-пептид', 'c-peptide',
+        'hba1c', 'гликированный гемоглобин', 'glycated',
+    ]
+    if any(kw in combined for kw in pancreas_keywords):
+        return BiomarkerCategory.PANCREAS
+    
+    # Паращитовидная железа
+    parathyroid_keywords = [
+        'паратгормон', 'parathyroid', 'pth',
+        'паратиреоидный', 'parathormone',
+    ]
+    if any(kw in combined for kw in parathyroid_keywords):
+        return BiomarkerCategory.PARATHYROID
+    
+    # Сердечно-сосудистая система
+    cardiovascular_keywords = [
+        'тропонин', 'troponin',
+        'bnp', 'мозговой натрийуретический',
+        'nt-probnp',
+        'миокард', 'cardiac',
+        'гомоцистеин', 'homocysteine',
+    ]
+    if any(kw in combined for kw in cardiovascular_keywords):
+        return BiomarkerCategory.CARDIOVASCULAR
+    
+    # Репродуктивная система
+    reproductive_keywords = [
+        'тестостерон', 'testosterone',
+        'эстрадиол', 'estradiol',
+        'прогестерон', 'progesterone',
+        'пролактин', 'prolactin',
+        'лг', 'lh', 'лютеинизирующий',
+        'фсг', 'fsh', 'фолликулостимулирующий',
+        'амг', 'amh', 'антимюллеров',
+        'ингибин', 'inhibin',
+        'хгч', 'hcg', 'хорионический',
+        'спермограмма', 'sperm',
+    ]
+    if any(kw in combined for kw in reproductive_keywords):
+        return BiomarkerCategory.REPRODUCTIVE
+    
+    # Мочевыделительная система
+    urinary_keywords = [
+        'моча', 'urine', 'urinary',
+        'альбумин в моче', 'microalbumin',
+        'белок в моче', 'proteinuria',
+    ]
+    if any(kw in combined for kw in urinary_keywords):
+        return BiomarkerCategory.URINARY
+    
+    # Иммунная система
+    immune_keywords = [
+        'иммуноглобулин', 'immunoglobulin', 'igg', 'iga', 'igm', 'ige',
+        'лимфоцит', 'lymphocyte',
+        'cd4', 'cd8', 'cd3',
+        'интерферон', 'interferon',
+        'цитокин', 'cytokine',
+    ]
+    if any(kw in combined for kw in immune_keywords):
+        return BiomarkerCategory.IMMUNE
+    
+    # Свертываемость крови
+    coagulation_keywords = [
+        'протромбин', 'prothrombin', 'пти', 'pt',
+        'мно', 'inr',
+        'ачтв', 'aptt', 'аптт',
+        'фибриноген', 'fibrinogen',
+        'д-димер', 'd-dimer',
+        'антитромбин', 'antithrombin',
+    ]
+    if any(kw in combined for kw in coagulation_keywords):
+        return BiomarkerCategory.COAGULATION
+    
+    return BiomarkerCategory.OTHER
@@ -0,0 +1,319 @@
+"""
+In-memory product catalog index for recommendation matching.
+
+The catalog is read-mostly and small enough to keep in every worker:
+product name, composition and description are tokenized, stemmed with a
+light Russian suffix stripper and stored in an inverted index ranked with
+BM25. Recommendation keyword groups for all biomarkers are then matched
+in one pass without database round trips.
+
+The index is built at startup. `import_products.py` bumps the
+`catalog_version` marker in system_state; workers notice the new version
+(checked at most every `catalog_refresh_interval_seconds`) and rebuild in
+the background while the old index keeps serving.
+"""
+
+import asyncio
+import bisect
+import heapq
+import logging
+import math
+import re
+import time
+import uuid
+from collections import defaultdict
+from dataclasses import dataclass
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import settings
+from app.core.database import async_session_maker
+from app.models.product import Product
+from app.services.system_state import get_state, set_state
+
+logger = logging.getLogger(__name__)
+
+CATALOG_VERSION_KEY = "catalog_version"
+
+# Field weights: a match in the name counts more than one in the description
+FIELD_WEIGHTS = {
+    "name": 3.0,
+    "composition": 1.5,
+    "description": 1.0,
+}
+
+# BM25 parameters
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+# Query terms at least this long also match longer terms with the same prefix
+MIN_PREFIX_LENGTH = 4
+MAX_PREFIX_EXPANSIONS = 50
+
+TAG_RE = re.compile(r"<[^>]+>")
+TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+CYRILLIC_RE = re.compile(r"[а-я]")
+
+# Vitamin letters are written in Cyrillic as often as in Latin ("витамин С",
+# "В12", "Д3"); fold them to Latin so both spellings give the same term
+VITAMIN_LETTERS = {"а": "a", "в": "b", "с": "c", "д": "d", "е": "e", "к": "k"}
+VITAMIN_AFTER_WORD_RE = re.compile(r"\b(витамин\w*\s+)([авсдек])(?=\d|\b)")
+VITAMIN_CODE_RE = re.compile(r"\b([авсдек])(\d+)\b")
+
+STOP_WORDS = frozenset({
+    "и", "в", "во", "на", "с", "со", "для", "по", "из", "к", "от", "до", "за",
+    "не", "или", "а", "но", "при", "без", "об", "о", "как", "что", "это",
+    "the", "and", "of", "for", "with", "in",
+})
+
+# Russian inflection endings, longest first
+RUSSIAN_ENDINGS = sorted(
+    {
+        "иями", "ями", "ами", "его", "ого", "ему", "ому", "ими", "ыми", "ией", "ей", "ой",
+        "ий", "ый", "ая", "яя", "ое", "ее", "ые", "ие", "ую", "юю", "ов", "ев", "ам",
+        "ям", "ах", "ях", "ом", "ем", "ию", "ия", "а", "я", "о", "е", "ы", "и",
+        "у", "ю", "ь", "й",
+    },
+    key=len,
+    reverse=True,
+)
+MIN_STEM_LENGTH = 3
+
+
+def stem(token: str) -> str:
+    """Light stemmer: strips one Russian inflection ending, keeps other tokens."""
+    if not CYRILLIC_RE.search(token):
+        return token
+    for ending in RUSSIAN_ENDINGS:
+        if token.endswith(ending) and len(token) - len(ending) >= MIN_STEM_LENGTH:
+            return token[: -len(ending)]
+    return token
+
+
+def normalize(text: str) -> str:
+    """Lowercase, fold ё and write vitamin letters in Latin."""
+    text = text.lower().replace("ё", "е")
+    text = VITAMIN_AFTER_WORD_RE.sub(lambda m: m.group(1) + VITAMIN_LETTERS[m.group(2)], text)
+    return VITAMIN_CODE_RE.sub(lambda m: VITAMIN_LETTERS[m.group(1)] + m.group(2), text)
+
+
+def analyze(text: Optional[str]) -> List[str]:
+    """Tokenize, normalize and stem text into index terms."""
+    if not text:
+        return []
+    text = normalize(TAG_RE.sub(" ", text))
+    return [stem(token) for token in TOKEN_RE.findall(text) if token not in STOP_WORDS]
+
+
+@dataclass(frozen=True)
+class CatalogProduct:
+    """Product fields needed for recommendations."""
+    id: int
+    name: str
+    price: Optional[float]
+    sale_count: int
+
+
+class CatalogIndex:
+    """Inverted index over the product catalog."""
+
+    def __init__(self, products: Iterable[Tuple[CatalogProduct, Dict[str, Optional[str]]]] = ()):
+        self.products: List[CatalogProduct] = []
+        self._postings: Dict[str, Dict[int, float]] = defaultdict(dict)
+        self._lengths: List[float] = []
+
+        for product, fields in products:
+            self._add(product, fields)
+
+        self._postings = dict(self._postings)
+        self._terms = sorted(self._postings)
+        self._avg_length = (sum(self._lengths) / len(self._lengths)) if self._lengths else 0.0
+
+    def __len__(self) -> int:
+        return len(self.products)
+
+    def search(self, keywords: Sequence[str], limit: int = 5) -> List[CatalogProduct]:
+        """Products matching any keyword (all words of a keyword must match)."""
+        scores = self._score(keywords)
+        best = heapq.nlargest(
+            limit,
+            scores.items(),
+            key=lambda item: (item[1], self.products[item[0]].sale_count, -self.products[item[0]].id),
+        )
+        return [self.products[doc] for doc, _ in best]
+
+    def search_grouped(
+        self,
+        keyword_groups: Dict[str, Sequence[str]],
+        limit: int = 3,
+    ) -> Dict[str, List[CatalogProduct]]:
+        """Top products for each keyword group (groups without matches are omitted)."""
+        grouped = {}
+        for key, keywords in keyword_groups.items():
+            found = self.search(keywords, limit=limit)
+            if found:
+                grouped[key] = found
+        return grouped
+
+    def _add(self, product: CatalogProduct, fields: Dict[str, Optional[str]]) -> None:
+        doc = len(self.products)
+        self.products.append(product)
+
+        length = 0.0
+        for field, weight in FIELD_WEIGHTS.items():
+            for term in analyze(fields.get(field)):
+                postings = self._postings[term]
+                postings[doc] = postings.get(doc, 0.0) + weight
+                length += weight
+        self._lengths.append(length)
+
+    def _score(self, keywords: Sequence[str]) -> Dict[int, float]:
+        scores: Dict[int, float] = defaultdict(float)
+
+        for keyword in keywords:
+            terms = list(dict.fromkeys(analyze(keyword)))
+            if not terms:
+                continue
+
+            term_postings = [self._matching_postings(term) for term in terms]
+            if not all(term_postings):
+                continue
+
+            # Documents containing every word of the keyword
+            term_postings.sort(key=len)
+            candidates = set(term_postings[0])
+            for postings in term_postings[1:]:
+                candidates.intersection_update(postings)
+
+            idfs = [self._idf(postings) for postings in term_postings]
+            for doc in candidates:
+                norm = BM25_K1 * (1 - BM25_B + BM25_B * self._lengths[doc] / self._avg_length)
+                for postings, idf in zip(term_postings, idfs):
+                    tf = postings[doc]
+                    scores[doc] += idf * tf * (BM25_K1 + 1) / (tf + norm)
+
+        return scores
+
+    def _matching_postings(self, term: str) -> Dict[int, float]:
+        """Postings of the term, merged with terms it is a prefix of."""
+        exact = self._postings.get(term)
+        if len(term) < MIN_PREFIX_LENGTH:
+            return exact or {}
+
+        merged: Dict[int, float] = dict(exact) if exact else {}
+        start = bisect.bisect_right(self._terms, term)
+        for candidate in self._terms[start:start + MAX_PREFIX_EXPANSIONS]:
+            if not candidate.startswith(term):
+                break
+            for doc, tf in self._postings[candidate].items():
+                merged[doc] = max(merged.get(doc, 0.0), tf)
+        return merged
+
+    def _idf(self, postings: Dict[int, float]) -> float:
+        n = len(self.products)
+        return math.log(1 + (n - len(postings) + 0.5) / (len(postings) + 0.5))
+
+
+class CatalogIndexManager:
+    """Holds the current index and rebuilds it when the catalog version changes."""
+
+    def __init__(self, refresh_interval: float):
+        self.refresh_interval = refresh_interval
+        self.index: Optional[CatalogIndex] = None
+        self.version: Optional[str] = None
+        self._checked_at = 0.0
+        self._lock = asyncio.Lock()
+        self._refresh_task: Optional[asyncio.Task] = None
+
+    async def refresh(self) -> None:
+        """
+        Load the catalog from the database and swap in a new index.
+
+        Callers queued on the lock (cold start, overlapping version checks)
+        find the index already at the current version and do not rebuild it.
+        """
+        async with self._lock:
+            started = time.monotonic()
+            async with async_session_maker() as db:
+                version = await get_state(db, CATALOG_VERSION_KEY)
+                if self.index is not None and version == self.version:
+                    self._checked_at = time.monotonic()
+                    return
+                result = await db.execute(
+                    select(
+                        Product.id,
+                        Product.name,
+                        Product.price,
+                        Product.sale_count,
+                        Product.composition,
+                        Product.description,
+                    )
+                )
+                rows = result.all()
+
+            def build() -> CatalogIndex:
+                return CatalogIndex(
+                    (
+                        CatalogProduct(id=row.id, name=row.name or "", price=row.price, sale_count=row.sale_count or 0),
+                        {"name": row.name, "composition": row.composition, "description": row.description},
+                    )
+                    for row in rows
+                )
+
+            # Tokenizing the catalog is CPU work, keep the event loop responsive
+            self.index = await asyncio.to_thread(build)
+            self.version = version
+            self._checked_at = time.monotonic()
+            logger.info(
+                f"Catalog index built: {len(self.index)} products, "
+                f"version {version}, {time.monotonic() - started:.2f}s"
+            )
+
+    async def get(self) -> Optional[CatalogIndex]:
+        """
+        Current index. Builds it on first use; afterwards checks the catalog
+        version at most once per refresh interval and rebuilds in background.
+        Returns None if the index cannot be built.
+        """
+        if self.index is None:
+            try:
+                await self.refresh()
+            except Exception as e:
+                logger.warning(f"Catalog index unavailable: {e}")
+                return None
+            return self.index
+
+        if time.monotonic() - self._checked_at >= self.refresh_interval:
+            self._checked_at = time.monotonic()
+            try:
+                async with async_session_maker() as db:
+                    version = await get_state(db, CATALOG_VERSION_KEY)
+                if version != self.version and not self._refreshing:
+                    logger.info(f"Catalog version changed ({self.version} -> {version}), rebuilding index")
+                    self._refresh_task = asyncio.create_task(self._refresh_in_background())
+            except Exception as e:
+                logger.warning(f"Catalog version check failed: {e}")
+
+        return self.index
+
+    @property
+    def _refreshing(self) -> bool:
+        return self._refresh_task is not None and not self._refresh_task.done()
+
+    async def _refresh_in_background(self) -> None:
+        try:
+            await self.refresh()
+        except Exception as e:
+            logger.warning(f"Catalog index rebuild failed: {e}")
+
+
+async def bump_catalog_version(db: AsyncSession) -> str:
+    """Mark the catalog as changed so that workers rebuild their index. The caller commits."""
+    version = uuid.uuid4().hex
+    await set_state(db, CATALOG_VERSION_KEY, version)
+    return version
+
+
+catalog_index = CatalogIndexManager(settings.catalog_refresh_interval_seconds)
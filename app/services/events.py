@@ -0,0 +1,128 @@
+"""
+Event bus for analysis processing progress.
+
+The pipeline publishes stage transitions, SSE endpoints subscribe to them.
+Events are delivered in-process by default; with Redis enabled they go
+through Redis pub/sub, so subscribers on other workers receive them too.
+In-process subscriptions miss events of pipelines running in other
+workers, so SSE endpoints poll the database on each keepalive instead.
+"""
+
+import asyncio
+import json
+import logging
+from collections import defaultdict
+from typing import Any, Dict, Optional, Set
+
+from app.core.redis import get_redis
+
+logger = logging.getLogger(__name__)
+
+CHANNEL_PREFIX = "analysis-events:"
+
+
+def format_sse(data: Dict[str, Any], event: Optional[str] = None) -> str:
+    """Format a Server-Sent Events message."""
+    message = ""
+    if event:
+        message += f"event: {event}\n"
+    payload = json.dumps(data, ensure_ascii=False, default=str)
+    for line in payload.splitlines():
+        message += f"data: {line}\n"
+    return message + "\n"
+
+
+class Subscription:
+    """Stream of events for one analysis."""
+
+    def __init__(self, bus: "AnalysisEventBus", analysis_id: int):
+        self.bus = bus
+        self.analysis_id = analysis_id
+        self._queue: asyncio.Queue = asyncio.Queue(maxsize=1000)
+        self._pubsub = None
+
+    async def start(self) -> None:
+        redis = get_redis()
+        if redis is not None:
+            try:
+                self._pubsub = redis.pubsub()
+                await self._pubsub.subscribe(self.bus.channel(self.analysis_id))
+                return
+            except Exception as e:
+                logger.warning(f"Redis pub/sub unavailable, using in-process events: {e}")
+                self._pubsub = None
+        self.bus._subscribers[self.analysis_id].add(self._queue)
+
+    @property
+    def in_process(self) -> bool:
+        """Whether only events published by this worker are delivered."""
+        return self._pubsub is None
+
+    async def get(self, timeout: float) -> Optional[Dict[str, Any]]:
+        """Wait for the next event. Returns None if nothing arrived within timeout."""
+        if self._pubsub is not None:
+            message = await self._pubsub.get_message(
+                ignore_subscribe_messages=True,
+                timeout=timeout,
+            )
+            if message is None:
+                return None
+            return json.loads(message["data"])
+
+        try:
+            return await asyncio.wait_for(self._queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+    async def close(self) -> None:
+        if self._pubsub is not None:
+            try:
+                await self._pubsub.unsubscribe()
+                await self._pubsub.close()
+            except Exception as e:
+                logger.warning(f"Failed to close pub/sub subscription: {e}")
+            return
+
+        subscribers = self.bus._subscribers.get(self.analysis_id)
+        if subscribers is not None:
+            subscribers.discard(self._queue)
+            if not subscribers:
+                del self.bus._subscribers[self.analysis_id]
+
+
+class AnalysisEventBus:
+    """Publish/subscribe of analysis processing events."""
+
+    def __init__(self):
+        self._subscribers: Dict[int, Set[asyncio.Queue]] = defaultdict(set)
+
+    def channel(self, analysis_id: int) -> str:
+        return f"{CHANNEL_PREFIX}{analysis_id}"
+
+    async def publish(self, analysis_id: int, event: Dict[str, Any]) -> None:
+        """Publish an event. Never raises: progress events are best effort."""
+        redis = get_redis()
+        if redis is not None:
+            try:
+                await redis.publish(
+                    self.channel(analysis_id),
+                    json.dumps(event, ensure_ascii=False, default=str),
+                )
+                return
+            except Exception as e:
+                logger.warning(f"Redis publish failed, delivering in-process: {e}")
+
+        for queue in list(self._subscribers.get(analysis_id, ())):
+            try:
+                queue.put_nowait(event)
+            except asyncio.QueueFull:
+                logger.warning(f"Dropping event for slow subscriber of analysis {analysis_id}")
+
+    async def subscribe(self, analysis_id: int) -> Subscription:
+        """Subscribe to events of an analysis. Caller must close the subscription."""
+        subscription = Subscription(self, analysis_id)
+        await subscription.start()
+        return subscription
+
+
+analysis_events = AnalysisEventBus()
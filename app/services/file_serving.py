@@ -0,0 +1,195 @@
+"""
+Cache-friendly file responses.
+
+Adds validators (ETag, Last-Modified), conditional GET handling
+(If-None-Match / If-Modified-Since -> 304) and single byte-range
+requests (206 / 416) on top of plain file responses, so browsers can
+revalidate cached files and load PDFs incrementally.
+"""
+
+from datetime import datetime, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+from pathlib import Path
+from typing import AsyncIterator, Dict, Optional, Tuple
+
+import aiofiles
+from fastapi import Request, status
+from fastapi.responses import FileResponse, Response, StreamingResponse
+
+CHUNK_SIZE = 64 * 1024
+
+
+def make_etag(content_hash: Optional[str], size: int, modified: datetime) -> str:
+    """Strong ETag from the content hash; weak one from size and mtime for legacy files."""
+    if content_hash:
+        return f'"{content_hash}"'
+    return f'W/"{size:x}-{int(modified.timestamp()):x}"'
+
+
+def is_not_modified(request: Request, etag: str, last_modified: datetime) -> bool:
+    """Evaluate If-None-Match / If-Modified-Since against the current validators."""
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        # Weak comparison as required for If-None-Match
+        current = _strip_weak(etag)
+        candidates = [_strip_weak(tag.strip()) for tag in if_none_match.split(",")]
+        return "*" in candidates or current in candidates
+
+    if_modified_since = _parse_http_date(request.headers.get("if-modified-since"))
+    if if_modified_since is not None:
+        return last_modified.replace(microsecond=0) <= if_modified_since
+    return False
+
+
+def parse_range(range_header: Optional[str], size: int) -> Optional[Tuple[int, int]]:
+    """
+    Parse a single-range `Range: bytes=...` header.
+
+    Returns:
+        (start, end) inclusive, or None to serve the whole file
+        (no header, multiple ranges or a unit other than bytes)
+
+    Raises:
+        ValueError: Range is malformed or not satisfiable
+    """
+    if not range_header:
+        return None
+
+    unit, _, spec = range_header.partition("=")
+    if unit.strip().lower() != "bytes" or "," in spec:
+        return None
+
+    start_str, sep, end_str = spec.strip().partition("-")
+    if not sep:
+        raise ValueError("Malformed range")
+
+    if not start_str:
+        # Suffix range: last N bytes
+        length = int(end_str)
+        if length <= 0 or size == 0:
+            raise ValueError("Unsatisfiable range")
+        return max(0, size - length), size - 1
+
+    start = int(start_str)
+    end = int(end_str) if end_str else size - 1
+    if start >= size or end < start:
+        raise ValueError("Unsatisfiable range")
+    return start, min(end, size - 1)
+
+
+def conditional_file_response(
+    request: Request,
+    *,
+    media_type: str,
+    content_hash: Optional[str],
+    last_modified: datetime,
+    path: Optional[Path] = None,
+    content: Optional[bytes] = None,
+    headers: Optional[Dict[str, str]] = None,
+    max_age: int = 0,
+) -> Response:
+    """
+    Serve a file from disk (path) or memory (content) with caching support.
+
+    Args:
+        request: Incoming request (conditional and Range headers)
+        media_type: Content type of the file
+        content_hash: SHA-256 of the content if known
+        last_modified: Modification time reported to clients
+        path: File on local disk
+        content: File contents if not on local disk
+        headers: Extra headers (e.g. Content-Disposition)
+        max_age: Seconds the browser may reuse the file without revalidation
+    """
+    stat_result = path.stat() if path is not None else None
+    size = stat_result.st_size if stat_result is not None else len(content)
+
+    if last_modified.tzinfo is None:
+        last_modified = last_modified.replace(tzinfo=timezone.utc)
+    etag = make_etag(content_hash, size, last_modified)
+
+    cache_headers = {
+        "ETag": etag,
+        "Last-Modified": format_datetime(last_modified.astimezone(timezone.utc), usegmt=True),
+        "Cache-Control": f"private, max-age={max_age}, must-revalidate",
+        "Accept-Ranges": "bytes",
+    }
+
+    if is_not_modified(request, etag, last_modified):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=cache_headers)
+
+    response_headers = {**(headers or {}), **cache_headers}
+
+    byte_range = None
+    if _if_range_matches(request, etag, last_modified):
+        try:
+            byte_range = parse_range(request.headers.get("range"), size)
+        except ValueError:
+            return Response(
+                status_code=status.HTTP_416_REQUESTED_RANGE_NOT_SATISFIABLE,
+                headers={**cache_headers, "Content-Range": f"bytes */{size}"},
+            )
+
+    if byte_range is None:
+        if path is not None:
+            return FileResponse(path, media_type=media_type, headers=response_headers, stat_result=stat_result)
+        return Response(content=content, media_type=media_type, headers=response_headers)
+
+    start, end = byte_range
+    length = end - start + 1
+    response_headers["Content-Range"] = f"bytes {start}-{end}/{size}"
+    response_headers["Content-Length"] = str(length)
+
+    if path is not None:
+        return StreamingResponse(
+            _read_range(path, start, length),
+            status_code=status.HTTP_206_PARTIAL_CONTENT,
+            media_type=media_type,
+            headers=response_headers,
+        )
+    return Response(
+        content=content[start:end + 1],
+        status_code=status.HTTP_206_PARTIAL_CONTENT,
+        media_type=media_type,
+        headers=response_headers,
+    )
+
+
+async def _read_range(path: Path, start: int, length: int) -> AsyncIterator[bytes]:
+    async with aiofiles.open(path, "rb") as f:
+        await f.seek(start)
+        remaining = length
+        while remaining > 0:
+            chunk = await f.read(min(CHUNK_SIZE, remaining))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+            yield chunk
+
+
+def _if_range_matches(request: Request, etag: str, last_modified: datetime) -> bool:
+    """If-Range: honour Range only while the client's copy is current."""
+    if_range = request.headers.get("if-range")
+    if not if_range:
+        return True
+    if if_range.startswith('"') or if_range.startswith("W/"):
+        # Strong comparison; weak validators never match
+        return not etag.startswith("W/") and if_range == etag
+    since = _parse_http_date(if_range)
+    return since is not None and last_modified.replace(microsecond=0) <= since
+
+
+def _strip_weak(tag: str) -> str:
+    return tag[2:] if tag.startswith("W/") else tag
+
+
+def _parse_http_date(value: Optional[str]) -> Optional[datetime]:
+    if not value:
+        return None
+    try:
+        parsed = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return parsed
@@ -0,0 +1,339 @@
+"""
+Shared limiter for outgoing LLM requests.
+
+- Local priority semaphore caps concurrent calls per worker, so that
+  biomarker extraction is served before summaries and keywords.
+- Token bucket caps the request rate. With Redis enabled the bucket is
+  shared by all workers, otherwise it is kept in-process.
+- Rate-limited and transient failures are retried with jittered backoff.
+"""
+
+import asyncio
+import heapq
+import itertools
+import logging
+import random
+import time
+from contextlib import asynccontextmanager
+from enum import IntEnum
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Optional, TypeVar
+
+from app.core.config import settings
+from app.core.redis import get_redis
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+RETRYABLE_STATUS_CODES = {408, 409, 429, 500, 502, 503, 504}
+RETRYABLE_ERRORS = {"APIConnectionError", "APITimeoutError"}
+
+TOKEN_BUCKET_KEY = "llm:token_bucket"
+
+# Returns seconds to wait before a token is available (0 = token taken).
+# Uses Redis server time so that all workers share one clock.
+TOKEN_BUCKET_SCRIPT = """
+local rate = tonumber(ARGV[1])
+local capacity = tonumber(ARGV[2])
+local t = redis.call('TIME')
+local now = tonumber(t[1]) + tonumber(t[2]) / 1000000
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local tokens = tonumber(state[1]) or capacity
+local ts = tonumber(state[2]) or now
+tokens = math.min(capacity, tokens + math.max(0, now - ts) * rate)
+local wait = 0
+if tokens >= 1 then
+    tokens = tokens - 1
+else
+    wait = (1 - tokens) / rate
+end
+redis.call('HSET', KEYS[1], 'tokens', tokens, 'ts', now)
+redis.call('EXPIRE', KEYS[1], math.ceil(capacity / rate) + 60)
+return tostring(wait)
+"""
+
+
+class LLMPriority(IntEnum):
+    """Priority classes for LLM calls (lower value is served first)."""
+    EXTRACTION = 0       # Biomarker extraction (text and vision)
+    SUMMARY = 1          # Analysis summary
+    RECOMMENDATIONS = 2  # Product recommendations
+    RERANK = 3           # Optional re-ranking of matched products
+
+
+class PrioritySemaphore:
+    """Semaphore that wakes up waiters in priority order (FIFO within a class)."""
+
+    def __init__(self, value: int):
+        self._value = value
+        self._waiters: List[list] = []
+        self._counter = itertools.count()
+
+    @property
+    def waiting(self) -> int:
+        return sum(1 for _, _, fut in self._waiters if not fut.done())
+
+    async def acquire(self, priority: int) -> None:
+        if self._value > 0 and not self.waiting:
+            self._value -= 1
+            return
+
+        fut = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, [priority, next(self._counter), fut])
+        try:
+            await fut
+        except asyncio.CancelledError:
+            # Slot was handed over right before cancellation - pass it on
+            if fut.done() and not fut.cancelled():
+                self.release()
+            raise
+
+    def release(self) -> None:
+        while self._waiters:
+            _, _, fut = heapq.heappop(self._waiters)
+            if not fut.done():
+                fut.set_result(True)
+                return
+        self._value += 1
+
+
+class LocalTokenBucket:
+    """In-process token bucket, used when Redis is disabled or unavailable."""
+
+    def __init__(self, rate: float, capacity: int):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = float(capacity)
+        self._updated = time.monotonic()
+
+    def take(self) -> float:
+        """Take a token. Returns seconds to wait if none is available."""
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+        if self._tokens >= 1:
+            self._tokens -= 1
+            return 0.0
+        return (1 - self._tokens) / self.rate
+
+
+class LLMLimiter:
+    """
+    Concurrency and rate limiter for LLM calls with retries and metrics.
+    """
+
+    def __init__(
+        self,
+        max_concurrency: int,
+        requests_per_minute: int,
+        burst: int,
+        max_retries: int,
+        retry_base_delay: float,
+        retry_max_delay: float,
+    ):
+        self.max_concurrency = max_concurrency
+        self.max_retries = max_retries
+        self.retry_base_delay = retry_base_delay
+        self.retry_max_delay = retry_max_delay
+
+        self._semaphore = PrioritySemaphore(max_concurrency)
+        self._rate = requests_per_minute / 60 if requests_per_minute > 0 else 0.0
+        self._burst = max(1, burst)
+        self._local_bucket = LocalTokenBucket(self._rate, self._burst) if self._rate else None
+        self._in_flight = 0
+        self._metrics: Dict[LLMPriority, Dict[str, float]] = {
+            priority: {
+                "requests": 0,
+                "attempts": 0,
+                "retries": 0,
+                "failures": 0,
+                "queue_time_total": 0.0,
+                "queue_time_max": 0.0,
+            }
+            for priority in LLMPriority
+        }
+
+    @classmethod
+    def from_settings(cls) -> "LLMLimiter":
+        """Create a limiter configured from application settings."""
+        return cls(
+            max_concurrency=settings.llm_max_concurrency,
+            requests_per_minute=settings.llm_requests_per_minute,
+            burst=settings.llm_burst,
+            max_retries=settings.llm_max_retries,
+            retry_base_delay=settings.llm_retry_base_delay,
+            retry_max_delay=settings.llm_retry_max_delay,
+        )
+
+    async def run(self, priority: LLMPriority, call: Callable[[], Awaitable[T]]) -> T:
+        """
+        Execute an LLM call under the limiter.
+
+        Args:
+            priority: Priority class of the call
+            call: Zero-argument coroutine factory (called once per attempt)
+
+        Returns:
+            Result of the call
+        """
+        self._metrics[priority]["requests"] += 1
+        attempt = 0
+
+        while True:
+            try:
+                async with self.slot(priority):
+                    return await call()
+            except Exception as e:
+                delay = self._handle_failure(priority, e, attempt)
+
+            # Back off outside of the slot so other calls can proceed
+            attempt += 1
+            await asyncio.sleep(delay)
+
+    async def stream(self, priority: LLMPriority, call: Callable[[], Awaitable[Any]]) -> AsyncIterator[Any]:
+        """
+        Execute a streaming LLM call under the limiter.
+
+        The slot is held until the stream is consumed. Retries only cover
+        opening the stream: chunks already yielded cannot be replayed.
+        """
+        self._metrics[priority]["requests"] += 1
+        attempt = 0
+
+        while True:
+            try:
+                async with self.slot(priority):
+                    response = await call()
+                    async for chunk in response:
+                        attempt = -1  # Stream is open, no more retries
+                        yield chunk
+                return
+            except Exception as e:
+                if attempt < 0:
+                    self._metrics[priority]["failures"] += 1
+                    raise
+                delay = self._handle_failure(priority, e, attempt)
+
+            attempt += 1
+            await asyncio.sleep(delay)
+
+    @asynccontextmanager
+    async def slot(self, priority: LLMPriority) -> AsyncIterator[None]:
+        """Hold a concurrency slot and a rate token for the duration of the block."""
+        metrics = self._metrics[priority]
+        queued_at = time.monotonic()
+
+        await self._acquire(priority)
+        try:
+            queue_time = time.monotonic() - queued_at
+            metrics["attempts"] += 1
+            metrics["queue_time_total"] += queue_time
+            metrics["queue_time_max"] = max(metrics["queue_time_max"], queue_time)
+            if queue_time > 1:
+                logger.info(f"LLM call ({priority.name}) waited {queue_time:.2f}s in queue")
+
+            self._in_flight += 1
+            try:
+                yield
+            finally:
+                self._in_flight -= 1
+        finally:
+            self._semaphore.release()
+
+    def stats(self) -> Dict[str, Any]:
+        """Snapshot of limiter state and per-priority queue metrics."""
+        return {
+            "max_concurrency": self.max_concurrency,
+            "in_flight": self._in_flight,
+            "waiting": self._semaphore.waiting,
+            "priorities": {
+                priority.name.lower(): {
+                    "requests": int(m["requests"]),
+                    "retries": int(m["retries"]),
+                    "failures": int(m["failures"]),
+                    # Every attempt (including retries) queues again
+                    "queue_time_avg": round(m["queue_time_total"] / m["attempts"], 4) if m["attempts"] else 0.0,
+                    "queue_time_max": round(m["queue_time_max"], 4),
+                }
+                for priority, m in self._metrics.items()
+            },
+        }
+
+    async def _acquire(self, priority: LLMPriority) -> None:
+        """
+        Acquire a concurrency slot and a rate token.
+
+        A rate-limited call gives its slot back while it waits for a token,
+        so it never blocks higher-priority calls, and queues again by
+        priority once the token should be available.
+        """
+        while True:
+            await self._semaphore.acquire(priority)
+            try:
+                wait = await self._take_token()
+            except BaseException:
+                self._semaphore.release()
+                raise
+            if wait <= 0:
+                return
+            self._semaphore.release()
+            await asyncio.sleep(wait)
+
+    async def _take_token(self) -> float:
+        """Take a token from the bucket. Returns seconds to wait if none is available."""
+        if not self._rate:
+            return 0.0
+
+        wait = await self._take_distributed_token()
+        if wait is None:
+            wait = self._local_bucket.take()
+        return wait
+
+    async def _take_distributed_token(self) -> Optional[float]:
+        """Take a token from the Redis bucket. None if Redis is not available."""
+        redis = get_redis()
+        if redis is None:
+            return None
+
+        try:
+            wait = await redis.eval(TOKEN_BUCKET_SCRIPT, 1, TOKEN_BUCKET_KEY, self._rate, self._burst)
+            return float(wait)
+        except Exception as e:
+            logger.warning(f"Redis token bucket unavailable, using local bucket: {e}")
+            return None
+
+    def _handle_failure(self, priority: LLMPriority, error: Exception, attempt: int) -> float:
+        """Re-raise non-retryable errors, otherwise return the backoff delay."""
+        if attempt >= self.max_retries or not self._is_retryable(error):
+            self._metrics[priority]["failures"] += 1
+            raise error
+
+        delay = self._retry_delay(error, attempt)
+        self._metrics[priority]["retries"] += 1
+        logger.warning(
+            f"LLM call ({priority.name}) failed, retry {attempt + 1}/{self.max_retries} in {delay:.1f}s"
+        )
+        return delay
+
+    def _is_retryable(self, error: Exception) -> bool:
+        """Check whether an OpenAI client error is worth retrying."""
+        if type(error).__name__ in RETRYABLE_ERRORS:
+            return True
+        return getattr(error, "status_code", None) in RETRYABLE_STATUS_CODES
+
+    def _retry_delay(self, error: Exception, attempt: int) -> float:
+        """Backoff delay: server Retry-After if given, otherwise full jitter."""
+        response = getattr(error, "response", None)
+        retry_after = response.headers.get("retry-after") if response is not None else None
+        if retry_after:
+            try:
+                return min(float(retry_after), self.retry_max_delay) + random.uniform(0, 1)
+            except ValueError:
+                pass
+
+        ceiling = min(self.retry_max_delay, self.retry_base_delay * (2 ** attempt))
+        return random.uniform(0, ceiling)
+
+
+llm_limiter = LLMLimiter.from_settings()
@@ -6,13 +6,15 @@ Supports PDF and image files (JPG, PNG).
 import io
 import logging
 from pathlib import Path
-from typing import List, Optional, Tuple
-
-from PIL import Image
-import pytesseract
+from typing import TYPE_CHECKING, List, Optional, Tuple
 
 from app.core.config import settings
 
+# PIL and pytesseract are imported on first use, so processes that never
+# run OCR (API workers, Alembic, scripts) do not pay for them
+if TYPE_CHECKING:
+    from PIL import Image
+
 logger = logging.getLogger(__name__)
 
 
@@ -24,6 +26,8 @@ class OCRService:
     
     def __init__(self):
         """Initialize OCR service."""
+        import pytesseract
+        
         if settings.tesseract_cmd:
             pytesseract.pytesseract.tesseract_cmd = settings.tesseract_cmd
         
@@ -47,6 +51,9 @@ class OCRService:
         Returns:
             Tuple of (extracted_text, confidence_score)
         """
+        from PIL import Image
+        import pytesseract
+        
         try:
             image = Image.open(image_path)
             
@@ -99,6 +106,8 @@ class OCRService:
         Returns:
             List of tuples (text, page_number, confidence)
         """
+        import pytesseract
+        
         try:
             from pdf2image import convert_from_path
             
@@ -182,6 +191,9 @@ class OCRService:
                 Path(tmp_path).unlink(missing_ok=True)
         
         elif content_type in ("image/jpeg", "image/jpg", "image/png"):
+            from PIL import Image
+            import pytesseract
+            
             # Load image from bytes
             image = Image.open(io.BytesIO(file_bytes))
             image = self._preprocess_image(image)
@@ -208,7 +220,7 @@ class OCRService:
         else:
             raise OCRError(f"Неподдерживаемый тип файла: {content_type}")
     
-    def _preprocess_image(self, image: Image.Image) -> Image.Image:
+    def _preprocess_image(self, image: "Image.Image") -> "Image.Image":
         """
         Preprocess image for better OCR results.
         
@@ -217,6 +229,8 @@ class OCRService:
         - Remove noise
         - Scale if too small
         """
+        from PIL import Image, ImageEnhance
+        
         # Convert to RGB if necessary (for PNG with transparency)
         if image.mode == "RGBA":
             background = Image.new("RGB", image.size, (255, 255, 255))
@@ -237,7 +251,6 @@ class OCRService:
         
         # Increase contrast using simple thresholding
         # This helps with faded or low-contrast documents
-        from PIL import ImageEnhance
         enhancer = ImageEnhance.Contrast(image.convert("RGB"))
         image = enhancer.enhance(1.5)
         image = image.convert("L")
@@ -0,0 +1,156 @@
+"""
+Product catalog search.
+
+Backed by the generated `products.search_vector` tsvector (name,
+composition, description; GIN) and a pg_trgm GIN index on name, so
+searches are index scans instead of `ILIKE '%kw%'` sequential scans:
+
+- Keywords become one prefix tsquery (`желез:* | витамин:* & d`), so word
+  forms match like the old substring search did.
+- Free-text queries also match by trigram similarity, which tolerates
+  typos in product names.
+- Several keyword groups (one per biomarker) are served by one LATERAL
+  query that returns the top products of each group.
+"""
+
+import re
+from typing import Dict, List, Sequence, Tuple
+
+from sqlalchemy import String, column, func, literal_column, or_, select, true, values
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.models.product import Product
+
+# Same configuration as the generated search_vector column
+SEARCH_CONFIG = literal_column("'russian'::regconfig")
+
+# ts_rank_cd normalization: 32 scales rank into 0..1 (rank / (rank + 1))
+RANK_NORMALIZATION = 32
+
+# Shorter tokens are matched exactly: a one-letter prefix matches everything
+MIN_PREFIX_LENGTH = 3
+
+TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+
+
+def escape_like(value: str) -> str:
+    """Escape LIKE wildcards so user input matches literally (ESCAPE '\\')."""
+    return value.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+
+def build_tsquery(keywords: Sequence[str]) -> str:
+    """
+    Build `to_tsquery` input: words of a keyword are ANDed, keywords ORed.
+
+    Tokens are reduced to word characters, so user input cannot inject
+    tsquery operators.
+    """
+    alternatives = []
+    for keyword in keywords:
+        tokens = TOKEN_RE.findall(keyword.lower())
+        if not tokens:
+            continue
+        terms = [f"{token}:*" if len(token) >= MIN_PREFIX_LENGTH else token for token in tokens]
+        alternatives.append(" & ".join(terms))
+
+    if not alternatives:
+        return ""
+    if len(alternatives) == 1:
+        return alternatives[0]
+    return " | ".join(f"({alternative})" for alternative in alternatives)
+
+
+class ProductSearchService:
+    """Relevance-ranked product search."""
+
+    def __init__(self, db: AsyncSession):
+        self.db = db
+
+    async def search(self, query: str, limit: int = 20, offset: int = 0) -> List[Product]:
+        """
+        Search products by a user query (full text + fuzzy name match).
+
+        Returns:
+            Products ordered by relevance, then popularity
+        """
+        query = query.strip()
+        ts_text = build_tsquery([query])
+        if not ts_text:
+            return []
+
+        ts_query = func.to_tsquery(SEARCH_CONFIG, ts_text)
+        rank = (
+            func.ts_rank_cd(Product.search_vector, ts_query, RANK_NORMALIZATION)
+            + func.coalesce(func.similarity(Product.name, query), 0)
+        )
+
+        stmt = (
+            select(Product)
+            .where(
+                or_(
+                    Product.search_vector.op("@@")(ts_query),
+                    Product.name.op("%")(query),       # trigram similarity (typos)
+                    Product.name.ilike(f"%{escape_like(query)}%", escape="\\"),  # substring, served by the trigram index
+                )
+            )
+            .order_by(rank.desc(), Product.sale_count.desc().nulls_last(), Product.id)
+            .limit(limit)
+            .offset(offset)
+        )
+        result = await self.db.execute(stmt)
+        return list(result.scalars().all())
+
+    async def search_grouped(
+        self,
+        keyword_groups: Dict[str, Sequence[str]],
+        limit: int = 3,
+    ) -> Dict[str, List[Product]]:
+        """
+        Top products for several keyword groups in a single query.
+
+        Args:
+            keyword_groups: Group key (e.g. biomarker code) -> keywords
+            limit: Max products per group
+
+        Returns:
+            Group key -> products ordered by relevance (groups without matches are omitted)
+        """
+        rows: List[Tuple[str, str]] = []
+        for key, keywords in keyword_groups.items():
+            ts_text = build_tsquery(keywords)
+            if ts_text:
+                rows.append((key, ts_text))
+
+        if not rows:
+            return {}
+
+        groups = values(
+            column("group_key", String),
+            column("ts_text", String),
+            name="keyword_groups",
+        ).data(rows)
+
+        ts_query = func.to_tsquery(SEARCH_CONFIG, groups.c.ts_text)
+        rank = func.ts_rank_cd(Product.search_vector, ts_query, RANK_NORMALIZATION)
+        matches = (
+            select(Product.id.label("product_id"), rank.label("rank"))
+            .where(Product.search_vector.op("@@")(ts_query))
+            .order_by(rank.desc(), Product.sale_count.desc().nulls_last(), Product.id)
+            .limit(limit)
+            .correlate(groups)
+            .lateral("matches")
+        )
+
+        stmt = (
+            select(groups.c.group_key, Product)
+            .select_from(groups)
+            .join(matches, true())
+            .join(Product, Product.id == matches.c.product_id)
+            .order_by(groups.c.group_key, matches.c.rank.desc(), Product.sale_count.desc().nulls_last(), Product.id)
+        )
+        result = await self.db.execute(stmt)
+
+        grouped: Dict[str, List[Product]] = {}
+        for group_key, product in result.all():
+            grouped.setdefault(group_key, []).append(product)
+        return grouped
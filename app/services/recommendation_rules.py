@@ -0,0 +1,210 @@
+"""
+Deterministic biomarker-to-ingredient knowledge base.
+
+Maps an abnormal biomarker (code + direction) to ingredient concepts and
+the catalog search keywords of those concepts, replacing the LLM call that
+used to invent search strings. Concepts come from two sources:
+
+- the static rule table below (codes and common aliases);
+- `Biomarker.low_recommendations` / `high_recommendations` texts, scanned
+  for ingredient mentions ("Рекомендуется прием витамина D3" -> vitamin_d).
+
+The result has the same shape the keyword generator returned, so product
+matching (catalog index) and storage stay unchanged.
+"""
+
+import re
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from app.services.catalog_index import normalize
+
+
+@dataclass(frozen=True)
+class IngredientConcept:
+    """Ingredient with catalog search keywords and text triggers."""
+    key: str
+    name: str                       # Human-readable (used in recommendation reasons)
+    keywords: Tuple[str, ...]       # Product search keywords
+    triggers: Tuple[str, ...] = ()  # Normalized stems that mention the concept in free text (see catalog_index.normalize)
+
+
+CONCEPTS: Dict[str, IngredientConcept] = {
+    concept.key: concept
+    for concept in (
+        IngredientConcept("iron", "Железо", ("железо", "бисглицинат железа", "фумарат железа"), ("железо", "железа", "железодефицит", "железосодерж")),
+        IngredientConcept("vitamin_c", "Витамин C", ("витамин c", "аскорбиновая кислота"), ("витамин c", "витамина c", "аскорбин")),
+        IngredientConcept("vitamin_b12", "Витамин B12", ("витамин b12", "метилкобаламин", "цианокобаламин"), ("b12", "кобаламин")),
+        IngredientConcept("folate", "Фолиевая кислота", ("фолиевая кислота", "метилфолат"), ("фолие", "фолат")),
+        IngredientConcept("vitamin_b6", "Витамин B6", ("витамин b6", "пиридоксин"), ("b6", "пиридоксин")),
+        IngredientConcept("vitamin_d", "Витамин D3", ("витамин d3", "холекальциферол"), ("витамин d", "витамина d", "d3", "холекальциферол")),
+        IngredientConcept("vitamin_k2", "Витамин K2", ("витамин k2", "менахинон"), ("k2", "менахинон")),
+        IngredientConcept("magnesium", "Магний", ("магний", "цитрат магния", "бисглицинат магния"), ("магни",)),
+        IngredientConcept("zinc", "Цинк", ("цинк", "пиколинат цинка"), ("цинк",)),
+        IngredientConcept("selenium", "Селен", ("селен", "селенометионин"), ("селен",)),
+        IngredientConcept("iodine", "Йод", ("йод", "йодид калия"), ("йод",)),
+        IngredientConcept("calcium", "Кальций", ("кальций", "цитрат кальция"), ("кальций", "кальция")),
+        IngredientConcept("omega3", "Омега-3", ("омега-3", "рыбий жир"), ("омега", "рыбий жир")),
+        IngredientConcept("coq10", "Коэнзим Q10", ("коэнзим q10", "убихинол"), ("q10", "коэнзим")),
+        IngredientConcept("berberine", "Берберин", ("берберин",), ("берберин",)),
+        IngredientConcept("chromium", "Хром", ("пиколинат хрома", "хром"), ("хром",)),
+        IngredientConcept("alpha_lipoic", "Альфа-липоевая кислота", ("альфа-липоевая кислота",), ("липоев",)),
+        IngredientConcept("milk_thistle", "Расторопша", ("расторопша", "силимарин"), ("расторопш", "силимарин")),
+        IngredientConcept("nac", "N-ацетилцистеин", ("ацетилцистеин", "nac"), ("ацетилцистеин",)),
+        IngredientConcept("curcumin", "Куркумин", ("куркумин",), ("куркум",)),
+        IngredientConcept("probiotics", "Пробиотики", ("пробиотик", "лактобактерии"), ("пробиотик",)),
+        IngredientConcept("multivitamin", "Мультивитамины", ("мультивитамины", "витаминный комплекс"), ("мультивитамин",)),
+    )
+}
+
+# Static rules: (biomarker code, direction) -> concept keys, most relevant first
+RULES: Dict[Tuple[str, str], Tuple[str, ...]] = {
+    ("HGB", "low"): ("iron", "vitamin_b12", "folate", "vitamin_c"),
+    ("RBC", "low"): ("iron", "vitamin_b12", "folate"),
+    ("FE", "low"): ("iron", "vitamin_c"),
+    ("FERR", "low"): ("iron", "vitamin_c"),
+    ("B12", "low"): ("vitamin_b12", "folate"),
+    ("FOL", "low"): ("folate", "vitamin_b12"),
+    ("D3", "low"): ("vitamin_d", "vitamin_k2", "magnesium"),
+    ("MG", "low"): ("magnesium", "vitamin_b6"),
+    ("ZN", "low"): ("zinc",),
+    ("CA", "low"): ("calcium", "vitamin_d"),
+    ("TSH", "high"): ("iodine", "selenium"),
+    ("T4", "low"): ("iodine", "selenium"),
+    ("WBC", "low"): ("zinc", "vitamin_c", "vitamin_d"),
+    ("GLU", "high"): ("chromium", "berberine", "alpha_lipoic"),
+    ("HBA1C", "high"): ("chromium", "berberine", "alpha_lipoic"),
+    ("CHOL", "high"): ("omega3", "berberine", "coq10"),
+    ("LDL", "high"): ("omega3", "berberine", "coq10"),
+    ("TG", "high"): ("omega3", "berberine"),
+    ("ALT", "high"): ("milk_thistle", "nac"),
+    ("AST", "high"): ("milk_thistle", "nac"),
+    ("CRP", "high"): ("omega3", "curcumin"),
+    ("ESR", "high"): ("omega3", "curcumin"),
+    ("HCY", "high"): ("folate", "vitamin_b12", "vitamin_b6"),
+}
+
+# Codes that labs and the extractor use for the same biomarker
+CODE_ALIASES: Dict[str, str] = {
+    "HB": "HGB",
+    "FERRITIN": "FERR",
+    "VITD": "D3",
+    "VIT_D": "D3",
+    "25OHD": "D3",
+    "25-OH-D": "D3",
+    "VITB12": "B12",
+    "FOLATE": "FOL",
+    "FT4": "T4",
+    "GLUCOSE": "GLU",
+    "A1C": "HBA1C",
+    "TRIG": "TG",
+    "LDL-C": "LDL",
+}
+
+# Preventive recommendations when nothing is out of range
+GENERAL_CONCEPTS: Tuple[str, ...] = ("omega3", "vitamin_d", "multivitamin")
+
+MAX_CONCEPTS_PER_BIOMARKER = 4
+
+# Sentences with these cues advise against an ingredient ("избегать добавок железа")
+NEGATIVE_CUES = ("избег", "огранич", "сниз", "сократ", "отказ", "не принима", "не рекоменд")
+
+SENTENCE_RE = re.compile(r"[^.!?;]+")
+
+# Glands ("щитовидная железа") must not read as the mineral
+GLAND_RE = re.compile(r"(щитовидн|поджелудочн|предстательн|молочн|слюнн)\w*\s+желез\w*")
+
+LOW_STATUSES = ("low", "critical_low")
+HIGH_STATUSES = ("high", "critical_high")
+
+
+def direction(status: Optional[str]) -> Optional[str]:
+    """'low' / 'high' for abnormal statuses, None otherwise."""
+    if status in LOW_STATUSES:
+        return "low"
+    if status in HIGH_STATUSES:
+        return "high"
+    return None
+
+
+def normalize_code(code: Optional[str]) -> str:
+    code = (code or "").strip().upper()
+    return CODE_ALIASES.get(code, code)
+
+
+def concepts_from_text(text: Optional[str]) -> List[str]:
+    """Concepts mentioned in a free-text recommendation, in order of appearance."""
+    if not text:
+        return []
+    # Same normalization as the catalog index: "витамина С" reads as "витамина c"
+    text = GLAND_RE.sub(" ", normalize(text))
+    found: Dict[str, int] = {}
+    for sentence in SENTENCE_RE.finditer(text):
+        if any(cue in sentence.group() for cue in NEGATIVE_CUES):
+            continue
+        for concept in CONCEPTS.values():
+            if concept.key in found:
+                continue
+            positions = [sentence.group().find(trigger) for trigger in concept.triggers]
+            positions = [position for position in positions if position >= 0]
+            if positions:
+                found[concept.key] = sentence.start() + min(positions)
+    return sorted(found, key=found.get)
+
+
+def concepts_for_biomarker(
+    code: Optional[str],
+    status: Optional[str],
+    recommendation_text: Optional[str] = None,
+) -> List[str]:
+    """Concept keys for an abnormal biomarker (static rules first, then KB text)."""
+    biomarker_direction = direction(status)
+    if not biomarker_direction:
+        return []
+
+    concepts = list(RULES.get((normalize_code(code), biomarker_direction), ()))
+    for key in concepts_from_text(recommendation_text):
+        if key not in concepts:
+            concepts.append(key)
+    return concepts[:MAX_CONCEPTS_PER_BIOMARKER]
+
+
+def _keywords(concept_keys: Sequence[str]) -> List[str]:
+    keywords: List[str] = []
+    for key in concept_keys:
+        for keyword in CONCEPTS[key].keywords:
+            if keyword not in keywords:
+                keywords.append(keyword)
+    return keywords
+
+
+def build_keywords(biomarkers: Sequence[Dict[str, Any]], recommendation_type: str) -> Dict[str, Any]:
+    """
+    Catalog search keywords for collected biomarkers.
+
+    Args:
+        biomarkers: Items with code, status and optional recommendation_text
+        recommendation_type: "corrective" or "preventive"
+
+    Returns:
+        {"biomarker_keywords": {code: [...]}, "general_keywords": [...],
+         "biomarker_concepts": {code: [concept names]}}
+    """
+    biomarker_keywords: Dict[str, List[str]] = {}
+    biomarker_concepts: Dict[str, List[str]] = {}
+
+    for biomarker in biomarkers:
+        code = biomarker.get("code")
+        concept_keys = concepts_for_biomarker(code, biomarker.get("status"), biomarker.get("recommendation_text"))
+        if not code or not concept_keys:
+            continue
+        biomarker_keywords[code] = _keywords(concept_keys)
+        biomarker_concepts[code] = [CONCEPTS[key].name for key in concept_keys]
+
+    general_keywords = _keywords(GENERAL_CONCEPTS) if recommendation_type == "preventive" else []
+
+    return {
+        "biomarker_keywords": biomarker_keywords,
+        "general_keywords": general_keywords,
+        "biomarker_concepts": biomarker_concepts,
+    }
@@ -2,22 +2,58 @@
 Recommendation Service for matching biomarker deficiencies with products.
 """
 
+import hashlib
 import logging
 import json
 from typing import List, Optional, Dict, Any
 
-from sqlalchemy import select, and_, or_
+from sqlalchemy import select, and_
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import selectinload
 
 from app.models.biomarker import UserBiomarker, BiomarkerStatus
-from app.models.product import Product
 from app.models.analysis import Analysis
 from app.models.patient_profile import PatientProfile
+from app.core.cache import Cache
+from app.core.config import settings
+from app.services import recommendation_rules
 from app.services.ai_parser import AIParserService
+from app.services.catalog_index import CATALOG_VERSION_KEY, catalog_index
+from app.services.product_search import ProductSearchService
+from app.services.system_state import get_state
 
 logger = logging.getLogger(__name__)
 
+# Keyword group for general (not biomarker-specific) recommendations
+GENERAL_GROUP = "__general__"
+
+# Products per group: shown to the user / offered to the LLM re-ranker
+PRODUCTS_PER_GROUP = 3
+RERANK_CANDIDATES = 8
+
+# Regenerate results keyed by user generation, analysis, inputs fingerprint and catalog version
+recommendation_cache = Cache(
+    "recommendations",
+    ttl=settings.recommendation_cache_ttl_seconds,
+    maxsize=settings.recommendation_cache_size,
+)
+
+
+async def invalidate_user_recommendations(user_id: int) -> None:
+    """Drop cached recommendations of a user (biomarkers or profile changed)."""
+    await recommendation_cache.invalidate(f"user:{user_id}")
+
+
+def recommendation_fingerprint(recommendation_input: Dict[str, Any]) -> str:
+    """Stable hash of biomarkers, statuses and profile used for recommendations."""
+    payload = json.dumps(
+        [recommendation_input, settings.recommendation_llm_rerank],
+        sort_keys=True,
+        ensure_ascii=False,
+        default=str,
+    )
+    return hashlib.sha256(payload.encode()).hexdigest()[:32]
+
 
 class RecommendationService:
     """
@@ -28,6 +64,7 @@ class RecommendationService:
         """Initialize the recommendation service."""
         self.db = db
         self.ai_parser = AIParserService()
+        self.product_search = ProductSearchService(db)
     
     async def generate_recommendations_for_analysis(
         self,
@@ -37,15 +74,50 @@ class RecommendationService:
         """
         Generate product recommendations for an analysis.
         This updates the Analysis.ai_recommendations JSON field.
-        """
-        # Get analysis to update later
-        analysis_stmt = select(Analysis).where(Analysis.id == analysis_id)
-        analysis_result = await self.db.execute(analysis_stmt)
-        analysis = analysis_result.scalar_one_or_none()
         
-        if not analysis:
+        Results are cached: with unchanged biomarkers, profile and catalog
+        the stored recommendations are returned without matching again.
+        """
+        recommendation_input = await self.collect_recommendation_input(analysis_id, user_id)
+        if not recommendation_input:
             return []
-
+        
+        # Refreshes the catalog version used in the cache key
+        await catalog_index.get()
+        catalog_version = catalog_index.version
+        if catalog_version is None:
+            # Index not built (yet) in this worker: products come from the
+            # database, so key on the catalog version stored there
+            catalog_version = await get_state(self.db, CATALOG_VERSION_KEY)
+        cache_key = recommendation_cache.key(
+            user_id,
+            await recommendation_cache.generation(f"user:{user_id}"),
+            analysis_id,
+            recommendation_fingerprint(recommendation_input),
+            catalog_version or "0",
+        )
+        cached = await recommendation_cache.get(cache_key)
+        if cached is not None:
+            logger.info(f"[Recommendations] Cache hit for analysis {analysis_id}")
+            return cached
+        
+        keywords_data = self.generate_keywords(recommendation_input)
+        recommendations = await self.save_recommendations(analysis_id, keywords_data, recommendation_input)
+        await recommendation_cache.set(cache_key, recommendations)
+        return recommendations
+    
+    async def collect_recommendation_input(
+        self,
+        analysis_id: int,
+        user_id: int,
+    ) -> Optional[Dict[str, Any]]:
+        """
+        Collect biomarkers and patient profile used to generate recommendations.
+        
+        Returns:
+            {"biomarkers": [...], "profile": {...}, "type": "corrective" | "preventive"}
+            or None if the analysis has no biomarkers.
+        """
         # Get user biomarkers with issues
         stmt = (
             select(UserBiomarker)
@@ -89,7 +161,7 @@ class RecommendationService:
         
         if not biomarkers_for_recs:
             logger.info(f"No biomarkers found for analysis {analysis_id}")
-            return []
+            return None
             
         # Get Patient Profile
         profile_stmt = select(PatientProfile).where(PatientProfile.user_id == user_id)
@@ -105,7 +177,7 @@ class RecommendationService:
                 "body_parameters": profile.body_parameters
             }
         
-        # Prepare data for AI to generate keywords
+        # Knowledge base texts feed the rule engine for the matching direction
         biomarker_data = [
             {
                 "code": ub.biomarker.code,
@@ -113,30 +185,84 @@ class RecommendationService:
                 "value": ub.value,
                 "unit": ub.unit,
                 "status": ub.status.value,
+                "recommendation_text": (
+                    ub.biomarker.low_recommendations
+                    if recommendation_rules.direction(ub.status.value) == "low"
+                    else ub.biomarker.high_recommendations
+                ),
             }
             for ub in biomarkers_for_recs
         ]
         
-        # Ask AI for keywords
-        logger.info(f"[Recommendations] Generating keywords for {len(biomarker_data)} biomarkers ({recommendation_type})")
-        keywords_data = await self.ai_parser.generate_search_keywords(
-            biomarker_data, 
-            patient_profile=profile_data
+        return {
+            "biomarkers": biomarker_data,
+            "profile": profile_data,
+            "type": recommendation_type,
+        }
+    
+    def generate_keywords(self, recommendation_input: Dict[str, Any]) -> Dict[str, Any]:
+        """Map biomarkers to ingredient search keywords with the rule engine (no LLM)."""
+        keywords_data = recommendation_rules.build_keywords(
+            recommendation_input["biomarkers"],
+            recommendation_input["type"],
         )
-        logger.info(f"[Recommendations] AI returned keywords: {keywords_data}")
+        logger.info(f"[Recommendations] Rule engine keywords: {keywords_data['biomarker_concepts']}")
+        return keywords_data
+    
+    async def save_recommendations(
+        self,
+        analysis_id: int,
+        keywords_data: Dict[str, Any],
+        recommendation_input: Optional[Dict[str, Any]] = None,
+    ) -> List[Dict[str, Any]]:
+        """
+        Search products for the generated keywords and store them
+        in Analysis.ai_recommendations.
+        
+        With `recommendation_llm_rerank` enabled and recommendation_input given,
+        more candidates are matched and the LLM picks the final order.
+        """
+        # Get analysis to update later
+        analysis_stmt = select(Analysis).where(Analysis.id == analysis_id)
+        analysis_result = await self.db.execute(analysis_stmt)
+        analysis = analysis_result.scalar_one_or_none()
+        
+        if not analysis:
+            return []
         
         recommendations = []
         
-        # Process specific biomarker keywords
-        biomarker_keywords = keywords_data.get("biomarker_keywords", {})
+        # Search products for all biomarkers and general keywords in one pass
+        # (in-memory catalog index, database search until the index is built)
+        biomarker_keywords = {
+            code: keywords
+            for code, keywords in keywords_data.get("biomarker_keywords", {}).items()
+            if keywords
+        }
+        general_keywords = keywords_data.get("general_keywords", [])
         
+        keyword_groups = dict(biomarker_keywords)
+        if general_keywords:
+            keyword_groups[GENERAL_GROUP] = general_keywords
+        
+        rerank = bool(settings.recommendation_llm_rerank and recommendation_input and keyword_groups)
+        limit = RERANK_CANDIDATES if rerank else PRODUCTS_PER_GROUP
+        
+        logger.info(f"[Recommendations] Searching products for {len(keyword_groups)} keyword groups")
+        index = await catalog_index.get()
+        if index is not None and len(index):
+            found = index.search_grouped(keyword_groups, limit=limit)
+        else:
+            found = await self.product_search.search_grouped(keyword_groups, limit=limit)
+        
+        if rerank:
+            found = await self._rerank(found, recommendation_input)
+        
+        biomarker_concepts = keywords_data.get("biomarker_concepts", {})
+        
+        # Process specific biomarker keywords
         for code, keywords in biomarker_keywords.items():
-            if not keywords:
-                continue
-                
-            # Search products for these keywords
-            logger.info(f"[Recommendations] Searching products for {code} with keywords: {keywords}")
-            found_products = await self._search_products(keywords, limit=3)
+            found_products = found.get(code, [])
             logger.info(f"[Recommendations] Found {len(found_products)} products for {code}")
             
             for product in found_products:
@@ -149,23 +275,23 @@ class RecommendationService:
                         "price": product.price,
                         # "image_url": product.image_url # Removed in migration
                     },
-                    "reason": f"Рекомендовано для коррекции показателя {code} (поиск: {', '.join(keywords)})"
+                    "reason": (
+                        f"Рекомендовано для коррекции показателя {code} "
+                        f"({', '.join(biomarker_concepts.get(code) or keywords)})"
+                    )
                 })
 
         # Process general keywords
-        general_keywords = keywords_data.get("general_keywords", [])
-        if general_keywords:
-            found_products = await self._search_products(general_keywords, limit=3)
-            for product in found_products:
-                 recommendations.append({
-                    "type": "general",
-                    "product": {
-                        "id": product.id,
-                        "name": product.name,
-                        "price": product.price,
-                    },
-                    "reason": f"Общая рекомендация для здоровья (поиск: {', '.join(general_keywords)})"
-                })
+        for product in found.get(GENERAL_GROUP, []):
+            recommendations.append({
+                "type": "general",
+                "product": {
+                    "id": product.id,
+                    "name": product.name,
+                    "price": product.price,
+                },
+                "reason": f"Общая рекомендация для здоровья (поиск: {', '.join(general_keywords)})"
+            })
         
         # Save to Analysis model
         logger.info(f"[Recommendations] Saving {len(recommendations)} recommendations to analysis {analysis_id}")
@@ -174,25 +300,27 @@ class RecommendationService:
         logger.info(f"[Recommendations] Successfully saved recommendations")
         
         return recommendations
-        
-    async def _search_products(self, keywords: List[str], limit: int = 5) -> List[Product]:
-        """Search products by multiple keywords."""
-        if not keywords:
-            return []
-            
-        # Construct OR condition for all keywords
-        conditions = []
-        for kw in keywords:
-            term = f"%{kw}%"
-            conditions.append(Product.name.ilike(term))
-            conditions.append(Product.description.ilike(term))
-            conditions.append(Product.composition.ilike(term))
-            
-        stmt = (
-            select(Product)
-            .where(or_(*conditions))
-            .limit(limit)
+    
+    async def _rerank(
+        self,
+        found: Dict[str, List[Any]],
+        recommendation_input: Dict[str, Any],
+    ) -> Dict[str, List[Any]]:
+        """Let the LLM order the candidates; keeps the rule order for groups it skipped."""
+        candidates = {
+            group: [{"id": product.id, "name": product.name} for product in products]
+            for group, products in found.items()
+        }
+        ranked_ids = await self.ai_parser.rerank_products(
+            recommendation_input["biomarkers"],
+            candidates,
+            patient_profile=recommendation_input["profile"],
+            limit=PRODUCTS_PER_GROUP,
         )
         
-        result = await self.db.execute(stmt)
-        return result.scalars().all()
+        reranked = {}
+        for group, products in found.items():
+            by_id = {product.id: product for product in products}
+            ordered = [by_id[product_id] for product_id in ranked_ids.get(group, []) if product_id in by_id]
+            reranked[group] = (ordered or products)[:PRODUCTS_PER_GROUP]
+        return reranked
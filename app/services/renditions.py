@@ -0,0 +1,233 @@
+"""
+Renditions of uploaded files: thumbnails and previews.
+
+Images are downscaled and PDFs are rendered from their first page, then
+encoded as WebP and JPEG. Renditions are stored next to the original blob
+(see BlobStore.derived_prefix), so deduplicated uploads share them and
+they are removed together with the blob.
+"""
+
+import asyncio
+import io
+import logging
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Dict, Optional, Set, Tuple
+
+from fastapi import Request, status
+from fastapi.responses import RedirectResponse, Response
+
+from app.core.config import settings
+from app.services.file_serving import conditional_file_response
+from app.services.storage import BlobStore, blob_store
+
+logger = logging.getLogger(__name__)
+
+# Bounding box (px) of each rendition
+RENDITION_SIZES: Dict[str, int] = {
+    "thumbnail": 256,
+    "preview": 1024,
+}
+
+# Output formats: extension -> (Pillow format, media type, save options)
+RENDITION_FORMATS: Dict[str, Tuple[str, str, dict]] = {
+    "webp": ("WEBP", "image/webp", {"quality": 80, "method": 4}),
+    "jpg": ("JPEG", "image/jpeg", {"quality": 82, "optimize": True, "progressive": True}),
+}
+
+PDF_RENDER_DPI = 100
+
+
+@dataclass
+class Rendition:
+    """Stored rendition of a file."""
+    key: str
+    media_type: str
+    etag: str
+
+
+class RenditionService:
+    """
+    Generates and serves thumbnails/previews of uploaded files.
+    Image processing runs in worker threads, bounded by a semaphore.
+    """
+
+    def __init__(self, store: BlobStore, max_concurrency: int):
+        self.store = store
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        # Detached generation tasks (referenced until done so they are not garbage collected)
+        self._tasks: Set[asyncio.Task] = set()
+
+    @staticmethod
+    def is_supported(content_type: Optional[str]) -> bool:
+        """Check whether renditions can be made for a content type."""
+        if not content_type:
+            return False
+        return content_type.startswith("image/") or content_type == "application/pdf"
+
+    def schedule(self, content_hash: Optional[str], file_path: str, content_type: str) -> None:
+        """
+        Start generating renditions without waiting for them.
+
+        Unlike a BackgroundTasks entry, this does not delay the background
+        tasks queued after it (e.g. analysis processing).
+        """
+        task = asyncio.create_task(self.generate(content_hash, file_path, content_type))
+        self._tasks.add(task)
+        task.add_done_callback(self._task_done)
+
+    def _task_done(self, task: asyncio.Task) -> None:
+        self._tasks.discard(task)
+        if not task.cancelled() and task.exception() is not None:
+            logger.warning(f"Rendition task failed: {task.exception()}")
+
+    async def generate(self, content_hash: Optional[str], file_path: str, content_type: str) -> bool:
+        """
+        Create all renditions of a stored file if they do not exist yet.
+
+        Used as a background task after uploads. Never raises.
+
+        Returns:
+            True if renditions are available
+        """
+        if not content_hash or not self.is_supported(content_type):
+            return False
+
+        # Renditions are written in order, the last one marks a complete set
+        last_name, last_ext = list(RENDITION_SIZES)[-1], list(RENDITION_FORMATS)[-1]
+        if await self.store.backend.exists(self._key(content_hash, last_name, last_ext)):
+            return True
+
+        try:
+            source = await self.store.read(content_hash, file_path)
+            async with self._semaphore:
+                encoded = await asyncio.to_thread(self._render_all, source, content_type)
+
+            for name, data in encoded.items():
+                await self.store.put_derived(content_hash, name, data)
+
+            logger.info(f"Renditions created for {content_hash[:12]}")
+            return True
+        except Exception as e:
+            logger.warning(f"Rendition generation failed for {content_hash[:12]}: {e}")
+            return False
+
+    async def get(
+        self,
+        content_hash: Optional[str],
+        file_path: str,
+        content_type: str,
+        name: str,
+        accept: str = "",
+    ) -> Optional[Rendition]:
+        """
+        Find a rendition, generating it on demand if it is missing.
+
+        Args:
+            content_hash: SHA-256 of the original file
+            file_path: Path of the original (for reading)
+            content_type: MIME type of the original
+            name: Rendition name (thumbnail, preview)
+            accept: Request Accept header, WebP is served when supported
+
+        Returns:
+            Rendition, or None if it cannot be made for this file
+        """
+        if name not in RENDITION_SIZES or not await self.generate(content_hash, file_path, content_type):
+            return None
+
+        ext = "webp" if "image/webp" in accept else "jpg"
+        _, media_type, _ = RENDITION_FORMATS[ext]
+        return Rendition(
+            key=self._key(content_hash, name, ext),
+            media_type=media_type,
+            etag=f"{content_hash}-{name}-{ext}",
+        )
+
+    async def response(self, request: Request, rendition: Rendition, last_modified: datetime) -> Response:
+        """Serve a rendition: presigned redirect, local file or bytes."""
+        backend = self.store.backend
+        headers = {"Vary": "Accept"}
+
+        presigned_url = await backend.presigned_url(
+            rendition.key,
+            rendition.key.rsplit("/", 1)[-1],
+            rendition.media_type,
+            inline=True,
+        )
+        if presigned_url:
+            return RedirectResponse(
+                presigned_url,
+                status_code=status.HTTP_307_TEMPORARY_REDIRECT,
+                headers={**headers, "Cache-Control": "private, no-store"},
+            )
+
+        path = backend.local_path(rendition.key)
+        content = None if path is not None else await backend.read(rendition.key)
+        return conditional_file_response(
+            request,
+            media_type=rendition.media_type,
+            content_hash=rendition.etag,
+            last_modified=last_modified,
+            path=path,
+            content=content,
+            headers=headers,
+            max_age=settings.file_cache_max_age_seconds,
+        )
+
+    def _key(self, content_hash: str, name: str, ext: str) -> str:
+        return f"{self.store.derived_prefix(content_hash)}{name}.{ext}"
+
+    def _render_all(self, source: bytes, content_type: str) -> Dict[str, bytes]:
+        """Render every size/format combination (blocking)."""
+        from PIL import Image
+
+        image = self._load_image(source, content_type)
+
+        encoded = {}
+        for name, size in RENDITION_SIZES.items():
+            resized = image.copy()
+            resized.thumbnail((size, size), Image.LANCZOS)
+            for ext, (pil_format, _, options) in RENDITION_FORMATS.items():
+                buffer = io.BytesIO()
+                resized.save(buffer, format=pil_format, **options)
+                encoded[f"{name}.{ext}"] = buffer.getvalue()
+        return encoded
+
+    def _load_image(self, source: bytes, content_type: str):
+        """Decode the original into an RGB image (first page for PDFs)."""
+        from PIL import Image, ImageOps
+
+        if content_type == "application/pdf":
+            from pdf2image import convert_from_bytes
+
+            pages = convert_from_bytes(
+                source,
+                dpi=PDF_RENDER_DPI,
+                first_page=1,
+                last_page=1,
+                size=(max(RENDITION_SIZES.values()), None),
+            )
+            if not pages:
+                raise RenditionError("PDF has no pages")
+            image = pages[0]
+        else:
+            image = Image.open(io.BytesIO(source))
+            # Decode at reduced scale where the format supports it (JPEG)
+            image.draft("RGB", (max(RENDITION_SIZES.values()),) * 2)
+            image = ImageOps.exif_transpose(image)
+
+        if image.mode in ("RGBA", "LA", "P"):
+            image = image.convert("RGBA")
+            background = Image.new("RGB", image.size, (255, 255, 255))
+            background.paste(image, mask=image.split()[-1])
+            return background
+        return image.convert("RGB")
+
+
+class RenditionError(Exception):
+    """Rendition generation error."""
+    pass
+
+
+rendition_service = RenditionService(blob_store, settings.rendition_max_concurrency)
@@ -0,0 +1,399 @@
+"""
+Content-addressed file storage.
+
+Uploads are stored once per SHA-256 hash under sharded keys
+(`blobs/ab/cd/abcd...`) and reference-counted in the `stored_blobs` table,
+so duplicate uploads take no extra space. The bytes live in a pluggable
+backend: local filesystem or an S3-compatible object store (e.g. MinIO).
+With S3, reads can be handed off to the object store via presigned URLs.
+
+Records created before content addressing have no content hash and keep
+using their original `file_path` on local disk.
+"""
+
+import asyncio
+import logging
+import shutil
+import uuid
+from abc import ABC, abstractmethod
+from contextlib import suppress
+from pathlib import Path
+from typing import Optional
+from urllib.parse import quote
+
+import aiofiles
+import aiofiles.os
+from fastapi import UploadFile
+from sqlalchemy import delete, update
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import settings
+from app.core.database import async_session_maker
+from app.models.stored_blob import StoredBlob
+from app.services.uploads import StoredUpload, save_upload
+
+logger = logging.getLogger(__name__)
+
+
+def content_disposition(filename: str, inline: bool = False) -> str:
+    """Content-Disposition header value, safe for non-ASCII file names."""
+    disposition = "inline" if inline else "attachment"
+    fallback = filename.encode("ascii", "ignore").decode().strip() or "file"
+    fallback = fallback.replace('"', "")
+    return f"{disposition}; filename=\"{fallback}\"; filename*=UTF-8''{quote(filename)}"
+
+
+class StorageBackend(ABC):
+    """Key/value byte storage used by the blob store."""
+
+    @abstractmethod
+    async def exists(self, key: str) -> bool:
+        """Check whether an object exists."""
+
+    @abstractmethod
+    async def put_file(self, key: str, source: Path) -> None:
+        """Store a local file under key. The source file is consumed."""
+
+    @abstractmethod
+    async def read(self, key: str) -> bytes:
+        """Read object contents."""
+
+    @abstractmethod
+    async def delete(self, key: str) -> None:
+        """Delete an object. Missing objects are ignored."""
+
+    @abstractmethod
+    async def delete_prefix(self, prefix: str) -> None:
+        """Delete all objects whose key starts with prefix (a "directory")."""
+
+    def local_path(self, key: str) -> Optional[Path]:
+        """Path on local disk if the backend keeps files locally."""
+        return None
+
+    async def presigned_url(
+        self,
+        key: str,
+        filename: str,
+        content_type: str,
+        inline: bool = False,
+    ) -> Optional[str]:
+        """Temporary direct-read URL, or None if the backend cannot serve files itself."""
+        return None
+
+
+class LocalStorageBackend(StorageBackend):
+    """Objects stored as files under a root directory."""
+
+    def __init__(self, root: Path):
+        self.root = root
+
+    def local_path(self, key: str) -> Path:
+        return self.root / key
+
+    async def exists(self, key: str) -> bool:
+        return await aiofiles.os.path.exists(self.local_path(key))
+
+    async def put_file(self, key: str, source: Path) -> None:
+        path = self.local_path(key)
+        await aiofiles.os.makedirs(path.parent, exist_ok=True)
+        await aiofiles.os.replace(source, path)
+
+    async def read(self, key: str) -> bytes:
+        async with aiofiles.open(self.local_path(key), "rb") as f:
+            return await f.read()
+
+    async def delete(self, key: str) -> None:
+        with suppress(FileNotFoundError):
+            await aiofiles.os.remove(self.local_path(key))
+
+    async def delete_prefix(self, prefix: str) -> None:
+        await asyncio.to_thread(shutil.rmtree, self.local_path(prefix), True)
+
+
+class S3StorageBackend(StorageBackend):
+    """
+    Objects stored in an S3-compatible bucket.
+    boto3 is synchronous, so calls run in worker threads.
+    """
+
+    def __init__(
+        self,
+        bucket: str,
+        endpoint_url: Optional[str] = None,
+        access_key: Optional[str] = None,
+        secret_key: Optional[str] = None,
+        region: str = "us-east-1",
+        public_endpoint_url: Optional[str] = None,
+        presign_expires: int = 300,
+    ):
+        self.bucket = bucket
+        self.endpoint_url = endpoint_url
+        self.access_key = access_key
+        self.secret_key = secret_key
+        self.region = region
+        self.public_endpoint_url = public_endpoint_url
+        self.presign_expires = presign_expires
+        self._client = None
+        self._presign_client = None
+
+    @property
+    def client(self):
+        if self._client is None:
+            self._client = self._create_client(self.endpoint_url)
+        return self._client
+
+    @property
+    def presign_client(self):
+        """Client for signing URLs that are opened by browsers."""
+        if not self.public_endpoint_url:
+            return self.client
+        if self._presign_client is None:
+            self._presign_client = self._create_client(self.public_endpoint_url)
+        return self._presign_client
+
+    def _create_client(self, endpoint_url: Optional[str]):
+        import boto3
+        from botocore.config import Config
+
+        return boto3.client(
+            "s3",
+            endpoint_url=endpoint_url,
+            aws_access_key_id=self.access_key,
+            aws_secret_access_key=self.secret_key,
+            region_name=self.region,
+            config=Config(signature_version="s3v4"),
+        )
+
+    async def exists(self, key: str) -> bool:
+        from botocore.exceptions import ClientError
+
+        try:
+            await asyncio.to_thread(self.client.head_object, Bucket=self.bucket, Key=key)
+            return True
+        except ClientError as e:
+            if e.response.get("Error", {}).get("Code") in ("404", "NoSuchKey", "NotFound"):
+                return False
+            raise
+
+    async def put_file(self, key: str, source: Path) -> None:
+        await asyncio.to_thread(self.client.upload_file, str(source), self.bucket, key)
+        with suppress(FileNotFoundError):
+            await aiofiles.os.remove(source)
+
+    async def read(self, key: str) -> bytes:
+        def _read() -> bytes:
+            response = self.client.get_object(Bucket=self.bucket, Key=key)
+            return response["Body"].read()
+
+        return await asyncio.to_thread(_read)
+
+    async def delete(self, key: str) -> None:
+        await asyncio.to_thread(self.client.delete_object, Bucket=self.bucket, Key=key)
+
+    async def delete_prefix(self, prefix: str) -> None:
+        def _delete() -> None:
+            paginator = self.client.get_paginator("list_objects_v2")
+            for page in paginator.paginate(Bucket=self.bucket, Prefix=prefix):
+                objects = [{"Key": item["Key"]} for item in page.get("Contents", [])]
+                if objects:
+                    self.client.delete_objects(Bucket=self.bucket, Delete={"Objects": objects})
+
+        await asyncio.to_thread(_delete)
+
+    async def presigned_url(
+        self,
+        key: str,
+        filename: str,
+        content_type: str,
+        inline: bool = False,
+    ) -> str:
+        # Signing is local computation, no request to the object store
+        return self.presign_client.generate_presigned_url(
+            "get_object",
+            Params={
+                "Bucket": self.bucket,
+                "Key": key,
+                "ResponseContentType": content_type,
+                "ResponseContentDisposition": content_disposition(filename, inline),
+            },
+            ExpiresIn=self.presign_expires,
+        )
+
+
+class BlobStore:
+    """Deduplicated, reference-counted storage of uploaded files."""
+
+    def __init__(self, backend: StorageBackend, tmp_dir: Path):
+        self.backend = backend
+        self.tmp_dir = tmp_dir
+
+    @staticmethod
+    def key_for(content_hash: str) -> str:
+        """Sharded object key for a SHA-256 hash."""
+        return f"blobs/{content_hash[:2]}/{content_hash[2:4]}/{content_hash}"
+
+    @staticmethod
+    def derived_prefix(content_hash: str) -> str:
+        """Key prefix for files derived from a blob (renditions)."""
+        return f"renditions/{content_hash[:2]}/{content_hash[2:4]}/{content_hash}/"
+
+    async def save_upload(self, db: AsyncSession, file: UploadFile, max_size: int) -> StoredUpload:
+        """
+        Stream an upload into the store and add a reference to its blob.
+
+        The reference is part of the caller's transaction; the caller
+        commits it together with the record that points to the blob.
+
+        Raises:
+            UploadTooLargeError: Upload exceeds max_size
+        """
+        tmp_path = self.tmp_dir / uuid.uuid4().hex
+        stored = await save_upload(file, tmp_path, max_size)
+
+        try:
+            refcount = await self._add_reference(db, stored.sha256, stored.size)
+            key = self.key_for(stored.sha256)
+            # The object may be missing if an earlier transaction rolled back after deleting it
+            if refcount == 1 or not await self.backend.exists(key):
+                await self.backend.put_file(key, tmp_path)
+            else:
+                logger.info(f"Deduplicated upload {stored.sha256[:12]} (refcount={refcount})")
+        finally:
+            with suppress(FileNotFoundError):
+                await aiofiles.os.remove(tmp_path)
+
+        return stored
+
+    async def put_derived(self, content_hash: str, name: str, data: bytes) -> str:
+        """Store a file derived from a blob (e.g. a thumbnail). Returns its key."""
+        key = self.derived_prefix(content_hash) + name
+        tmp_path = self.tmp_dir / uuid.uuid4().hex
+        await aiofiles.os.makedirs(self.tmp_dir, exist_ok=True)
+        try:
+            async with aiofiles.open(tmp_path, "wb") as f:
+                await f.write(data)
+            await self.backend.put_file(key, tmp_path)
+        finally:
+            with suppress(FileNotFoundError):
+                await aiofiles.os.remove(tmp_path)
+        return key
+
+    async def read(self, content_hash: Optional[str], file_path: str) -> bytes:
+        """Read file contents by hash, or from file_path for legacy records."""
+        if content_hash:
+            return await self.backend.read(self.key_for(content_hash))
+
+        async with aiofiles.open(file_path, "rb") as f:
+            return await f.read()
+
+    def local_path(self, content_hash: Optional[str], file_path: str) -> Optional[Path]:
+        """Local path of the file, or None if it lives in a remote backend."""
+        if content_hash:
+            return self.backend.local_path(self.key_for(content_hash))
+        return Path(file_path)
+
+    async def presigned_url(
+        self,
+        content_hash: Optional[str],
+        filename: str,
+        content_type: str,
+        inline: bool = False,
+    ) -> Optional[str]:
+        """Direct-read URL from the backend. None for legacy files and local storage."""
+        if not content_hash:
+            return None
+        return await self.backend.presigned_url(self.key_for(content_hash), filename, content_type, inline)
+
+    async def release(self, db: AsyncSession, content_hash: Optional[str], file_path: str) -> bool:
+        """
+        Drop a reference to a stored file.
+
+        Call before committing the deletion of the owning record. Nothing is
+        deleted physically here: the transaction may still roll back.
+
+        Returns:
+            True if the file is no longer referenced; call purge() after commit
+        """
+        if not content_hash:
+            return True
+
+        result = await db.execute(
+            update(StoredBlob)
+            .where(StoredBlob.sha256 == content_hash)
+            .values(refcount=StoredBlob.refcount - 1)
+            .returning(StoredBlob.refcount)
+        )
+        refcount = result.scalar_one_or_none()
+        if refcount is None or refcount > 0:
+            return False
+
+        await db.execute(delete(StoredBlob).where(StoredBlob.sha256 == content_hash))
+        return True
+
+    async def purge(self, content_hash: Optional[str], file_path: str) -> None:
+        """Delete a file released in a committed transaction (see release)."""
+        if not content_hash:
+            with suppress(OSError):
+                await aiofiles.os.remove(file_path)
+            return
+        await self.discard_upload(content_hash)
+
+    async def discard_upload(self, content_hash: str) -> None:
+        """
+        Delete the object of a hash unless a committed record references it.
+
+        save_upload writes the object before the caller commits, so call
+        this after a rolled back upload; purge() calls it after a committed
+        release. The placeholder row locks the hash, so a concurrent upload
+        of the same content waits and then stores the object again.
+        """
+        try:
+            async with async_session_maker() as session:
+                result = await session.execute(
+                    pg_insert(StoredBlob)
+                    .values(sha256=content_hash, size=0, refcount=0)
+                    .on_conflict_do_update(
+                        index_elements=[StoredBlob.sha256],
+                        set_={"refcount": StoredBlob.refcount},
+                    )
+                    .returning(StoredBlob.refcount)
+                )
+                if result.scalar_one() > 0:
+                    await session.rollback()
+                    return
+
+                await session.execute(delete(StoredBlob).where(StoredBlob.sha256 == content_hash))
+                await self.backend.delete(self.key_for(content_hash))
+                await self.backend.delete_prefix(self.derived_prefix(content_hash))
+                await session.commit()
+        except Exception as e:
+            logger.warning(f"Could not discard orphaned upload {content_hash[:12]}: {e}")
+
+    async def _add_reference(self, db: AsyncSession, content_hash: str, size: int) -> int:
+        """Insert or increment the blob refcount. Returns the new refcount."""
+        stmt = pg_insert(StoredBlob).values(sha256=content_hash, size=size, refcount=1)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[StoredBlob.sha256],
+            set_={"refcount": StoredBlob.refcount + 1},
+        ).returning(StoredBlob.refcount)
+        result = await db.execute(stmt)
+        return result.scalar_one()
+
+
+def create_storage_backend() -> StorageBackend:
+    """Create the storage backend configured in settings."""
+    if settings.storage_backend == "s3":
+        return S3StorageBackend(
+            bucket=settings.s3_bucket,
+            endpoint_url=settings.s3_endpoint_url,
+            access_key=settings.s3_access_key,
+            secret_key=settings.s3_secret_key,
+            region=settings.s3_region,
+            public_endpoint_url=settings.s3_public_endpoint_url,
+            presign_expires=settings.s3_presign_expires_seconds,
+        )
+    return LocalStorageBackend(Path(settings.upload_dir))
+
+
+blob_store = BlobStore(create_storage_backend(), Path(settings.upload_dir) / "tmp")
@@ -0,0 +1,43 @@
+"""
+Helpers for the system_state key/value table.
+"""
+
+from typing import Optional
+
+from sqlalchemy import select
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.sql import func
+
+from app.core.database import async_session_maker
+from app.models.system_state import SystemState
+
+# Version of the hotfixes/backfills applied by app/scripts/migrate.py;
+# bump when a step changes so deployments run it again
+SCHEMA_VERSION_KEY = "schema_version"
+SCHEMA_VERSION = "1"
+
+
+async def get_state(db: AsyncSession, key: str) -> Optional[str]:
+    """Read a value, None if the key is not set."""
+    result = await db.execute(select(SystemState.value).where(SystemState.key == key))
+    return result.scalar_one_or_none()
+
+
+async def set_state(db: AsyncSession, key: str, value: str) -> None:
+    """Insert or update a value. The caller commits."""
+    stmt = pg_insert(SystemState).values(key=key, value=value)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[SystemState.key],
+        set_={"value": value, "updated_at": func.now()},
+    )
+    await db.execute(stmt)
+
+
+async def get_schema_version() -> Optional[str]:
+    """Applied schema version, None if never migrated (or no system_state yet)."""
+    try:
+        async with async_session_maker() as session:
+            return await get_state(session, SCHEMA_VERSION_KEY)
+    except Exception:
+        return None
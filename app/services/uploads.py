@@ -0,0 +1,77 @@
+"""
+Streaming upload handling.
+
+Uploads are copied to disk in chunks with async writes, hashed on the fly
+and rejected as soon as they exceed the size limit. Data goes to a temp
+file next to the destination and is atomically renamed when complete.
+"""
+
+import hashlib
+import uuid
+from contextlib import suppress
+from dataclasses import dataclass
+from pathlib import Path
+
+import aiofiles
+import aiofiles.os
+from fastapi import UploadFile
+
+CHUNK_SIZE = 1024 * 1024  # 1 MB
+
+
+class UploadTooLargeError(Exception):
+    """Upload exceeds the configured size limit."""
+
+    def __init__(self, max_size: int):
+        self.max_size = max_size
+        super().__init__(f"Upload exceeds {max_size} bytes")
+
+
+@dataclass
+class StoredUpload:
+    """File written to disk from an upload."""
+    path: Path
+    size: int
+    sha256: str
+
+
+async def save_upload(file: UploadFile, destination: Path, max_size: int) -> StoredUpload:
+    """
+    Stream an uploaded file to destination.
+
+    Args:
+        file: Incoming upload
+        destination: Final file path
+        max_size: Maximum allowed size in bytes
+
+    Returns:
+        StoredUpload with size and SHA-256 of the content
+
+    Raises:
+        UploadTooLargeError: As soon as more than max_size bytes were received
+    """
+    # Size is known upfront for spooled multipart uploads
+    if file.size is not None and file.size > max_size:
+        raise UploadTooLargeError(max_size)
+
+    await aiofiles.os.makedirs(destination.parent, exist_ok=True)
+    tmp_path = destination.with_name(f".{destination.name}.{uuid.uuid4().hex}.part")
+
+    digest = hashlib.sha256()
+    size = 0
+    try:
+        async with aiofiles.open(tmp_path, "wb") as out:
+            while chunk := await file.read(CHUNK_SIZE):
+                size += len(chunk)
+                if size > max_size:
+                    raise UploadTooLargeError(max_size)
+                digest.update(chunk)
+                await out.write(chunk)
+
+        await aiofiles.os.replace(tmp_path, destination)
+    except BaseException:
+        with suppress(FileNotFoundError):
+            await aiofiles.os.remove(tmp_path)
+        raise
+
+    return StoredUpload(path=destination, size=size, sha256=digest.hexdigest())
@@ -255,22 +255,43 @@ export default function Home() {
     }
   }, [isGlobalUploading, processingIds]);
 
-  // Polling logic for processing items
+  // Processing status via Server-Sent Events, polling only as a fallback
   useEffect(() => {
     if (processingIds.length === 0) return;
     
-    const interval = setInterval(async () => {
-      // console.log('[App] Polling status:', processingIds);
-      for (const id of processingIds) {
-        try {
-          const check = await analysesApi.getById(id);
-          if (check.status === 'completed' || check.status === 'error' || check.status === 'failed') {
-             setProcessingIds(prev => prev.filter(pid => pid !== id));
+    const finish = (id: number) => setProcessingIds(prev => prev.filter(pid => pid !== id));
+    const cleanups: (() => void)[] = [];
+    
+    for (const id of processingIds) {
+      let pollInterval: ReturnType<typeof setInterval> | null = null;
+      
+      const unsubscribe = analysesApi.watchStatus(
+        id,
+        (event) => {
+          if (event.status === 'completed' || event.status === 'failed') {
+            finish(id);
           }
-        } catch (e) { console.error(e); }
-      }
-    }, 2000);
-    return () => clearInterval(interval);
+        },
+        () => {
+          // SSE unavailable - fall back to polling
+          pollInterval = setInterval(async () => {
+            try {
+              const check = await analysesApi.getById(id);
+              if (check.status === 'completed' || check.status === 'error' || check.status === 'failed') {
+                finish(id);
+              }
+            } catch (e) { console.error(e); }
+          }, 2000);
+        },
+      );
+      
+      cleanups.push(() => {
+        unsubscribe();
+        if (pollInterval) clearInterval(pollInterval);
+      });
+    }
+    
+    return () => cleanups.forEach(cleanup => cleanup());
   }, [processingIds]);
 
   const [isProfileFilled, setIsProfileFilled] = useState(true); // Default true to avoid flash
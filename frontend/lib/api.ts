@@ -52,6 +52,18 @@ export interface AnalysisUploadResponse {
   message: string;
 }
 
+export interface AnalysisStatusEvent {
+  type: 'status';
+  analysis_id: number;
+  status: string;
+  stage: string;
+  progress: number;
+  summary_ready: boolean;
+  recommendations_ready: boolean;
+  biomarkers_found?: number;
+  message?: string | null;
+}
+
 export interface Biomarker {
   id: number;
   name: string;
@@ -275,6 +287,69 @@ export const analysesApi = {
   async delete(id: number): Promise<void> {
     return apiFetch(`/analyses/${id}`, { method: 'DELETE' });
   },
+  
+  // Подписка на этапы обработки (Server-Sent Events). Возвращает функцию отписки.
+  // onError вызывается, если поток недоступен или закрылся до завершения обработки.
+  watchStatus(
+    id: number,
+    onEvent: (event: AnalysisStatusEvent) => void,
+    onError?: (err: unknown) => void,
+  ): () => void {
+    const controller = new AbortController();
+    const token = getAuthToken();
+    
+    (async () => {
+      let finished = false;
+      try {
+        const response = await fetch(`${API_BASE_URL}/analyses/${id}/events`, {
+          headers: token ? { 'Authorization': `Bearer ${token}` } : {},
+          signal: controller.signal,
+        });
+        if (!response.ok || !response.body) {
+          throw new Error(`HTTP ${response.status}`);
+        }
+        
+        const reader = response.body.getReader();
+        const decoder = new TextDecoder();
+        let buffer = '';
+        
+        while (true) {
+          const { value, done } = await reader.read();
+          if (done) break;
+          buffer += decoder.decode(value, { stream: true });
+          
+          let separator;
+          while ((separator = buffer.indexOf('\n\n')) !== -1) {
+            const message = buffer.slice(0, separator);
+            buffer = buffer.slice(separator + 2);
+            const data = message
+              .split('\n')
+              .filter(line => line.startsWith('data: '))
+              .map(line => line.slice(6))
+              .join('\n');
+            if (!data) continue; // keepalive comment
+            
+            const event: AnalysisStatusEvent = JSON.parse(data);
+            if (event.status === 'completed' || event.status === 'failed') {
+              finished = true;
+            }
+            onEvent(event);
+          }
+        }
+        
+        if (!finished) {
+          throw new Error('Event stream closed before processing finished');
+        }
+      } catch (err) {
+        if (!controller.signal.aborted) {
+          console.error('[API Events]', err);
+          onError?.(err);
+        }
+      }
+    })();
+    
+    return () => controller.abort();
+  },
 };
 
 // API для медкарты
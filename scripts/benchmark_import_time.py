@@ -0,0 +1,81 @@
+"""
+Benchmark cold import time of the API (what every uvicorn worker pays).
+
+Runs `python -X importtime -c "import app.main"` in fresh interpreters,
+reports the median total and the slowest modules, and fails if a heavy
+stack (OCR, PDF, LLM client) is imported eagerly or the total exceeds
+--max-ms. Run it in CI to guard against import-time regressions.
+
+Run with: python -m scripts.benchmark_import_time [--module app.main] [--runs 5] [--max-ms 0]
+"""
+
+import argparse
+import statistics
+import subprocess
+import sys
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+PROJECT_ROOT = Path(__file__).parent.parent
+
+# Must only be imported on first use (see app/services/ocr.py, ai_parser.py)
+LAZY_MODULES = ["PIL", "pytesseract", "pdf2image", "openai", "boto3"]
+
+
+def import_times(module: str) -> Dict[str, Tuple[int, int]]:
+    """Module -> (self, cumulative) import time in microseconds, from a fresh interpreter."""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=PROJECT_ROOT,
+        capture_output=True,
+        text=True,
+    )
+    if result.returncode != 0:
+        sys.exit(f"import {module} failed:\n{result.stderr[-2000:]}")
+
+    times = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|", 2)
+        if not self_us.strip().isdigit():
+            continue  # header line
+        times[name.strip()] = (int(self_us), int(cumulative_us))
+    return times
+
+
+def main(module: str, runs: int, top: int, max_ms: float) -> int:
+    totals: List[float] = []
+    times: Dict[str, Tuple[int, int]] = {}
+    for _ in range(runs):
+        times = import_times(module)
+        totals.append(times[module][1] / 1000)
+
+    median = statistics.median(totals)
+    print(f"import {module}: median {median:.0f} ms over {runs} runs (min {min(totals):.0f}, max {max(totals):.0f})")
+
+    print("\nSlowest modules (self time, last run):")
+    for name, (self_us, cumulative_us) in sorted(times.items(), key=lambda item: -item[1][0])[:top]:
+        print(f"  {self_us / 1000:8.1f} ms  (cumulative {cumulative_us / 1000:8.1f} ms)  {name}")
+
+    failed = False
+    eager = [name for name in LAZY_MODULES if name in times]
+    if eager:
+        print(f"\nFAIL: imported eagerly: {', '.join(eager)}")
+        failed = True
+    if max_ms and median > max_ms:
+        print(f"\nFAIL: median {median:.0f} ms exceeds budget of {max_ms:.0f} ms")
+        failed = True
+    if not failed:
+        print("\nOK: heavy stacks are imported lazily")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--module", default="app.main")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--top", type=int, default=15)
+    parser.add_argument("--max-ms", type=float, default=0, help="Fail above this median (0 = no budget)")
+    args = parser.parse_args()
+    sys.exit(main(args.module, args.runs, args.top, args.max_ms))
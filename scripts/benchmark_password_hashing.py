@@ -0,0 +1,88 @@
+"""
+Benchmark login password verification: on the event loop vs the hashing pool.
+
+Simulates a login storm (concurrent bcrypt verifications) and measures
+throughput and how long the event loop is blocked (heartbeat lag). No
+database is needed.
+
+Run with: python -m scripts.benchmark_password_hashing [--logins 64] [--rounds 12]
+"""
+
+import argparse
+import asyncio
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Awaitable, Callable
+
+# Add project root to path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from passlib.context import CryptContext
+
+PASSWORD = "correct horse battery staple"
+
+
+async def heartbeat(stop: asyncio.Event, interval: float = 0.01) -> float:
+    """Max delay of a periodic tick: how long other requests would wait."""
+    worst = 0.0
+    while not stop.is_set():
+        started = time.perf_counter()
+        await asyncio.sleep(interval)
+        worst = max(worst, time.perf_counter() - started - interval)
+    return worst
+
+
+async def run(name: str, logins: int, verify: Callable[[], Awaitable[bool]]) -> float:
+    stop = asyncio.Event()
+    lag_task = asyncio.create_task(heartbeat(stop))
+
+    started = time.perf_counter()
+    results = await asyncio.gather(*(verify() for _ in range(logins)))
+    elapsed = time.perf_counter() - started
+
+    stop.set()
+    max_lag = await lag_task
+    assert all(results)
+
+    throughput = logins / elapsed
+    print(f"  {name:<22} {throughput:8.1f} logins/s   total {elapsed:6.2f}s   max loop lag {max_lag * 1000:8.1f} ms")
+    return throughput
+
+
+async def benchmark(logins: int, rounds: int):
+    context = CryptContext(schemes=["bcrypt"], bcrypt__default_rounds=rounds)
+    hashed = context.hash(PASSWORD)
+    cores = os.cpu_count() or 1
+    print(f"bcrypt cost {rounds}, {logins} concurrent logins, {cores} CPU cores")
+
+    async def on_loop() -> bool:
+        return context.verify(PASSWORD, hashed)
+
+    baseline = await run("event loop (before)", logins, on_loop)
+
+    workers = 1
+    while True:
+        executor = ThreadPoolExecutor(max_workers=workers)
+        loop = asyncio.get_running_loop()
+
+        async def in_pool() -> bool:
+            return await loop.run_in_executor(executor, context.verify, PASSWORD, hashed)
+
+        throughput = await run(f"pool, {workers} thread(s)", logins, in_pool)
+        print(f"  {'':<22} {throughput / baseline:8.1f}x vs event loop")
+        executor.shutdown()
+
+        if workers >= cores:
+            break
+        workers = min(workers * 2, cores)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--logins", type=int, default=64)
+    parser.add_argument("--rounds", type=int, default=12)
+    args = parser.parse_args()
+    asyncio.run(benchmark(args.logins, args.rounds))
@@ -0,0 +1,116 @@
+"""
+Benchmark product search: legacy ILIKE OR-chains vs indexed search vs
+the in-memory catalog index.
+
+Import a realistic catalog first (python app/scripts/import_products.py),
+then run with: python -m scripts.benchmark_product_search [--iterations 20]
+"""
+
+import argparse
+import asyncio
+import statistics
+import sys
+import time
+from pathlib import Path
+from typing import Awaitable, Callable, Dict, List
+
+# Add project root to path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from sqlalchemy import func, or_, select
+from app.core.database import async_session_maker
+from app.models.product import Product
+from app.services.catalog_index import catalog_index
+from app.services.product_search import ProductSearchService
+
+
+# Typical keyword groups produced for an analysis with several deviations
+KEYWORD_GROUPS: Dict[str, List[str]] = {
+    "FE": ["железо", "бисглицинат железа", "гемоглобин"],
+    "VITD": ["витамин d", "холекальциферол", "d3"],
+    "B12": ["витамин b12", "цианокобаламин", "метилкобаламин"],
+    "FERRITIN": ["железо", "ферритин"],
+    "TSH": ["йод", "селен", "щитовидная"],
+    "MG": ["магний", "цитрат магния"],
+    "__general__": ["омега-3", "мультивитамины"],
+}
+
+
+async def legacy_search(db, keyword_groups: Dict[str, List[str]], limit: int = 3) -> int:
+    """Previous implementation: one ILIKE OR-chain query per group."""
+    found = 0
+    for keywords in keyword_groups.values():
+        conditions = []
+        for kw in keywords:
+            term = f"%{kw}%"
+            conditions.append(Product.name.ilike(term))
+            conditions.append(Product.description.ilike(term))
+            conditions.append(Product.composition.ilike(term))
+        result = await db.execute(select(Product).where(or_(*conditions)).limit(limit))
+        found += len(result.scalars().all())
+    return found
+
+
+async def indexed_search(db, keyword_groups: Dict[str, List[str]], limit: int = 3) -> int:
+    """Current implementation: single ranked LATERAL query."""
+    grouped = await ProductSearchService(db).search_grouped(keyword_groups, limit=limit)
+    return sum(len(products) for products in grouped.values())
+
+
+async def measure(name: str, run: Callable[[], Awaitable[int]], iterations: int) -> float:
+    await run()  # warm up caches and prepared statements
+    timings = []
+    found = 0
+    for _ in range(iterations):
+        started = time.perf_counter()
+        found = await run()
+        timings.append((time.perf_counter() - started) * 1000)
+
+    timings.sort()
+    p95 = timings[min(len(timings) - 1, int(len(timings) * 0.95))]
+    print(
+        f"  {name:<10} mean {statistics.mean(timings):8.2f} ms   "
+        f"p50 {statistics.median(timings):8.2f} ms   p95 {p95:8.2f} ms   products {found}"
+    )
+    return statistics.median(timings)
+
+
+async def benchmark(iterations: int):
+    async with async_session_maker() as db:
+        total = (await db.execute(select(func.count(Product.id)))).scalar_one()
+        print(f"Catalog size: {total} products, {len(KEYWORD_GROUPS)} keyword groups, {iterations} iterations")
+        if not total:
+            print("Catalog is empty - import products first.")
+            return
+
+        legacy = await measure("legacy", lambda: legacy_search(db, KEYWORD_GROUPS), iterations)
+        indexed = await measure("indexed", lambda: indexed_search(db, KEYWORD_GROUPS), iterations)
+        print(f"Speedup (p50): {legacy / indexed:.1f}x")
+
+        await catalog_index.refresh()
+        index = catalog_index.index
+        in_memory = await measure(
+            "in-memory",
+            lambda: _sync_count(index.search_grouped(KEYWORD_GROUPS, limit=3)),
+            iterations,
+        )
+        print(f"Speedup vs indexed (p50): {indexed / in_memory:.1f}x")
+
+        # Single user query
+        service = ProductSearchService(db)
+        await measure("user query", lambda: _count(service.search("витамин д3")), iterations)
+
+
+async def _count(awaitable) -> int:
+    return len(await awaitable)
+
+
+async def _sync_count(grouped) -> int:
+    return sum(len(products) for products in grouped.values())
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--iterations", type=int, default=20)
+    args = parser.parse_args()
+    asyncio.run(benchmark(args.iterations))
@@ -20,6 +20,14 @@ else
     fi
 fi
 
+# Schema hotfixes, enum values, backfills, demo user (no-op when up to date)
+echo "🔧 Applying schema hotfixes and backfills..."
+if python app/scripts/migrate.py; then
+    echo "✅ Schema hotfixes and backfills applied"
+else
+    echo "⚠️ Schema hotfixes incomplete, will retry on next deploy"
+fi
+
 # Start the application
 echo "🔥 Starting Uvicorn..."
 exec uvicorn app.main:app --host 0.0.0.0 --port ${PORT:-8000}